@@ -0,0 +1,2 @@
+# Нагрузочные замеры обработчиков и горячих запросов на синтетических данных.
+# Запуск: python -m benchmarks.run --help
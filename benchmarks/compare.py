@@ -0,0 +1,49 @@
+import argparse
+import json
+import sys
+
+# python -m benchmarks.compare old.json new.json [--threshold 20]
+# Код возврата 1, если p50 вырос больше порога или сценарий стал делать больше запросов.
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(old, new, threshold):
+    lines, regressions = [], []
+    for name, cur in new["scenarios"].items():
+        prev = old["scenarios"].get(name)
+        if prev is None:
+            lines.append(f"{name:<22} новый сценарий: p50 {cur['p50_ms']} мс, запросов {cur['queries_per_run']}")
+            continue
+        change = (cur["p50_ms"] - prev["p50_ms"]) / prev["p50_ms"] * 100 if prev["p50_ms"] else 0.0
+        line = (
+            f"{name:<22} p50 {prev['p50_ms']:>9.2f} → {cur['p50_ms']:>9.2f} мс ({change:+.0f}%)  "
+            f"запросов {prev['queries_per_run']} → {cur['queries_per_run']}"
+        )
+        if change > threshold or cur["queries_per_run"] > prev["queries_per_run"]:
+            line += "  ← регрессия"
+            regressions.append(name)
+        lines.append(line)
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сравнение двух прогонов benchmarks.run")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=20.0, help="допустимый рост p50, %%")
+    args = parser.parse_args(argv)
+    old, new = load(args.old), load(args.new)
+    if old["meta"]["sizes"] != new["meta"]["sizes"]:
+        print("Внимание: прогоны на данных разного размера")
+    print(f"{old['meta']['commit']} → {new['meta']['commit']}")
+    lines, regressions = compare(old, new, args.threshold)
+    print("\n".join(lines))
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
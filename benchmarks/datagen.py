@@ -0,0 +1,114 @@
+import random
+from datetime import date, timedelta
+from sqlalchemy import insert
+from bot.achievements import get_rank
+from bot.db import Base, User, Route, Hike, HikeParticipant
+
+# Детерминированный генератор клуба: одинаковые параметры и seed дают одинаковую базу,
+# поэтому результаты разных коммитов сравнимы. Участия генерируются дважды
+# (сначала для итогов пользователей, затем для вставки), чтобы не держать их в памяти.
+
+TELEGRAM_ID_BASE = 1_000_000_000
+DIFFICULTIES = ["лёгкая", "средняя", "Сложная"]
+
+
+def telegram_id(user_id):
+    return TELEGRAM_ID_BASE + user_id
+
+
+def hike_dates(rng, hikes, today):
+    # Часть походов — завтра (для напоминаний), остальные — за три года назад и два месяца вперёд
+    tomorrow = today + timedelta(days=1)
+    first = max(1, hikes // 200)
+    return [tomorrow] * first + [today + timedelta(days=rng.randint(-3 * 365, 60)) for _ in range(hikes - first)]
+
+
+def participants(seed, hike_id, hike_date, count, users, today):
+    rng = random.Random(seed * 1_000_003 + hike_id)
+    for user_id in rng.sample(range(1, users + 1), count):
+        # Будущие походы: completed по умолчанию 1, как при /add_participant
+        completed = 1 if hike_date >= today or rng.random() < 0.9 else 0
+        yield user_id, completed
+
+
+def per_hike(participations, hikes, users):
+    base, extra = divmod(participations, hikes)
+    return [min(users, base + (1 if i < extra else 0)) for i in range(hikes)]
+
+
+async def _chunked(conn, table, rows, chunk):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= chunk:
+            await conn.execute(insert(table), batch)
+            batch = []
+    if batch:
+        await conn.execute(insert(table), batch)
+
+
+async def generate(engine, users, routes, hikes, participations, seed=42, chunk=10_000, progress=print):
+    rng = random.Random(seed)
+    today = date.today()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    route_rows = [
+        {
+            "id": i, "name": f"Маршрут {i}", "distance": round(rng.uniform(3, 30), 1),
+            "elevation": rng.randint(100, 2500), "description": "Синтетический маршрут",
+            "difficulty": rng.choice(DIFFICULTIES),
+            "latitude": round(rng.uniform(42.0, 43.0), 4), "longitude": round(rng.uniform(74.0, 78.0), 4),
+        }
+        for i in range(1, routes + 1)
+    ]
+    dates = hike_dates(rng, hikes, today)
+    hike_rows = [
+        {"id": i, "route_id": rng.randint(1, routes), "date": dates[i - 1]}
+        for i in range(1, hikes + 1)
+    ]
+    counts = per_hike(participations, hikes, users)
+
+    # Проход 1: итоги пользователей по завершённым прошлым походам
+    distance = [0.0] * (users + 1)
+    elevation = [0] * (users + 1)
+    done = [0] * (users + 1)
+    for hike, count in zip(hike_rows, counts):
+        if hike["date"] >= today:
+            continue
+        route = route_rows[hike["route_id"] - 1]
+        for user_id, completed in participants(seed, hike["id"], hike["date"], count, users, today):
+            if completed:
+                distance[user_id] += route["distance"]
+                elevation[user_id] += route["elevation"]
+                done[user_id] += 1
+
+    def user_rows():
+        for i in range(1, users + 1):
+            yield {
+                "id": i, "telegram_id": telegram_id(i), "name": f"Участник {i}", "phone": "+996700000000",
+                "age": 18 + i % 50, "total_distance": round(distance[i], 1), "total_elevation": elevation[i],
+                "hikes_count": done[i], "rank": get_rank(done[i], distance[i]),
+                "notifications_enabled": 0 if i % 20 == 0 else 1,
+            }
+
+    def participation_rows():
+        for hike, count in zip(hike_rows, counts):
+            for user_id, completed in participants(seed, hike["id"], hike["date"], count, users, today):
+                yield {"hike_id": hike["id"], "user_id": user_id, "completed": completed}
+
+    async with engine.begin() as conn:
+        await conn.execute(insert(Route), route_rows)
+        progress(f"routes: {routes}")
+        await _chunked(conn, User, user_rows(), chunk)
+        progress(f"users: {users}")
+        await _chunked(conn, Hike, hike_rows, chunk)
+        progress(f"hikes: {hikes}")
+        await _chunked(conn, HikeParticipant, participation_rows(), chunk)
+        progress(f"participations: {sum(counts)}")
+        if conn.dialect.name == "postgresql":
+            # id вставлены явно — двигаем последовательности
+            for table in ("users", "routes", "hikes"):
+                await conn.exec_driver_sql(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))"
+                )
@@ -0,0 +1,36 @@
+from collections import Counter
+from datetime import datetime
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import SendMessage, EditMessageText
+from aiogram.types import Message, Chat
+
+# Сессия бота без сети: запоминает вызовы API и отвечает правдоподобными объектами.
+
+
+class RecordingSession(BaseSession):
+    def __init__(self):
+        super().__init__()
+        self.calls = Counter()
+        self.chats = Counter()
+        self._message_id = 0
+
+    def total(self):
+        return sum(self.calls.values())
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls[type(method).__name__] += 1
+        if isinstance(method, (SendMessage, EditMessageText)) and method.chat_id is not None:
+            self.chats[method.chat_id] += 1
+            self._message_id += 1
+            chat_type = "private" if int(method.chat_id) > 0 else "supergroup"
+            return Message(
+                message_id=self._message_id, date=datetime.now(),
+                chat=Chat(id=method.chat_id, type=chat_type), text=method.text,
+            ).as_(bot)
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
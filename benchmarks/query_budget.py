@@ -0,0 +1,63 @@
+import re
+from collections import Counter
+from sqlalchemy import event
+
+# Бюджет запросов для тестов: считает SQL-выражения через before_cursor_execute,
+# проверяет их максимальное число и ищет N+1 — одно и то же выражение,
+# повторённое с разными параметрами.
+
+_IN_LIST = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+_NUMBERED = re.compile(r"\$\d+|%\(\w+\)s|:\w+")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize(statement):
+    # Параметры, списки IN (?, ?, ?) и литералы сводятся к «?»
+    statement = _NUMBERED.sub("?", statement)
+    statement = _LITERALS.sub("?", statement)
+    statement = _IN_LIST.sub("(?)", statement)
+    return _SPACES.sub(" ", statement).strip()
+
+
+class QueryBudget:
+    def __init__(self, engine, max_statements=None, max_repeats=1, ignore=()):
+        # ignore — подстроки выражений, повторы которых не считаются N+1 (например, записи FSM)
+        self.engine = engine.sync_engine if hasattr(engine, "sync_engine") else engine
+        self.max_statements = max_statements
+        self.max_repeats = max_repeats
+        self.ignore = tuple(ignore)
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        event.remove(self.engine, "before_cursor_execute", self._record)
+        if exc_type is None:
+            self.check()
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def repeated(self):
+        counts = Counter(normalize(s) for s in self.statements if not any(i in s for i in self.ignore))
+        return {s: n for s, n in counts.items() if n > self.max_repeats}
+
+    def report(self):
+        return "\n".join(f"{i + 1}. {_SPACES.sub(' ', s)}" for i, s in enumerate(self.statements))
+
+    def check(self):
+        if self.max_statements is not None and self.count > self.max_statements:
+            raise AssertionError(
+                f"Превышен бюджет запросов: {self.count} > {self.max_statements}\n{self.report()}"
+            )
+        repeated = self.repeated()
+        if repeated:
+            lines = "\n".join(f"{n}× {s}" for s, n in repeated.items())
+            raise AssertionError(f"Похоже на N+1 — одинаковые запросы с разными параметрами:\n{lines}")
@@ -0,0 +1,121 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+# python -m benchmarks.run --preset small --runs 50
+# Результат — JSON в benchmarks/results/<commit>.json; сравнение: python -m benchmarks.compare
+
+ADMIN_ID = 1  # не пересекается с telegram_id синтетических участников
+RESULTS_DIR = Path(__file__).parent / "results"
+PRESETS = {
+    "small": {"users": 1_000, "routes": 50, "hikes": 500, "participations": 10_000},
+    "medium": {"users": 10_000, "routes": 500, "hikes": 5_000, "participations": 100_000},
+    "full": {"users": 100_000, "routes": 2_000, "hikes": 20_000, "participations": 1_000_000},
+}
+
+
+def git_commit():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+        dirty = subprocess.call(["git", "diff", "--quiet", "HEAD"]) != 0
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + ("-dirty" if dirty else "")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры обработчиков бота на синтетических данных")
+    parser.add_argument("--preset", default="small", choices=PRESETS, help="small, medium или full (100k пользователей, 1M участий)")
+    for size in ("users", "routes", "hikes", "participations"):
+        parser.add_argument(f"--{size}", type=int, help="переопределить размер из пресета")
+    parser.add_argument("--database", help="URL базы; по умолчанию — новый файл SQLite во временном каталоге")
+    parser.add_argument("--reuse", action="store_true", help="не генерировать данные, база уже заполнена")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--runs", type=int, default=50, help="повторов на сценарий")
+    parser.add_argument("--scenario", action="append", help="только указанные сценарии (можно несколько)")
+    parser.add_argument("--out", help="куда записать JSON")
+    return parser.parse_args(argv)
+
+
+async def run(args, sizes, database):
+    # Импорт только здесь: bot.config читает окружение при импорте
+    from bot import main
+    from bot.achievements import sync_achievements
+    from bot.db import engine, SessionLocal, User
+    from bot.routes_catalog import route_catalog
+    from benchmarks.datagen import generate
+    from benchmarks.fake_bot import RecordingSession
+    from benchmarks.scenarios import SCENARIOS, Bench, measure
+    from sqlalchemy import select, func
+
+    if not args.reuse:
+        async with engine.connect() as conn:
+            exists = await conn.run_sync(lambda c: c.dialect.has_table(c, "users"))
+        if exists:
+            async with SessionLocal() as session:
+                if (await session.execute(select(func.count()).select_from(User))).scalar():
+                    sys.exit("База уже заполнена: укажите --reuse или пустую базу")
+        await generate(engine, seed=args.seed, **sizes)
+    async with SessionLocal() as session:
+        await sync_achievements(session)
+        await session.commit()
+    await route_catalog.load()
+
+    # Бот из bot.main, но без сети и без ограничителя скорости отправки:
+    # замеряем свой код, а не лимиты Telegram
+    session = RecordingSession()
+    main.bot.session = session
+    bench = Bench(session, sizes["users"], args.seed)
+    await bench.setup()
+    results = {}
+    try:
+        for name in args.scenario or list(SCENARIOS):
+            print(f"{name}…", flush=True)
+            results[name] = await measure(bench, name, args.runs)
+            print(f"  {results[name]}")
+    finally:
+        bench.close()
+        await engine.dispose()
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "database": database.split(":", 1)[0],
+            "preset": args.preset,
+            "sizes": sizes,
+            "seed": args.seed,
+            "runs": args.runs,
+            "api_calls": dict(session.calls),
+        },
+        "scenarios": results,
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sizes = dict(PRESETS[args.preset])
+    for size in sizes:
+        if getattr(args, size) is not None:
+            sizes[size] = getattr(args, size)
+    database = args.database or f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='bench-')}/bench.db"
+    os.environ["DATABASE_URL"] = database
+    os.environ["ADMINS"] = str(ADMIN_ID)
+    os.environ["OWNER_ID"] = str(ADMIN_ID)
+    os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK")
+    report = asyncio.run(run(args, sizes, database))
+    out = Path(args.out) if args.out else RESULTS_DIR / f"{report['meta']['commit']}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+    print(f"Результаты: {out}")
+
+
+if __name__ == "__main__":
+    main()
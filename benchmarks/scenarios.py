@@ -0,0 +1,163 @@
+import asyncio
+import random
+import statistics
+import time
+from datetime import date, datetime, timedelta
+from aiogram import types
+from sqlalchemy import delete, event, select
+from bot import main, broadcast, reminders
+from bot.achievements import check_achievements
+from bot.config import ADMINS
+from bot.db import engine, SessionLocal, User, Hike, HikeParticipant, ReminderMark
+from benchmarks.datagen import telegram_id
+
+# Сценарий — корутина prepare(bench), которая готовит данные (не замеряется)
+# и возвращает корутину-функцию run() — её и замеряем. Обновления проходят через
+# настоящий Dispatcher из bot.main со всеми фильтрами, FSM и мидлварями.
+
+SCENARIOS = {}
+
+
+def scenario(name, runs=None):
+    # runs — фиксированное число повторов для тяжёлых сценариев
+    def wrap(fn):
+        SCENARIOS[name] = (fn, runs)
+        return fn
+    return wrap
+
+
+async def fake_forecast(lat, lon, day):
+    return 12.0, 24.0, 0.5, 4.0
+
+
+class Bench:
+    def __init__(self, session, users, seed=42):
+        self.session = session
+        self.users = users
+        self.rng = random.Random(seed)
+        self.admin = ADMINS[0] if ADMINS else None  # run.py выставляет ADMINS сам
+        self.queries = 0
+        self.past_hikes = []
+        self._update_id = 0
+        event.listen(engine.sync_engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self.queries += 1
+
+    def close(self):
+        event.remove(engine.sync_engine, "before_cursor_execute", self._count)
+
+    async def setup(self):
+        async with SessionLocal() as session:
+            res = await session.execute(select(Hike.id).where(Hike.date < date.today()).order_by(Hike.id))
+            self.past_hikes = list(res.scalars())
+        self.rng.shuffle(self.past_hikes)
+
+    def random_user(self):
+        return telegram_id(self.rng.randint(1, self.users))
+
+    async def send_text(self, user_id, text):
+        self._update_id += 1
+        message = types.Message(
+            message_id=self._update_id, date=datetime.now(),
+            chat=types.Chat(id=user_id, type="private"),
+            from_user=types.User(id=user_id, is_bot=False, first_name="bench"),
+            text=text,
+        )
+        update = types.Update(update_id=self._update_id, message=message)
+        await main.dp.feed_update(main.bot, update)
+
+    def fsm(self, user_id):
+        return main.dp.fsm.get_context(bot=main.bot, chat_id=user_id, user_id=user_id)
+
+
+@scenario("profile")
+async def profile(bench):
+    user = bench.random_user()
+    return lambda: bench.send_text(user, "/profile")
+
+
+@scenario("history")
+async def history(bench):
+    user = bench.random_user()
+    return lambda: bench.send_text(user, "/history")
+
+
+@scenario("leaders")
+async def leaders(bench):
+    user = bench.random_user()
+    board = bench.rng.choice(["", " month", " season"])
+    return lambda: bench.send_text(user, "/leaders" + board)
+
+
+@scenario("complete_hike_done")
+async def complete_hike_done(bench):
+    hike_id = bench.past_hikes.pop()
+    async with SessionLocal() as session:
+        res = await session.execute(select(HikeParticipant.user_id).where(HikeParticipant.hike_id == hike_id))
+        ids = [uid for uid in res.scalars() if bench.rng.random() < 0.9]
+    state = bench.fsm(bench.admin)
+    await state.set_state(main.CompleteHikeStates.completed_ids)
+    await state.set_data({"hike_id": hike_id})
+    return lambda: bench.send_text(bench.admin, ",".join(map(str, ids)))
+
+
+@scenario("check_achievements")
+async def check_achievements_scenario(bench):
+    user_id = bench.rng.randint(1, bench.users)
+    context = {"streak": bench.rng.randint(0, 4), "hard_route": bench.rng.random() < 0.3, "all_routes": False}
+
+    async def run():
+        async with SessionLocal() as session:
+            user = await session.get(User, user_id)
+            await check_achievements(session, user, context)
+            await session.rollback()  # база не меняется между повторами
+    return run
+
+
+@scenario("send_hike_reminders", runs=3)
+async def send_hike_reminders(bench):
+    tomorrow = date.today() + timedelta(days=1)
+    async with SessionLocal() as session:
+        await session.execute(delete(ReminderMark))  # иначе повторы ничего не отправят
+        await session.commit()
+    return lambda: reminders.send_reminders(main.bot, tomorrow, forecast=fake_forecast)
+
+
+@scenario("broadcast_send", runs=1)
+async def broadcast_send(bench):
+    await bench.fsm(bench.admin).set_state(main.BroadcastStates.text)
+
+    async def run():
+        await bench.send_text(bench.admin, "Синтетическое объявление")
+        await asyncio.gather(*list(broadcast._running.values()))
+    return run
+
+
+def summarize(timings, queries, sends):
+    ms = sorted(t * 1000 for t in timings)
+    p95 = statistics.quantiles(ms, n=20)[18] if len(ms) > 1 else ms[0]
+    return {
+        "runs": len(ms),
+        "mean_ms": round(statistics.fmean(ms), 3),
+        "p50_ms": round(statistics.median(ms), 3),
+        "p95_ms": round(p95, 3),
+        "max_ms": round(ms[-1], 3),
+        "queries_per_run": round(statistics.fmean(queries), 2),
+        "max_queries": max(queries),
+        "sends_per_run": round(statistics.fmean(sends), 2),
+    }
+
+
+async def measure(bench, name, runs):
+    prepare, fixed_runs = SCENARIOS[name]
+    timings, queries, sends = [], [], []
+    for _ in range(fixed_runs or runs):
+        run = await prepare(bench)
+        q0, s0 = bench.queries, bench.session.total()
+        t0 = time.perf_counter()
+        await run()
+        timings.append(time.perf_counter() - t0)
+        queries.append(bench.queries - q0)
+        sends.append(bench.session.total() - s0)
+    return summarize(timings, queries, sends)
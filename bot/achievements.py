@@ -0,0 +1,157 @@
+from sqlalchemy import select, case, or_, and_, func, distinct, exists, Integer
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from bot.db import User, Hike, Route, HikeParticipant, Achievement, UserAchievement, dialect_insert
+
+def get_rank(hikes_count, total_distance):
+    # Примерная логика рангов
+    if hikes_count >= 50 or total_distance >= 1000:
+        return "Покоритель"
+    elif hikes_count >= 20 or total_distance >= 500:
+        return "Скаут"
+    elif hikes_count >= 10:
+        return "Турист"
+    elif hikes_count >= 3:
+        return "Новичок+"
+    else:
+        return "Новичок"
+
+def rank_case(hikes_count, total_distance):
+    # То же, что get_rank, но SQL-выражением — для массовых UPDATE
+    return case(
+        (or_(hikes_count >= 50, total_distance >= 1000), "Покоритель"),
+        (or_(hikes_count >= 20, total_distance >= 500), "Скаут"),
+        (hikes_count >= 10, "Турист"),
+        (hikes_count >= 3, "Новичок+"),
+        else_="Новичок",
+    )
+
+# Правила для массового пересчёта (bot.backfill): SQL-условие на строку users
+
+class day_number(FunctionElement):
+    # Номер дня для даты — чтобы искать походы в соседние дни одинаково в PostgreSQL и SQLite
+    type = Integer()
+    inherit_cache = True
+
+@compiles(day_number)
+def _day_number_pg(element, compiler, **kw):
+    return "(%s - DATE '1970-01-01')" % compiler.process(element.clauses, **kw)
+
+@compiles(day_number, "sqlite")
+def _day_number_sqlite(element, compiler, **kw):
+    return "CAST(julianday(%s) AS INTEGER)" % compiler.process(element.clauses, **kw)
+
+def _completed():
+    return (
+        select(HikeParticipant.user_id, Hike.date, Hike.route_id)
+        .join(Hike, HikeParticipant.hike_id == Hike.id)
+        .where(HikeParticipant.completed == 1)
+    )
+
+def hard_route_sql():
+    q = _completed().join(Route, Hike.route_id == Route.id).where(
+        HikeParticipant.user_id == User.id, func.lower(Route.difficulty) == "сложная"
+    )
+    return exists(q)
+
+def all_routes_sql():
+    covered = (
+        select(func.count(distinct(Hike.route_id)))
+        .join(HikeParticipant, HikeParticipant.hike_id == Hike.id)
+        .where(HikeParticipant.completed == 1, HikeParticipant.user_id == User.id)
+        .scalar_subquery()
+    )
+    total = select(func.count(Route.id)).scalar_subquery()
+    return and_(total > 0, covered >= total)
+
+def streak_sql(length=3):
+    # «Острова» подряд идущих дней: номер дня минус номер по порядку постоянен внутри серии
+    days = select(HikeParticipant.user_id, Hike.date).join(Hike, HikeParticipant.hike_id == Hike.id) \
+        .where(HikeParticipant.completed == 1).distinct().subquery()
+    islands = select(
+        days.c.user_id,
+        (day_number(days.c.date) - func.row_number().over(partition_by=days.c.user_id, order_by=days.c.date)).label("grp"),
+    ).subquery()
+    streakers = select(islands.c.user_id).group_by(islands.c.user_id, islands.c.grp).having(func.count() >= length)
+    return User.id.in_(streakers)
+
+ACHIEVEMENTS = [
+    {"name": "Первые шаги", "desc": "5 походов", "icon": "🚶", "cond": lambda u, ctx: u.hikes_count >= 5,
+     "sql": lambda: User.hikes_count >= 5},
+    {"name": "Серебряный туризм", "desc": "10 походов", "icon": "🥈", "cond": lambda u, ctx: u.hikes_count >= 10,
+     "sql": lambda: User.hikes_count >= 10},
+    {"name": "Золотой треккер", "desc": "50 походов", "icon": "🥇", "cond": lambda u, ctx: u.hikes_count >= 50,
+     "sql": lambda: User.hikes_count >= 50},
+    {"name": "100 км", "desc": "100 км суммарно", "icon": "🏅", "cond": lambda u, ctx: u.total_distance >= 100,
+     "sql": lambda: User.total_distance >= 100},
+    {"name": "500 км", "desc": "500 км суммарно", "icon": "🏆", "cond": lambda u, ctx: u.total_distance >= 500,
+     "sql": lambda: User.total_distance >= 500},
+    {"name": "Высотомер", "desc": "10 000 м набора", "icon": "⛰️", "cond": lambda u, ctx: u.total_elevation >= 10000,
+     "sql": lambda: User.total_elevation >= 10000},
+    {"name": "Первый поход", "desc": "Первое участие", "icon": "🚶", "cond": lambda u, ctx: u.hikes_count == 1,
+     "sql": lambda: User.hikes_count >= 1},
+    {"name": "3 подряд", "desc": "3 похода подряд без пропусков", "icon": "🔗", "cond": lambda u, ctx: ctx.get('streak', 0) >= 3,
+     "sql": lambda: streak_sql(3)},
+    {"name": "Сложный маршрут", "desc": "Прохождение сложного маршрута", "icon": "🧗", "cond": lambda u, ctx: ctx.get('hard_route', False),
+     "sql": hard_route_sql},
+    {"name": "Покоритель высот", "desc": "20 000 м набора", "icon": "🏔️", "cond": lambda u, ctx: u.total_elevation >= 20000,
+     "sql": lambda: User.total_elevation >= 20000},
+    {"name": "Все маршруты клуба", "desc": "Пройден каждый маршрут", "icon": "🌍", "cond": lambda u, ctx: ctx.get('all_routes', False),
+     "sql": all_routes_sql},
+]
+
+# Каталог достижений в памяти: name -> Achievement. Синхронизируется с БД при старте.
+_catalog = {}
+
+async def sync_achievements(session):
+    # Добавляет в БД недостающие записи из ACHIEVEMENTS и загружает каталог. Не коммитит.
+    insert = dialect_insert(session)
+    await session.execute(
+        insert(Achievement)
+        .values([{"name": a["name"], "description": a["desc"], "icon": a["icon"]} for a in ACHIEVEMENTS])
+        .on_conflict_do_nothing(index_elements=["name"])
+    )
+    res = await session.execute(select(Achievement))
+    _catalog.clear()
+    _catalog.update({a.name: a for a in res.scalars()})
+    return _catalog
+
+async def award_achievements(session, users, contexts=None):
+    # Одно чтение и одна вставка на всю группу пользователей. Не коммитит.
+    # Возвращает {user_id: [Achievement, ...]} — только реально выданные сейчас.
+    contexts = contexts or {}
+    if not _catalog:
+        await sync_achievements(session)
+    user_ids = [u.id for u in users]
+    res = await session.execute(
+        select(UserAchievement.user_id, UserAchievement.achievement_id).where(UserAchievement.user_id.in_(user_ids))
+    )
+    got = {(uid, aid) for uid, aid in res}
+    rows = []
+    for user in users:
+        context = contexts.get(user.id) or {}
+        for ach in ACHIEVEMENTS:
+            a = _catalog[ach["name"]]
+            if (user.id, a.id) not in got and ach["cond"](user, context):
+                rows.append({"user_id": user.id, "achievement_id": a.id})
+    awarded = {uid: [] for uid in user_ids}
+    if not rows:
+        return awarded
+    insert = dialect_insert(session)
+    res = await session.execute(
+        insert(UserAchievement)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=["user_id", "achievement_id"])
+        .returning(UserAchievement.user_id, UserAchievement.achievement_id)
+    )
+    by_id = {a.id: a for a in _catalog.values()}
+    for uid, aid in res:
+        awarded[uid].append(by_id[aid])
+    order = {a["name"]: i for i, a in enumerate(ACHIEVEMENTS)}
+    for items in awarded.values():
+        items.sort(key=lambda a: order[a.name])
+    return awarded
+
+async def check_achievements(session, user, context=None):
+    awarded = await award_achievements(session, [user], {user.id: context})
+    return awarded[user.id]
@@ -0,0 +1,144 @@
+import asyncio
+import heapq
+import time
+from datetime import datetime, timezone
+from itertools import groupby
+from sqlalchemy import select, delete, tuple_
+from bot.config import AUTO_DELETE_DELAY, AUTO_DELETE_BATCH_WINDOW
+from bot.db import SessionLocal, PendingDeletion, dialect_insert
+
+# Автоудаление ответов бота в группах: одна куча (время удаления, чат, сообщение)
+# и один фоновый воркер вместо спящей задачи на каждое сообщение. Воркер забирает
+# всё, что наступит в пределах окна AUTO_DELETE_BATCH_WINDOW, и удаляет пачками
+# deleteMessages (до 100 сообщений одного чата за вызов).
+# Очередь дублируется в таблицу pending_deletions — новые записи сбрасываются туда
+# пачкой на каждом проходе воркера (не реже раза в окно), поэтому после перезапуска
+# удаления не теряются. Память — только кортежи ожидающих удалений, без задач и таймеров.
+
+MAX_BATCH = 100  # лимит deleteMessages
+MAX_SLEEP = 60
+
+
+def utc(timestamp):
+    # В БД время — наивное UTC, как и в остальных таблицах
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+
+class AutoDeleter:
+    def __init__(self, session_factory=SessionLocal, delay=AUTO_DELETE_DELAY, window=AUTO_DELETE_BATCH_WINDOW):
+        self.session_factory = session_factory
+        self.delay = delay
+        self.window = window
+        self._heap = []  # (unix-время удаления, chat_id, message_id)
+        self._unsaved = []  # запланированные, но ещё не записанные в БД
+        self._wakeup = None  # создаётся в start(): событие должно принадлежать рабочему циклу событий
+        self._task = None
+        self.deleted = 0
+        self.api_calls = 0
+        self.failed = 0
+
+    def schedule(self, chat_id, message_id, delay=None):
+        item = (time.time() + (self.delay if delay is None else delay), chat_id, message_id)
+        earliest = self._heap[0][0] if self._heap else None
+        heapq.heappush(self._heap, item)
+        self._unsaved.append(item)
+        if self._wakeup is not None and (earliest is None or item[0] < earliest or len(self._unsaved) == 1):
+            self._wakeup.set()
+
+    async def load(self):
+        # Незавершённые удаления прошлого запуска; просроченные удалятся на первом проходе
+        async with self.session_factory() as session:
+            res = await session.execute(
+                select(PendingDeletion.delete_at, PendingDeletion.chat_id, PendingDeletion.message_id)
+            )
+            for delete_at, chat_id, message_id in res:
+                at = delete_at.replace(tzinfo=timezone.utc).timestamp()
+                heapq.heappush(self._heap, (at, chat_id, message_id))
+        return len(self._heap)
+
+    async def _save(self):
+        items, self._unsaved = self._unsaved, []
+        if not items:
+            return
+        async with self.session_factory() as session:
+            insert = dialect_insert(session)
+            await session.execute(
+                insert(PendingDeletion).on_conflict_do_nothing(),
+                [{"chat_id": c, "message_id": m, "delete_at": utc(at)} for at, c, m in items],
+            )
+            await session.commit()
+
+    async def _forget(self, items):
+        async with self.session_factory() as session:
+            await session.execute(
+                delete(PendingDeletion).where(
+                    tuple_(PendingDeletion.chat_id, PendingDeletion.message_id).in_([(c, m) for _, c, m in items])
+                )
+            )
+            await session.commit()
+
+    def _pop_due(self, now):
+        due = []
+        while self._heap and self._heap[0][0] <= now + self.window:
+            due.append(heapq.heappop(self._heap))
+        return due
+
+    async def _delete(self, bot, due):
+        due.sort(key=lambda item: item[1])
+        for chat_id, items in groupby(due, key=lambda item: item[1]):
+            ids = sorted({m for _, _, m in items})
+            for i in range(0, len(ids), MAX_BATCH):
+                self.api_calls += 1
+                try:
+                    await bot.delete_messages(chat_id=chat_id, message_ids=ids[i:i + MAX_BATCH])
+                    self.deleted += len(ids[i:i + MAX_BATCH])
+                except Exception:
+                    self.failed += 1  # сообщение уже удалено, бот исключён из группы и т.п.
+
+    async def run_once(self, bot, now=None):
+        await self._save()
+        due = self._pop_due(time.time() if now is None else now)
+        if due:
+            await self._delete(bot, due)
+            await self._forget(due)
+        return len(due)
+
+    async def _wait(self):
+        self._wakeup.clear()
+        if self._unsaved:
+            return
+        timeout = self._heap[0][0] - time.time() - self.window if self._heap else MAX_SLEEP
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), min(max(timeout, 0), MAX_SLEEP))
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self, bot):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        while True:
+            # Воркер один на процесс: любая ошибка прохода логируется, и он продолжает работу
+            try:
+                await self.run_once(bot)
+                await self._wait()
+            except Exception as e:
+                print(f"Автоудаление: ошибка {e!r}")
+            await asyncio.sleep(self.window)  # копим пачку для записи и удаления
+
+    async def start(self, bot):
+        loaded = await self.load()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self.run(bot))
+        return loaded
+
+    def stats(self):
+        return {
+            "pending": len(self._heap),
+            "unsaved": len(self._unsaved),
+            "deleted": self.deleted,
+            "api_calls": self.api_calls,
+            "failed": self.failed,
+        }
+
+
+auto_deleter = AutoDeleter()
@@ -0,0 +1,101 @@
+import argparse
+import asyncio
+from collections import Counter
+from sqlalchemy import select, update, insert, func, exists, literal
+from bot.config import BACKFILL_BATCH_SIZE
+from bot.db import SessionLocal, User, UserAchievement
+from bot.achievements import ACHIEVEMENTS, rank_case, sync_achievements
+
+# Пересчёт рангов и достижений для всех участников после изменения правил.
+# Каждое правило — одно SQL-условие, поэтому пачка пользователей обрабатывается
+# одним UPDATE для рангов и одним INSERT ... SELECT на каждое достижение.
+# dry_run только считает, кто что получит.
+
+
+def format_report(report, dry_run=False):
+    head = "🔎 Пробный прогон (ничего не изменено)" if dry_run else "✅ Пересчёт завершён"
+    lines = [head, f"Проверено пользователей: {report['users']}"]
+    if report["ranks"]:
+        lines.append("Смена ранга:")
+        lines += [f"  • {rank}: {n}" for rank, n in sorted(report["ranks"].items())]
+    else:
+        lines.append("Ранги без изменений.")
+    if report["achievements"]:
+        lines.append("Новые достижения:")
+        lines += [f"  • {name}: {n}" for name, n in report["achievements"].items()]
+    else:
+        lines.append("Новых достижений нет.")
+    return "\n".join(lines)
+
+
+async def _process_batch(session, lo, hi, catalog, dry_run, report):
+    in_batch = (User.id > lo, User.id <= hi)
+    new_rank = rank_case(User.hikes_count, User.total_distance)
+    res = await session.execute(
+        select(new_rank, func.count()).where(*in_batch, User.rank != new_rank).group_by(new_rank)
+    )
+    for rank, n in res:
+        report["ranks"][rank] += n
+    if not dry_run:
+        await session.execute(
+            update(User).where(*in_batch, User.rank != new_rank).values(rank=new_rank)
+            .execution_options(synchronize_session=False)
+        )
+    for ach in ACHIEVEMENTS:
+        aid = catalog[ach["name"]].id
+        missing = ~exists().where(UserAchievement.user_id == User.id, UserAchievement.achievement_id == aid)
+        cond = (*in_batch, ach["sql"](), missing)
+        if dry_run:
+            res = await session.execute(select(func.count()).select_from(User).where(*cond))
+            n = res.scalar()
+        else:
+            res = await session.execute(
+                insert(UserAchievement).from_select(
+                    ["user_id", "achievement_id"], select(User.id, literal(aid)).where(*cond)
+                )
+            )
+            n = res.rowcount
+        if n:
+            report["achievements"][ach["name"]] += n
+    res = await session.execute(select(func.count()).select_from(User).where(*in_batch))
+    report["users"] += res.scalar()
+
+
+async def backfill(session_factory=SessionLocal, dry_run=False, batch_size=BACKFILL_BATCH_SIZE, progress=None):
+    async with session_factory() as session:
+        catalog = await sync_achievements(session)
+        await session.commit()
+        res = await session.execute(select(func.max(User.id)))
+        max_id = res.scalar() or 0
+    report = {"users": 0, "ranks": Counter(), "achievements": Counter()}
+    lo = 0
+    while lo < max_id:
+        hi = lo + batch_size
+        # Каждая пачка — своя транзакция: прерванный пересчёт можно просто запустить снова
+        async with session_factory() as session:
+            await _process_batch(session, lo, hi, catalog, dry_run, report)
+            if dry_run:
+                await session.rollback()
+            else:
+                await session.commit()
+        lo = hi
+        if progress:
+            await progress(min(lo, max_id), max_id, report)
+    return report
+
+
+async def _cli():
+    parser = argparse.ArgumentParser(description="Пересчёт рангов и достижений для всех участников")
+    parser.add_argument("--dry-run", action="store_true", help="только посчитать изменения")
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE)
+    args = parser.parse_args()
+
+    async def progress(done, total, report):
+        print(f"… {done}/{total}")
+
+    report = await backfill(dry_run=args.dry_run, batch_size=args.batch_size, progress=progress)
+    print(format_report(report, args.dry_run))
+
+
+if __name__ == "__main__":
+    asyncio.run(_cli())
@@ -0,0 +1,215 @@
+import asyncio
+import time
+from datetime import datetime
+from aiogram.exceptions import TelegramForbiddenError
+from sqlalchemy import select, update, insert, bindparam
+from bot.config import BROADCAST_CONCURRENCY, BROADCAST_BATCH_SIZE, BROADCAST_PROGRESS_INTERVAL
+from bot.db import SessionLocal, User, BroadcastJob, BroadcastDelivery
+from bot.sender import send_priority, PRIORITY_BROADCAST
+
+# Рассылка — это задача в БД: получатели читаются пачками по users.id (keyset),
+# каждая пачка сначала записывается в журнал как pending вместе со сдвигом курсора,
+# потом отправляется параллельно, потом статусы фиксируются.
+# После перезапуска задача продолжается с курсора, а «зависшие» pending помечаются failed —
+# так никто не получит объявление дважды. Если рассылка упала с ошибкой (например, БД),
+# задача помечается failed и админ получает сообщение с причиной.
+
+_running = {}  # job_id -> asyncio.Task
+
+
+def format_progress(job):
+    head = {"done": "Рассылка завершена.", "failed": "❌ Рассылка прервана из-за ошибки."}.get(
+        job.status, "⏳ Рассылка идёт…"
+    )
+    return (
+        f"{head}\n"
+        f"Отправлено: {job.sent}\n"
+        f"Ошибок: {job.failed}\n"
+        f"Заблокировали бота: {job.blocked}"
+    )
+
+
+async def create_job(admin_id, chat_id, text, session_factory=SessionLocal):
+    async with session_factory() as session:
+        job = BroadcastJob(admin_id=admin_id, chat_id=chat_id, text=text)
+        session.add(job)
+        await session.commit()
+        return job
+
+
+async def set_progress_message(job_id, message_id, session_factory=SessionLocal):
+    async with session_factory() as session:
+        await session.execute(
+            update(BroadcastJob).where(BroadcastJob.id == job_id).values(progress_message_id=message_id)
+        )
+        await session.commit()
+
+
+async def _deliver(bot, telegram_id, text, sem):
+    # retry_after и лимиты отрабатывает шлюз (bot.sender), здесь только классификация
+    async with sem:
+        try:
+            await bot.send_message(telegram_id, f"📢 Объявление:\n{text}")
+            return "sent", None
+        except TelegramForbiddenError as e:
+            return "blocked", str(e)
+        except Exception as e:
+            return "failed", str(e)
+
+
+async def _claim_batch(job_id, cursor, session_factory):
+    # Одна транзакция: следующая пачка получателей + pending-записи + сдвиг курсора
+    async with session_factory() as session:
+        res = await session.execute(
+            select(User.id, User.telegram_id)
+            .where(User.id > cursor, User.notifications_enabled == 1)
+            .order_by(User.id)
+            .limit(BROADCAST_BATCH_SIZE)
+        )
+        rows = res.all()
+        if not rows:
+            return []
+        await session.execute(
+            insert(BroadcastDelivery),
+            [{"job_id": job_id, "user_id": uid, "status": "pending"} for uid, _ in rows]
+        )
+        await session.execute(
+            update(BroadcastJob).where(BroadcastJob.id == job_id).values(last_user_id=rows[-1][0])
+        )
+        await session.commit()
+        return rows
+
+
+async def _record_batch(job_id, rows, results, session_factory):
+    counts = {"sent": 0, "failed": 0, "blocked": 0}
+    params = []
+    for (uid, _), (status, error) in zip(rows, results):
+        counts[status] += 1
+        params.append({"j": job_id, "u": uid, "s": status, "e": error[:500] if error else None})
+    deliveries = BroadcastDelivery.__table__
+    async with session_factory() as session:
+        conn = await session.connection()
+        # executemany одним запросом на всю пачку
+        await conn.execute(
+            update(deliveries)
+            .where(deliveries.c.job_id == bindparam("j"), deliveries.c.user_id == bindparam("u"))
+            .values(status=bindparam("s"), error=bindparam("e")),
+            params
+        )
+        await session.execute(
+            update(BroadcastJob).where(BroadcastJob.id == job_id).values(
+                sent=BroadcastJob.sent + counts["sent"],
+                failed=BroadcastJob.failed + counts["failed"],
+                blocked=BroadcastJob.blocked + counts["blocked"],
+            )
+        )
+        await session.commit()
+        return await session.get(BroadcastJob, job_id, populate_existing=True)
+
+
+async def _report(bot, job):
+    if not job.progress_message_id:
+        return
+    try:
+        await bot.edit_message_text(format_progress(job), chat_id=job.chat_id, message_id=job.progress_message_id)
+    except Exception:
+        pass  # «message is not modified» и т.п. — прогресс не критичен
+
+
+async def _fail(job_id, error, session_factory):
+    # Незавершённая пачка, как и при падении процесса, считается недоставленной
+    async with session_factory() as session:
+        res = await session.execute(
+            update(BroadcastDelivery)
+            .where(BroadcastDelivery.job_id == job_id, BroadcastDelivery.status == "pending")
+            .values(status="failed", error=f"aborted: {error!r}"[:500])
+        )
+        job = await session.get(BroadcastJob, job_id)
+        job.failed += res.rowcount
+        job.status = "failed"
+        job.finished_at = datetime.utcnow()
+        await session.commit()
+        return job
+
+
+async def run_broadcast(bot, job_id, session_factory=SessionLocal):
+    send_priority.set(PRIORITY_BROADCAST)
+    job = None
+    try:
+        async with session_factory() as session:
+            job = await session.get(BroadcastJob, job_id)
+            if not job or job.status != "running":
+                return job
+        return await _run(bot, job, session_factory)
+    except Exception as e:
+        # Задача фоновая: без этого ошибка всплыла бы только как «Task exception was never retrieved»
+        print(f"Рассылка #{job_id} прервана: {e!r}")
+        chat_id = job.chat_id if job else None
+        try:
+            job = await _fail(job_id, e, session_factory)
+        except Exception as db_error:
+            print(f"Рассылка #{job_id}: не удалось отметить сбой: {db_error!r}")
+        else:
+            await _report(bot, job)
+        if chat_id is not None:
+            try:
+                await bot.send_message(chat_id, f"❌ Рассылка #{job_id} остановлена из-за ошибки: {e!r}"[:4000])
+            except Exception:
+                pass
+        return job
+
+
+async def _run(bot, job, session_factory):
+    job_id = job.id
+    async with session_factory() as session:
+        # Пачка, прерванная падением процесса: неизвестно, дошло ли сообщение — не повторяем
+        res = await session.execute(
+            update(BroadcastDelivery)
+            .where(BroadcastDelivery.job_id == job_id, BroadcastDelivery.status == "pending")
+            .values(status="failed", error="interrupted")
+        )
+        if res.rowcount:
+            await session.execute(
+                update(BroadcastJob).where(BroadcastJob.id == job_id).values(failed=BroadcastJob.failed + res.rowcount)
+            )
+        await session.commit()
+    cursor = job.last_user_id
+    sem = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+    last_report = 0.0
+    while True:
+        rows = await _claim_batch(job_id, cursor, session_factory)
+        if not rows:
+            break
+        cursor = rows[-1][0]
+        results = await asyncio.gather(*(_deliver(bot, tg_id, job.text, sem) for _, tg_id in rows))
+        job = await _record_batch(job_id, rows, results, session_factory)
+        if time.monotonic() - last_report >= BROADCAST_PROGRESS_INTERVAL:
+            last_report = time.monotonic()
+            await _report(bot, job)
+    async with session_factory() as session:
+        job = await session.get(BroadcastJob, job_id)
+        job.status = "done"
+        job.finished_at = datetime.utcnow()
+        await session.commit()
+    await _report(bot, job)
+    return job
+
+
+def start_broadcast(bot, job_id, session_factory=SessionLocal):
+    task = _running.get(job_id)
+    if task and not task.done():
+        return task
+    task = asyncio.create_task(run_broadcast(bot, job_id, session_factory))
+    _running[job_id] = task
+    task.add_done_callback(lambda t: _running.pop(job_id, None))
+    return task
+
+
+async def resume_broadcasts(bot, session_factory=SessionLocal):
+    async with session_factory() as session:
+        res = await session.execute(select(BroadcastJob.id).where(BroadcastJob.status == "running"))
+        job_ids = [r[0] for r in res]
+    for job_id in job_ids:
+        print(f"Продолжаем рассылку #{job_id}")
+        start_broadcast(bot, job_id, session_factory)
+    return job_ids
@@ -0,0 +1,104 @@
+from sqlalchemy import select, update, case, func, distinct, literal
+from bot.db import User, Hike, Route, HikeParticipant
+from bot.achievements import rank_case, award_achievements
+
+# Завершение похода одной транзакцией и набором запросов, не зависящим от числа участников:
+# флаги completed и статистика обновляются массовыми UPDATE (инкремент в SQL — без гонки
+# между админами), контекст для достижений (серия, все маршруты) — одним запросом.
+
+
+def streak_from_dates(dates):
+    # dates — до трёх последних дат завершённых походов, от новых к старым
+    if len(dates) == 3 and (dates[0] - dates[1]).days == (dates[1] - dates[2]).days == 1:
+        return 3
+    return 1
+
+
+async def load_achievement_context(session, user_ids_q, route, total_routes=None):
+    # Строки: (User, дата одного из трёх последних походов, пройдено маршрутов, всего маршрутов)
+    done = (
+        select(HikeParticipant.user_id, Hike.date, Hike.route_id)
+        .join(Hike, HikeParticipant.hike_id == Hike.id)
+        .where(HikeParticipant.completed == 1, HikeParticipant.user_id.in_(user_ids_q))
+        .subquery()
+    )
+    ranked = select(
+        done.c.user_id, done.c.date,
+        func.row_number().over(partition_by=done.c.user_id, order_by=done.c.date.desc()).label("rn"),
+    ).subquery()
+    covered = (
+        select(done.c.user_id, func.count(distinct(done.c.route_id)).label("routes"))
+        .group_by(done.c.user_id)
+        .subquery()
+    )
+    if total_routes is None:
+        total_routes = select(func.count(Route.id)).scalar_subquery()
+    else:
+        total_routes = literal(total_routes)
+    q = (
+        select(User, ranked.c.date, covered.c.routes, total_routes)
+        .join(ranked, ranked.c.user_id == User.id)
+        .join(covered, covered.c.user_id == User.id)
+        .where(ranked.c.rn <= 3)
+        .order_by(User.id, ranked.c.rn)
+        .execution_options(populate_existing=True)
+    )
+    res = await session.execute(q)
+    users, dates, coverage = {}, {}, {}
+    for user, hike_date, routes, total in res:
+        users[user.id] = user
+        dates.setdefault(user.id, []).append(hike_date)
+        coverage[user.id] = (routes, total)
+    hard_route = route.difficulty.lower() == "сложная"
+    contexts = {}
+    for uid in users:
+        routes, total = coverage[uid]
+        contexts[uid] = {
+            "streak": streak_from_dates(dates[uid]),
+            "hard_route": hard_route,
+            "all_routes": bool(total) and routes >= total,
+        }
+    return users, contexts
+
+
+async def complete_hike(session, hike_id, ids, catalog=None):
+    # Возвращает (route, [(user, new_achievements), ...]) для дошедших участников.
+    # С каталогом маршрутов маршрут и их общее число берутся из памяти
+    if catalog is not None:
+        res = await session.execute(select(Hike.route_id).where(Hike.id == hike_id))
+        route = catalog.get(res.scalar_one())
+    if catalog is None or route is None:
+        res = await session.execute(
+            select(Route).join(Hike, Hike.route_id == Route.id).where(Hike.id == hike_id)
+        )
+        route = res.scalar_one()
+        catalog = None
+    finishers_q = select(HikeParticipant.user_id).where(
+        HikeParticipant.hike_id == hike_id, HikeParticipant.user_id.in_(ids)
+    )
+    # Статистика — до смены флагов, чтобы подзапрос видел участников похода
+    new_hikes = User.hikes_count + 1
+    new_distance = User.total_distance + route.distance
+    await session.execute(
+        update(User)
+        .where(User.id.in_(finishers_q))
+        .values(
+            total_distance=new_distance,
+            total_elevation=User.total_elevation + route.elevation,
+            hikes_count=new_hikes,
+            rank=rank_case(new_hikes, new_distance),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    await session.execute(
+        update(HikeParticipant)
+        .where(HikeParticipant.hike_id == hike_id)
+        .values(completed=case((HikeParticipant.user_id.in_(ids), 1), else_=0))
+        .execution_options(synchronize_session=False)
+    )
+    users, contexts = await load_achievement_context(
+        session, finishers_q, route, total_routes=len(catalog) if catalog is not None else None
+    )
+    awarded = await award_achievements(session, list(users.values()), contexts)
+    await session.commit()
+    return route, [(user, awarded[uid]) for uid, user in users.items()]
@@ -6,4 +6,94 @@ load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN", "")
 DATABASE_URL = os.getenv("DATABASE_URL", "")
 ADMINS = [int(x) for x in os.getenv("ADMINS", "").split(",") if x.strip().isdigit()] 
-OWNER_ID = int(os.getenv("OWNER_ID", "0")) 
\ No newline at end of file
+OWNER_ID = int(os.getenv("OWNER_ID", "0"))
+
+# Рассылки
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "10"))
+BROADCAST_BATCH_SIZE = int(os.getenv("BROADCAST_BATCH_SIZE", "200"))
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv("BROADCAST_PROGRESS_INTERVAL", "3"))
+
+# Лимиты исходящих сообщений (Telegram: ~30/с на бота, ~1/с в чат, ~20/мин в группу)
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", "1"))
+SEND_GROUP_RATE_PER_MIN = float(os.getenv("SEND_GROUP_RATE_PER_MIN", "20"))
+
+# Автоудаление ответов бота в группах
+AUTO_DELETE_DELAY = float(os.getenv("AUTO_DELETE_DELAY", "15"))
+AUTO_DELETE_BATCH_WINDOW = float(os.getenv("AUTO_DELETE_BATCH_WINDOW", "1"))  # удаления в пределах окна идут одним вызовом
+
+# Напоминания о походах
+REMINDER_CONCURRENCY = int(os.getenv("REMINDER_CONCURRENCY", "20"))
+REMINDER_TIMES = [t.strip() for t in os.getenv("REMINDER_TIMES", "18:00").split(",") if t.strip()]  # местное время клуба
+REMINDER_CATCHUP_HOURS = float(os.getenv("REMINDER_CATCHUP_HOURS", "12"))  # пропущенный запуск старше — не догоняем
+
+# Планировщик задач (таблица scheduled_jobs)
+CLUB_TIMEZONE = os.getenv("CLUB_TIMEZONE", "Asia/Bishkek")
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "30"))
+JOB_LEASE = int(os.getenv("JOB_LEASE", "300"))  # аренда продлевается, пока задача выполняется
+JOB_RETRY_DELAY = int(os.getenv("JOB_RETRY_DELAY", "600"))
+
+# Прогноз погоды (open-meteo)
+OPEN_METEO_URL = os.getenv("OPEN_METEO_URL", "https://api.open-meteo.com/v1/forecast")
+WEATHER_TIMEOUT = float(os.getenv("WEATHER_TIMEOUT", "10"))  # общий дедлайн вызова, включая повторы
+WEATHER_ATTEMPT_TIMEOUT = float(os.getenv("WEATHER_ATTEMPT_TIMEOUT", "4"))
+WEATHER_ATTEMPTS = int(os.getenv("WEATHER_ATTEMPTS", "3"))
+WEATHER_BREAKER_FAILURES = int(os.getenv("WEATHER_BREAKER_FAILURES", "5"))  # неудачных вызовов подряд (после всех повторов) до размыкания
+WEATHER_BREAKER_RESET = float(os.getenv("WEATHER_BREAKER_RESET", "60"))  # секунд до пробного запроса
+WEATHER_CACHE_TTL = int(os.getenv("WEATHER_CACHE_TTL", str(60*60)))
+WEATHER_CACHE_SIZE = int(os.getenv("WEATHER_CACHE_SIZE", "1024"))
+WEATHER_ROUND = int(os.getenv("WEATHER_ROUND", "2"))  # знаков после запятой в ключе кэша (~1 км)
+WEATHER_PREFETCH_DAYS = int(os.getenv("WEATHER_PREFETCH_DAYS", "7"))  # open-meteo даёт прогноз максимум на 16 дней
+WEATHER_PREFETCH_INTERVAL = int(os.getenv("WEATHER_PREFETCH_INTERVAL", str(3*60*60)))
+WEATHER_BATCH_SIZE = int(os.getenv("WEATHER_BATCH_SIZE", "50"))  # точек в одном запросе к open-meteo
+
+# Массовый пересчёт рангов и достижений
+BACKFILL_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", "5000"))
+
+# Кэш зарегистрированных пользователей
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "100000"))
+USER_NEGATIVE_TTL = int(os.getenv("USER_NEGATIVE_TTL", "300"))
+
+# Хранилище FSM: memory, sql (таблица fsm_states в основной БД) или redis
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sql")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+FSM_STATE_TTL = int(os.getenv("FSM_STATE_TTL", str(60*60*24*7)))  # незавершённые диалоги старше недели забываются
+
+# Режим работы: polling или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")  # публичный https-адрес, например https://bot.example.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "16"))
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "30"))
+
+# Лидерборд
+LEADERBOARD_TOP_N = int(os.getenv("LEADERBOARD_TOP_N", "10"))
+LEADERBOARD_TTL = int(os.getenv("LEADERBOARD_TTL", str(15*60)))  # страховка, если процессов несколько
+
+# Размер страницы в списках маршрутов и походов
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "10"))
+
+# Импорт треков GPX/KML
+TRACK_MAX_BYTES = int(os.getenv("TRACK_MAX_BYTES", str(20*1024*1024)))  # больше Bot API всё равно не отдаёт
+TRACK_WORKERS = int(os.getenv("TRACK_WORKERS", "2"))  # процессов для разбора
+TRACK_SMOOTHING = int(os.getenv("TRACK_SMOOTHING", "5"))  # окно сглаживания высот, точек
+
+# «Маршруты рядом»: сколько ближайших маршрутов показывать
+NEARBY_LIMIT = int(os.getenv("NEARBY_LIMIT", "5"))
+
+# Поиск маршрутов (/find и inline-режим): сколько результатов и сколько секунд Telegram кэширует ответ
+SEARCH_LIMIT = int(os.getenv("SEARCH_LIMIT", "10"))
+SEARCH_CACHE_TIME = int(os.getenv("SEARCH_CACHE_TIME", "60"))
+
+# Каталог маршрутов в памяти: как часто сверять версию с БД (секунды)
+CATALOG_CHECK_INTERVAL = int(os.getenv("CATALOG_CHECK_INTERVAL", "60"))
+
+# Эндпоинт /metrics в режиме polling (0 — не поднимать)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+
+# Сколько обновлений обрабатывается одновременно (обновления одного пользователя — всегда по очереди)
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", os.getenv("WEBHOOK_WORKERS", "16")))
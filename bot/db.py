@@ -1,16 +1,26 @@
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base, Mapped, mapped_column
-from sqlalchemy import Integer, String, BigInteger, ForeignKey, Float, Date, Text
+from sqlalchemy import Integer, String, BigInteger, ForeignKey, Float, Date, DateTime, Text, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from bot.config import DATABASE_URL
-from datetime import date
+from datetime import date, datetime
 
 Base = declarative_base()
 engine = create_async_engine(DATABASE_URL, echo=False, future=True)
 SessionLocal = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
+def dialect_insert(session):
+    # insert() с поддержкой on_conflict_do_nothing / on_conflict_do_update для текущей БД
+    if session.get_bind().dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    return insert
+
 class User(Base):
     __tablename__ = 'users'
+    # Порядок лидерборда: топ читается по индексу, место — подсчётом по нему же
+    __table_args__ = (Index('ix_users_leaderboard', 'total_distance', 'hikes_count'),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     telegram_id: Mapped[int] = mapped_column(BigInteger, unique=True, index=True)
     name: Mapped[str] = mapped_column(String(128))
@@ -37,13 +47,19 @@ class Route(Base):
 
 class Hike(Base):
     __tablename__ = 'hikes'
+    # (date, id) — фильтры по дате и ключ постраничных списков
+    __table_args__ = (Index('ix_hikes_date_id', 'date', 'id'),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    route_id: Mapped[int] = mapped_column(Integer, ForeignKey('routes.id'))
+    route_id: Mapped[int] = mapped_column(Integer, ForeignKey('routes.id'), index=True)
     date: Mapped[Date] = mapped_column(Date)
     participants = relationship("HikeParticipant", back_populates="hike")
 
 class HikeParticipant(Base):
     __tablename__ = 'hike_participants'
+    __table_args__ = (
+        Index('uq_hike_participants_hike_user', 'hike_id', 'user_id', unique=True),
+        Index('ix_hike_participants_user_completed', 'user_id', 'completed'),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     hike_id: Mapped[int] = mapped_column(Integer, ForeignKey('hikes.id'))
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'))
@@ -59,6 +75,7 @@ class Achievement(Base):
 
 class UserAchievement(Base):
     __tablename__ = 'user_achievements'
+    __table_args__ = (UniqueConstraint('user_id', 'achievement_id', name='uq_user_achievements_user_achievement'),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'))
     achievement_id: Mapped[int] = mapped_column(Integer, ForeignKey('achievements.id'))
@@ -70,4 +87,78 @@ class AdminLog(Base):
     admin_id: Mapped[int] = mapped_column(Integer)
     action: Mapped[str] = mapped_column(String(128))
     details: Mapped[str] = mapped_column(Text)
-    timestamp: Mapped[Date] = mapped_column(Date, default=date.today) 
\ No newline at end of file
+    timestamp: Mapped[Date] = mapped_column(Date, default=date.today)
+
+class BroadcastJob(Base):
+    __tablename__ = 'broadcast_jobs'
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    admin_id: Mapped[int] = mapped_column(BigInteger)
+    chat_id: Mapped[int] = mapped_column(BigInteger)  # куда писать прогресс
+    progress_message_id: Mapped[int] = mapped_column(Integer, nullable=True)
+    text: Mapped[str] = mapped_column(Text)
+    status: Mapped[str] = mapped_column(String(16), default="running")  # running / done / failed
+    last_user_id: Mapped[int] = mapped_column(Integer, default=0)  # курсор keyset-пагинации по users.id
+    sent: Mapped[int] = mapped_column(Integer, default=0)
+    failed: Mapped[int] = mapped_column(Integer, default=0)
+    blocked: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    finished_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
+class BroadcastDelivery(Base):
+    __tablename__ = 'broadcast_deliveries'
+    __table_args__ = (UniqueConstraint('job_id', 'user_id', name='uq_broadcast_deliveries_job_user'),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    job_id: Mapped[int] = mapped_column(Integer, ForeignKey('broadcast_jobs.id'))
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'))
+    status: Mapped[str] = mapped_column(String(16), default="pending")  # pending / sent / failed / blocked
+    error: Mapped[str] = mapped_column(Text, nullable=True)
+
+class FSMState(Base):
+    __tablename__ = 'fsm_states'
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)  # bot:chat:user:thread:business:destiny
+    state: Mapped[str] = mapped_column(String(255), nullable=True)
+    data: Mapped[str] = mapped_column(Text, nullable=True)  # компактный JSON
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+class CacheVersion(Base):
+    # Счётчики версий для кэшей в памяти: процесс сверяет число и перечитывает данные, только если оно изменилось
+    __tablename__ = 'cache_versions'
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=0)
+
+class ScheduledJob(Base):
+    # Периодическая задача: время следующего запуска (UTC) и аренда — кто из процессов её сейчас выполняет
+    __tablename__ = 'scheduled_jobs'
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    next_run_at: Mapped[datetime] = mapped_column(DateTime)
+    last_run_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    lease_owner: Mapped[str] = mapped_column(String(128), nullable=True)
+    lease_until: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
+class ReminderMark(Base):
+    # Напоминание о походе участнику уже отправлено — повторный запуск его не продублирует
+    __tablename__ = 'reminder_marks'
+    hike_id: Mapped[int] = mapped_column(Integer, ForeignKey('hikes.id'), primary_key=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), primary_key=True)
+    sent_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class PendingDeletion(Base):
+    # Ответы бота в группах, которые нужно удалить: очередь автоудаления переживает перезапуск
+    __tablename__ = 'pending_deletions'
+    __table_args__ = (UniqueConstraint('chat_id', 'message_id', name='uq_pending_deletions_chat_message'),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    chat_id: Mapped[int] = mapped_column(BigInteger)
+    message_id: Mapped[int] = mapped_column(Integer)
+    delete_at: Mapped[datetime] = mapped_column(DateTime)
+
+class Forecast(Base):
+    # Прогноз погоды на день в точке маршрута; заполняется фоновой предзагрузкой (bot.weather.prefetch)
+    __tablename__ = 'forecasts'
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    latitude: Mapped[float] = mapped_column(Float, primary_key=True)
+    longitude: Mapped[float] = mapped_column(Float, primary_key=True)
+    t_min: Mapped[float] = mapped_column(Float, nullable=True)
+    t_max: Mapped[float] = mapped_column(Float, nullable=True)
+    precipitation: Mapped[float] = mapped_column(Float, nullable=True)
+    wind: Mapped[float] = mapped_column(Float, nullable=True)
+    fetched_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
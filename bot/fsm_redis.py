@@ -0,0 +1,53 @@
+from aiogram.fsm.storage.redis import RedisStorage
+from bot.fsm_storage import ReadCache, make_key, state_name
+
+# Redis-вариант хранилища FSM (требует пакет redis). Ключи и TTL — как у aiogram,
+# но состояние и данные читаются одним MGET и запоминаются на время обновления.
+
+
+class BatchedRedisStorage(RedisStorage):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache = ReadCache()
+
+    async def _load(self, key):
+        k = make_key(key)
+        cached = self.cache.get(k)
+        if cached is not None:
+            return cached
+        state, data = await self.redis.mget(
+            self.key_builder.build(key, "state"), self.key_builder.build(key, "data")
+        )
+        if isinstance(state, bytes):
+            state = state.decode("utf-8")
+        data = self.json_loads(data.decode("utf-8") if isinstance(data, bytes) else data) if data else {}
+        self.cache.put(k, state, data)
+        return state, dict(data)
+
+    async def get_state(self, key):
+        state, _ = await self._load(key)
+        return state
+
+    async def get_data(self, key):
+        _, data = await self._load(key)
+        return data
+
+    async def set_state(self, key, state=None):
+        await super().set_state(key, state)
+        k = make_key(key)
+        cached = self.cache.get(k)
+        if cached is not None:
+            self.cache.put(k, state_name(state), cached[1])
+
+    async def set_data(self, key, data):
+        await super().set_data(key, data)
+        k = make_key(key)
+        cached = self.cache.get(k)
+        if cached is not None:
+            self.cache.put(k, cached[0], dict(data))
+
+    async def update_data(self, key, data):
+        _, current = await self._load(key)
+        current.update(data)
+        await self.set_data(key, current)
+        return current.copy()
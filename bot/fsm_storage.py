@@ -0,0 +1,158 @@
+import asyncio
+import json
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.fsm.storage.memory import MemoryStorage
+from sqlalchemy import select, delete
+from bot.config import FSM_STORAGE, REDIS_URL, FSM_STATE_TTL
+from bot.db import SessionLocal, FSMState, dialect_insert
+
+# Постоянное хранилище FSM: незаконченные диалоги (регистрация, мастера админов)
+# переживают перезапуск, а несколько процессов бота видят одно и то же состояние.
+
+
+def dumps(data):
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def state_name(state):
+    return state.state if isinstance(state, State) else state
+
+
+def make_key(key):
+    return ":".join(str(x) if x is not None else "" for x in (
+        key.bot_id, key.chat_id, key.user_id, key.thread_id,
+        getattr(key, "business_connection_id", None), key.destiny,
+    ))
+
+
+# Состояние и данные читаются вместе и запоминаются только на время одного обновления:
+# aiogram спрашивает get_state, а обработчик — get_data, в хранилище уходит один запрос.
+# Между обновлениями ничего не кэшируется — следующее обновление пользователя может
+# прийти в другой процесс, и устаревшая копия затёрла бы его запись.
+_update_reads = ContextVar("fsm_update_reads", default=None)
+
+
+@contextmanager
+def update_scope():
+    # Оборачивает обработку одного обновления (OrderedDispatcher.feed_update)
+    token = _update_reads.set({})
+    try:
+        yield
+    finally:
+        _update_reads.reset(token)
+
+
+class ReadCache:
+    def get(self, k):
+        reads = _update_reads.get()
+        item = reads.get(k) if reads is not None else None
+        if item is None:
+            return None
+        return item[0], dict(item[1])
+
+    def put(self, k, state, data):
+        reads = _update_reads.get()
+        if reads is not None:
+            reads[k] = (state, dict(data))
+
+
+class SQLStorage(BaseStorage):
+    def __init__(self, session_factory=SessionLocal, state_ttl=FSM_STATE_TTL):
+        self.session_factory = session_factory
+        self.state_ttl = state_ttl
+        self.cache = ReadCache()
+
+    def _cutoff(self):
+        return datetime.utcnow() - timedelta(seconds=self.state_ttl)
+
+    async def _load(self, k):
+        cached = self.cache.get(k)
+        if cached is not None:
+            return cached
+        async with self.session_factory() as session:
+            res = await session.execute(
+                select(FSMState.state, FSMState.data, FSMState.updated_at).where(FSMState.key == k)
+            )
+            row = res.first()
+        if row is None or row.updated_at < self._cutoff():
+            state, data = None, {}
+        else:
+            state, data = row.state, json.loads(row.data) if row.data else {}
+        self.cache.put(k, state, data)
+        return state, dict(data)
+
+    async def _save(self, k, state, data):
+        async with self.session_factory() as session:
+            if state is None and not data:
+                await session.execute(delete(FSMState).where(FSMState.key == k))
+            else:
+                values = {"state": state, "data": dumps(data) if data else None, "updated_at": datetime.utcnow()}
+                insert = dialect_insert(session)
+                await session.execute(
+                    insert(FSMState).values(key=k, **values)
+                    .on_conflict_do_update(index_elements=["key"], set_=values)
+                )
+            await session.commit()
+        self.cache.put(k, state, data)
+
+    async def set_state(self, key, state=None):
+        k = make_key(key)
+        _, data = await self._load(k)
+        await self._save(k, state_name(state), data)
+
+    async def get_state(self, key):
+        state, _ = await self._load(make_key(key))
+        return state
+
+    async def set_data(self, key, data):
+        k = make_key(key)
+        state, _ = await self._load(k)
+        await self._save(k, state, dict(data))
+
+    async def get_data(self, key):
+        _, data = await self._load(make_key(key))
+        return data
+
+    async def update_data(self, key, data):
+        k = make_key(key)
+        state, current = await self._load(k)
+        current.update(data)
+        await self._save(k, state, current)
+        return current.copy()
+
+    async def purge_expired(self):
+        async with self.session_factory() as session:
+            res = await session.execute(delete(FSMState).where(FSMState.updated_at < self._cutoff()))
+            await session.commit()
+            return res.rowcount
+
+    async def close(self):
+        pass
+
+
+async def purge_loop(storage, interval=60*60):
+    while True:
+        try:
+            removed = await storage.purge_expired()
+            if removed:
+                print(f"FSM: удалено устаревших состояний: {removed}")
+        except Exception as e:
+            print(f"FSM: ошибка очистки: {e!r}")
+        await asyncio.sleep(interval)
+
+
+def create_storage(kind=FSM_STORAGE):
+    if kind == "memory":
+        return MemoryStorage()
+    if kind == "redis":
+        from bot.fsm_redis import BatchedRedisStorage  # нужен пакет redis
+        return BatchedRedisStorage.from_url(
+            REDIS_URL, state_ttl=FSM_STATE_TTL, data_ttl=FSM_STATE_TTL, json_dumps=dumps,
+        )
+    if kind == "sql":
+        return SQLStorage()
+    raise ValueError(f"Неизвестный FSM_STORAGE: {kind}")
@@ -0,0 +1,147 @@
+import time
+from contextvars import ContextVar
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from sqlalchemy import event
+from bot import metrics
+
+# Инструментирование: время каждого обработчика, число и время SQL-запросов
+# за обновление (события движка SQLAlchemy + contextvar текущего обновления)
+# и исходящие вызовы Bot API.
+
+UPDATES = metrics.Counter("bot_updates_total", "Входящие обновления по типу", ["type"])
+HANDLER_SECONDS = metrics.Histogram("bot_handler_seconds", "Время обработки обновления", ["handler"])
+HANDLER_QUERIES = metrics.Histogram(
+    "bot_handler_db_queries", "SQL-запросов за обновление", ["handler"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+HANDLER_DB_SECONDS = metrics.Counter("bot_handler_db_seconds_total", "Время SQL-запросов обработчика", ["handler"])
+HANDLER_API_CALLS = metrics.Counter("bot_handler_api_calls_total", "Вызовы Bot API из обработчика", ["handler"])
+HANDLER_ERRORS = metrics.Counter("bot_handler_errors_total", "Исключения в обработчиках", ["handler"])
+DB_QUERIES = metrics.Counter("bot_db_queries_total", "Все SQL-запросы, включая фоновые задачи")
+API_CALLS = metrics.Counter("bot_api_calls_total", "Запросы к Bot API", ["method", "result"])
+
+UNHANDLED = "unhandled"
+
+_current = ContextVar("update_stats", default=None)
+
+
+class UpdateStats:
+    __slots__ = ("handler", "queries", "db_seconds", "api_calls")
+
+    def __init__(self):
+        self.handler = UNHANDLED
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.api_calls = 0
+
+
+def instrument_engine(engine):
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        DB_QUERIES.inc()
+        stats = _current.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+
+    @event.listens_for(sync_engine, "handle_error")
+    def failed(context):
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+
+class UpdateMiddleware(BaseMiddleware):
+    # Внешняя мидлварь на dp.update: охватывает всё обновление, включая чтение состояния FSM
+    async def __call__(self, handler, event, data):
+        stats = UpdateStats()
+        token = _current.set(stats)
+        UPDATES.inc(event.event_type)
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(stats.handler)
+            raise
+        finally:
+            _current.reset(token)
+            HANDLER_SECONDS.observe(stats.handler, value=time.perf_counter() - start)
+            HANDLER_QUERIES.observe(stats.handler, value=stats.queries)
+            HANDLER_DB_SECONDS.inc(stats.handler, value=stats.db_seconds)
+            HANDLER_API_CALLS.inc(stats.handler, value=stats.api_calls)
+
+
+class HandlerNameMiddleware(BaseMiddleware):
+    # Внутренняя мидлварь: знает, какой обработчик выбран (при SkipHandler — последний)
+    async def __call__(self, handler, event, data):
+        stats = _current.get()
+        if stats is not None:
+            handler_object = data.get("handler")
+            stats.handler = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        return await handler(event, data)
+
+
+class ApiCallsMiddleware(BaseRequestMiddleware):
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        stats = _current.get()
+        if stats is not None:
+            stats.api_calls += 1
+        try:
+            response = await make_request(bot, method)
+        except Exception:
+            API_CALLS.inc(name, "error")
+            raise
+        API_CALLS.inc(name, "ok")
+        return response
+
+
+def instrument(dp, bot, engine):
+    instrument_engine(engine)
+    # Своя мидлварь — раньше FSM, чтобы чтение состояния попало в счёт запросов обновления
+    dp.update.outer_middleware.unregister(dp.fsm)
+    dp.update.outer_middleware(UpdateMiddleware())
+    dp.update.outer_middleware(dp.fsm)
+    names = HandlerNameMiddleware()
+    for name, observer in dp.observers.items():
+        if name not in ("update", "error"):
+            observer.middleware(names)
+    bot.session.middleware(ApiCallsMiddleware())
+
+
+def summary(top=10):
+    # Текст для /stats_debug
+    rows = []
+    for (handler,) in HANDLER_SECONDS.series:
+        n, mean, p95 = HANDLER_SECONDS.summary(handler)
+        _, queries, _ = HANDLER_QUERIES.summary(handler)
+        db_ms = HANDLER_DB_SECONDS.get(handler) / n * 1000
+        rows.append((mean, handler, n, p95, queries, db_ms, HANDLER_ERRORS.get(handler)))
+    rows.sort(reverse=True)
+    lines = ["⏱ Обработчики (по среднему времени):"]
+    for mean, handler, n, p95, queries, db_ms, errors in rows[:top]:
+        p95_text = f"≤{p95 * 1000:.0f} мс" if p95 != float("inf") else f">{HANDLER_SECONDS.buckets[-1]:.0f} с"
+        line = f"{handler}: {n} шт., среднее {mean * 1000:.1f} мс, p95 {p95_text}, SQL {queries:.1f} ({db_ms:.1f} мс)"
+        if errors:
+            line += f", ошибок {errors}"
+        lines.append(line)
+    if not rows:
+        lines.append("— пока нет данных")
+    calls = {}
+    for (method, result), n in API_CALLS.values.items():
+        calls.setdefault(method, [0, 0])[result == "error"] += n
+    lines.append("")
+    lines.append(f"📤 Bot API: {sum(ok for ok, _ in calls.values())} успешно, {sum(err for _, err in calls.values())} с ошибкой")
+    for method, (ok, err) in sorted(calls.items(), key=lambda kv: -sum(kv[1]))[:5]:
+        lines.append(f"{method}: {ok}" + (f" (ошибок {err})" if err else ""))
+    lines.append("")
+    lines.append(f"🗄 SQL-запросов всего: {DB_QUERIES.get()}")
+    return "\n".join(lines)
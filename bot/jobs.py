@@ -0,0 +1,194 @@
+import asyncio
+import os
+import socket
+from datetime import datetime, timedelta, timezone, time as dtime
+from zoneinfo import ZoneInfo
+from sqlalchemy import update, or_
+from bot.config import CLUB_TIMEZONE, JOB_POLL_INTERVAL, JOB_LEASE, JOB_RETRY_DELAY
+from bot.db import SessionLocal, ScheduledJob, dialect_insert
+
+# Планировщик периодических задач. Расписание хранится в таблице scheduled_jobs:
+# время следующего запуска переживает перезапуск, а пропущенный за время простоя
+# запуск выполняется при старте (несколько пропущенных — один раз, за последний).
+# Запуск забирает аренду условным UPDATE, поэтому при нескольких процессах бота
+# задачу выполняет ровно один; аренда продлевается, пока задача идёт, и истекает сама,
+# если процесс упал. Время в БД — наивное UTC, как и в остальных таблицах.
+
+
+def utcnow():
+    return datetime.utcnow()
+
+
+def club_tz(tz=CLUB_TIMEZONE):
+    return ZoneInfo(tz) if isinstance(tz, str) else tz
+
+
+def local_date(moment, tz=CLUB_TIMEZONE):
+    # Дата по часам клуба для момента в наивном UTC
+    return moment.replace(tzinfo=timezone.utc).astimezone(club_tz(tz)).date()
+
+
+class Daily:
+    # Ежедневно в заданное местное время клуба: Daily("09:00", "18:00")
+    def __init__(self, *times, tz=CLUB_TIMEZONE):
+        self.tz = club_tz(tz)
+        self.times = sorted(dtime.fromisoformat(t) if isinstance(t, str) else t for t in times)
+
+    def next_after(self, moment):
+        day = local_date(moment, self.tz)
+        for offset in range(3):  # с запасом на переход на летнее время
+            for t in self.times:
+                local = datetime.combine(day + timedelta(days=offset), t, tzinfo=self.tz)
+                candidate = local.astimezone(timezone.utc).replace(tzinfo=None)
+                if candidate > moment:
+                    return candidate
+        raise ValueError("Пустое расписание")
+
+    def first_run(self, now):
+        return self.next_after(now)
+
+
+class Every:
+    # Через равные промежутки; первый запуск — сразу после регистрации
+    def __init__(self, seconds):
+        self.interval = timedelta(seconds=seconds)
+
+    def first_run(self, now):
+        return now
+
+    def next_after(self, moment):
+        return moment + self.interval
+
+
+class Job:
+    def __init__(self, name, trigger, func, grace=None):
+        self.name = name
+        self.trigger = trigger
+        self.func = func  # корутина-функция func(scheduled_for)
+        self.grace = grace  # насколько можно опоздать; None — догонять всегда
+
+    def due(self, scheduled, now):
+        # Пропущенные запуски сливаются в последний; слишком старый — пропускается
+        while (following := self.trigger.next_after(scheduled)) <= now:
+            scheduled = following
+        if self.grace is not None and now - scheduled > self.grace:
+            return None
+        return scheduled
+
+
+class LeaseLost(Exception):
+    pass
+
+
+class JobScheduler:
+    def __init__(self, session_factory=SessionLocal, owner=None,
+                 lease=JOB_LEASE, retry_delay=JOB_RETRY_DELAY, poll_interval=JOB_POLL_INTERVAL):
+        self.session_factory = session_factory
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease = timedelta(seconds=lease)
+        self.retry_delay = timedelta(seconds=retry_delay)
+        self.poll_interval = poll_interval
+        self.jobs = {}
+        self.runs = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def add(self, name, trigger, func, grace=None):
+        self.jobs[name] = Job(name, trigger, func, grace)
+
+    async def register(self, now=None):
+        # Новая задача получает первый запуск по расписанию; у известных строк расписание не трогаем
+        now = now or utcnow()
+        async with self.session_factory() as session:
+            insert = dialect_insert(session)
+            for job in self.jobs.values():
+                await session.execute(
+                    insert(ScheduledJob)
+                    .values(name=job.name, next_run_at=job.trigger.first_run(now))
+                    .on_conflict_do_nothing(index_elements=["name"])
+                )
+            await session.commit()
+
+    async def _claim(self, job, now):
+        async with self.session_factory() as session:
+            res = await session.execute(
+                update(ScheduledJob)
+                .where(
+                    ScheduledJob.name == job.name,
+                    ScheduledJob.next_run_at <= now,
+                    or_(ScheduledJob.lease_until.is_(None), ScheduledJob.lease_until < now),
+                )
+                .values(lease_owner=self.owner, lease_until=now + self.lease)
+                .returning(ScheduledJob.next_run_at)
+            )
+            scheduled = res.scalar()
+            await session.commit()
+            return scheduled
+
+    async def _update(self, job, **values):
+        # -> False, если аренда уже не наша
+        async with self.session_factory() as session:
+            res = await session.execute(
+                update(ScheduledJob)
+                .where(ScheduledJob.name == job.name, ScheduledJob.lease_owner == self.owner)
+                .values(**values)
+            )
+            await session.commit()
+            return res.rowcount > 0
+
+    async def _heartbeat(self, job):
+        while True:
+            await asyncio.sleep(self.lease.total_seconds() / 3)
+            if not await self._update(job, lease_until=utcnow() + self.lease):
+                raise LeaseLost(f"аренду задачи {job.name} забрал другой процесс")
+
+    async def run_due(self, job, now=None):
+        now = now or utcnow()
+        scheduled = await self._claim(job, now)
+        if scheduled is None:
+            return False  # ещё рано или выполняет другой процесс
+        next_run = job.trigger.next_after(max(now, scheduled))
+        due = job.due(scheduled, now)
+        if due is None:
+            self.skipped += 1
+            print(f"Задача {job.name}: запуск на {scheduled} устарел, следующий — {next_run}")
+            await self._update(job, next_run_at=next_run, lease_owner=None, lease_until=None)
+            return False
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            await job.func(due)
+            if heartbeat.done():
+                # Продление аренды упало (ошибка БД или аренду перехватили) — задачу мог
+                # запустить и другой процесс, поэтому запуск не засчитываем
+                heartbeat.result()
+        except Exception as e:
+            self.failed += 1
+            print(f"Задача {job.name}: ошибка {e!r}, повтор через {self.retry_delay}")
+            # Время запуска не сдвигаем — повтор выполнит тот же запуск; аренда служит паузой
+            await self._update(job, lease_owner=None, lease_until=now + self.retry_delay)
+            return False
+        finally:
+            heartbeat.cancel()
+        self.runs += 1
+        await self._update(job, next_run_at=next_run, last_run_at=utcnow(), lease_owner=None, lease_until=None)
+        return True
+
+    async def tick(self, now=None):
+        for job in self.jobs.values():
+            try:
+                await self.run_due(job, now)
+            except Exception as e:
+                print(f"Планировщик: ошибка задачи {job.name}: {e!r}")
+
+    async def run(self):
+        # Первый tick сразу после старта догоняет пропущенное за время простоя
+        await self.register()
+        while True:
+            await self.tick()
+            await asyncio.sleep(self.poll_interval)
+
+    def stats(self):
+        return {"jobs": len(self.jobs), "runs": self.runs, "failed": self.failed, "skipped": self.skipped}
+
+
+job_scheduler = JobScheduler()
@@ -0,0 +1,157 @@
+import time
+from datetime import date
+from sqlalchemy import select, func, or_, and_
+from bot.config import LEADERBOARD_TOP_N, LEADERBOARD_TTL
+from bot.db import SessionLocal, User, Hike, Route, HikeParticipant
+
+# Лидерборды: общий (по полям users) и за месяц/сезон (по hike_participants и hikes).
+# Снимки живут в памяти: общий сбрасывается при изменении статистики, периодные
+# при завершении похода пересчитываются только для участников этого похода.
+# TTL — страховка на случай нескольких процессов.
+
+SEASONS = {12: "Зима", 1: "Зима", 2: "Зима", 3: "Весна", 4: "Весна", 5: "Весна",
+           6: "Лето", 7: "Лето", 8: "Лето", 9: "Осень", 10: "Осень", 11: "Осень"}
+MONTHS = ["Январь", "Февраль", "Март", "Апрель", "Май", "Июнь",
+          "Июль", "Август", "Сентябрь", "Октябрь", "Ноябрь", "Декабрь"]
+
+
+def _add_months(d, months):
+    m = d.month - 1 + months
+    return date(d.year + m // 12, m % 12 + 1, 1)
+
+
+def period_bounds(kind, day):
+    # Полуинтервал [start, end) и подпись периода
+    if kind == "month":
+        start = date(day.year, day.month, 1)
+        return start, _add_months(start, 1), f"{MONTHS[day.month - 1]} {day.year}"
+    if kind == "season":
+        # Зима начинается в декабре предыдущего года
+        first_month = {12: 12, 1: 12, 2: 12}.get(day.month, (day.month - 3) // 3 * 3 + 3)
+        year = day.year - 1 if day.month in (1, 2) else day.year
+        start = date(year, first_month, 1)
+        return start, _add_months(start, 3), f"{SEASONS[day.month]} {start.year}"
+    raise ValueError(kind)
+
+
+class PeriodBoard:
+    def __init__(self, kind, start, end, title):
+        self.kind = kind
+        self.start = start
+        self.end = end
+        self.title = title
+        self.built_at = 0.0
+        self.totals = {}  # user_id -> (distance, hikes, name, telegram_id)
+        self._sorted = None
+
+    def _query(self):
+        return (
+            select(User.id, User.name, User.telegram_id, func.sum(Route.distance), func.count(HikeParticipant.id))
+            .join(HikeParticipant, HikeParticipant.user_id == User.id)
+            .join(Hike, HikeParticipant.hike_id == Hike.id)
+            .join(Route, Hike.route_id == Route.id)
+            .where(
+                HikeParticipant.completed == 1,
+                Hike.date >= self.start, Hike.date < self.end, Hike.date <= date.today(),
+            )
+            .group_by(User.id, User.name, User.telegram_id)
+        )
+
+    async def build(self, session):
+        res = await session.execute(self._query())
+        self.totals = {uid: (dist or 0.0, n, name, tg) for uid, name, tg, dist, n in res}
+        self._sorted = None
+        self.built_at = time.monotonic()
+
+    async def refresh_users(self, session, user_ids):
+        res = await session.execute(self._query().where(User.id.in_(user_ids)))
+        for uid in user_ids:
+            self.totals.pop(uid, None)
+        for uid, name, tg, dist, n in res:
+            self.totals[uid] = (dist or 0.0, n, name, tg)
+        self._sorted = None
+
+    def ranking(self):
+        if self._sorted is None:
+            self._sorted = sorted(self.totals.values(), key=lambda t: (-t[0], -t[1]))
+        return self._sorted
+
+    def position(self, telegram_id):
+        for i, row in enumerate(self.ranking()):
+            if row[3] == telegram_id:
+                return i + 1
+        return None
+
+
+class Leaderboard:
+    def __init__(self, top_n=LEADERBOARD_TOP_N, ttl=LEADERBOARD_TTL):
+        self.top_n = top_n
+        self.ttl = ttl
+        self._alltime = None
+        self._alltime_at = 0.0
+        self._boards = {}  # (kind, start) -> PeriodBoard
+
+    def invalidate(self):
+        # Общий рейтинг: после завершения похода или ручной правки статистики
+        self._alltime = None
+
+    def _fresh(self, built_at):
+        return time.monotonic() - built_at < self.ttl
+
+    async def top_alltime(self, session):
+        if self._alltime is None or not self._fresh(self._alltime_at):
+            res = await session.execute(
+                select(User.name, User.total_distance, User.hikes_count, User.rank)
+                .order_by(User.total_distance.desc(), User.hikes_count.desc())
+                .limit(self.top_n)
+            )
+            self._alltime = res.all()
+            self._alltime_at = time.monotonic()
+        return self._alltime
+
+    async def position_alltime(self, session, telegram_id):
+        # Место = 1 + число участников строго впереди (индекс по total_distance, hikes_count)
+        res = await session.execute(
+            select(User.total_distance, User.hikes_count).where(User.telegram_id == telegram_id)
+        )
+        me = res.first()
+        if me is None:
+            return None
+        res = await session.execute(
+            select(func.count()).select_from(User).where(or_(
+                User.total_distance > me.total_distance,
+                and_(User.total_distance == me.total_distance, User.hikes_count > me.hikes_count),
+            ))
+        )
+        return res.scalar() + 1
+
+    async def board(self, session, kind, day=None):
+        start, end, title = period_bounds(kind, day or date.today())
+        board = self._boards.get((kind, start))
+        if board is None or not self._fresh(board.built_at):
+            board = PeriodBoard(kind, start, end, title)
+            await board.build(session)
+            # Держим только актуальные периоды
+            self._boards = {k: b for k, b in self._boards.items() if k[0] != kind}
+            self._boards[(kind, start)] = board
+        return board
+
+    async def on_hike_completed(self, hike_id, session_factory=SessionLocal):
+        self.invalidate()
+        async with session_factory() as session:
+            res = await session.execute(
+                select(Hike.date, HikeParticipant.user_id)
+                .join(HikeParticipant, HikeParticipant.hike_id == Hike.id)
+                .where(Hike.id == hike_id)
+            )
+            rows = res.all()
+            if not rows:
+                return
+            hike_date = rows[0][0]
+            user_ids = [uid for _, uid in rows]
+            for board in self._boards.values():
+                if board.start <= hike_date < board.end:
+                    await board.refresh_users(session, user_ids)
+
+
+leaderboard = Leaderboard()
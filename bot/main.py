@@ -1,20 +1,49 @@
 import asyncio
-from aiogram import Bot, Dispatcher, types, F
-from aiogram.filters import CommandStart, Command
+from aiogram import Bot, types, F
+from aiogram.filters import CommandStart, Command, StateFilter
+from aiogram.dispatcher.event.bases import SkipHandler
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.fsm.storage.memory import MemoryStorage
-from bot.config import BOT_TOKEN, ADMINS, OWNER_ID
-from bot.db import SessionLocal, User, Hike, Route, HikeParticipant, UserAchievement, Achievement, AdminLog
-from sqlalchemy import select
-from datetime import datetime, date
+from bot.config import BOT_TOKEN, ADMINS, OWNER_ID, BOT_MODE, METRICS_PORT, REMINDER_TIMES, REMINDER_CATCHUP_HOURS, WEATHER_PREFETCH_INTERVAL, TRACK_MAX_BYTES, NEARBY_LIMIT, SEARCH_LIMIT, SEARCH_CACHE_TIME
+from bot.db import engine, SessionLocal, User, Hike, Route, HikeParticipant, UserAchievement, Achievement, AdminLog, Forecast
+from bot import broadcast, reminders, weather, completion, backfill, fsm_storage, metrics, webhook, pagination, routes_catalog, instrumentation, jobs, tracks
+from bot.scheduler import OrderedDispatcher, QUEUE_WAIT
+from bot.jobs import job_scheduler
+from bot.auto_delete import auto_deleter
+from bot.achievements import sync_achievements
+from bot.achievements import get_rank  # noqa: F401 — прежний адрес bot.main.get_rank, его импортируют тесты
+from bot.users_cache import registered_users
+from bot.leaderboard import leaderboard
+from bot.routes_catalog import route_catalog
+from bot.nearby import nearby_index
+from bot.search import route_search
+from bot.sender import OutboundGateway, priority, PRIORITY_REMINDER
+from sqlalchemy import select, and_
+from datetime import datetime, date, timedelta
 from aiogram.utils.markdown import hlink
-import aiohttp
 from aiogram import filters
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 
 bot = Bot(token=BOT_TOKEN)
-dp = Dispatcher(storage=MemoryStorage())
+# Все исходящие запросы идут через общий шлюз с лимитами и приоритетами
+gateway = OutboundGateway()
+bot.session.middleware(gateway)
+metrics.register("gateway", gateway.stats)
+metrics.register("weather_cache", weather.forecast_cache.stats)
+metrics.register("weather_breaker", weather.client.breaker.stats)
+metrics.register("users_cache", registered_users.stats)
+metrics.register("routes_catalog", route_catalog.stats)
+# Индекс «маршруты рядом» следит за каталогом сам: загрузка и каждое изменение маршрута
+route_catalog.subscribe(nearby_index.sync)
+metrics.register("nearby", nearby_index.stats)
+route_catalog.subscribe(route_search.sync)
+metrics.register("search", route_search.stats)
+metrics.register("auto_delete", auto_deleter.stats)
+# Обновления разных пользователей — параллельно, одного пользователя — по очереди
+dp = OrderedDispatcher(storage=fsm_storage.create_storage())
+metrics.register("scheduler", dp.stats)
+# Время обработчиков, SQL-запросы за обновление и вызовы Bot API — в /metrics и /stats_debug
+instrumentation.instrument(dp, bot, engine)
 
 class RegStates(StatesGroup):
     name = State()
@@ -56,156 +85,50 @@ class EditStatsStates(StatesGroup):
     field = State()
     value = State()
 
-def get_rank(hikes_count, total_distance):
-    # Примерная логика рангов
-    if hikes_count >= 50 or total_distance >= 1000:
-        return "Покоритель"
-    elif hikes_count >= 20 or total_distance >= 500:
-        return "Скаут"
-    elif hikes_count >= 10:
-        return "Турист"
-    elif hikes_count >= 3:
-        return "Новичок+"
-    else:
-        return "Новичок"
-
-ACHIEVEMENTS = [
-    {"name": "Первые шаги", "desc": "5 походов", "icon": "🚶", "cond": lambda u, ctx: u.hikes_count >= 5},
-    {"name": "Серебряный туризм", "desc": "10 походов", "icon": "🥈", "cond": lambda u, ctx: u.hikes_count >= 10},
-    {"name": "Золотой треккер", "desc": "50 походов", "icon": "🥇", "cond": lambda u, ctx: u.hikes_count >= 50},
-    {"name": "100 км", "desc": "100 км суммарно", "icon": "🏅", "cond": lambda u, ctx: u.total_distance >= 100},
-    {"name": "500 км", "desc": "500 км суммарно", "icon": "🏆", "cond": lambda u, ctx: u.total_distance >= 500},
-    {"name": "Высотомер", "desc": "10 000 м набора", "icon": "⛰️", "cond": lambda u, ctx: u.total_elevation >= 10000},
-    {"name": "Первый поход", "desc": "Первое участие", "icon": "🚶", "cond": lambda u, ctx: u.hikes_count == 1},
-    {"name": "3 подряд", "desc": "3 похода подряд без пропусков", "icon": "🔗", "cond": lambda u, ctx: ctx.get('streak', 0) >= 3},
-    {"name": "Сложный маршрут", "desc": "Прохождение сложного маршрута", "icon": "🧗", "cond": lambda u, ctx: ctx.get('hard_route', False)},
-    {"name": "Покоритель высот", "desc": "20 000 м набора", "icon": "🏔️", "cond": lambda u, ctx: u.total_elevation >= 20000},
-    {"name": "Все маршруты клуба", "desc": "Пройден каждый маршрут", "icon": "🌍", "cond": lambda u, ctx: ctx.get('all_routes', False)},
-]
-
-async def check_achievements(session, user, context=None):
-    context = context or {}
-    res = await session.execute(
-        select(Achievement, UserAchievement).join(UserAchievement, Achievement.id == UserAchievement.achievement_id, isouter=True)
-        .where(UserAchievement.user_id == user.id)
-    )
-    got = {a.name for a, ua in res if ua}
-    new_ach = []
-    for ach in ACHIEVEMENTS:
-        if ach["name"] not in got and ach["cond"](user, context):
-            res2 = await session.execute(select(Achievement).where(Achievement.name == ach["name"]))
-            a = res2.scalar_one_or_none()
-            if not a:
-                a = Achievement(name=ach["name"], description=ach["desc"], icon=ach["icon"])
-                session.add(a)
-                await session.commit()
-            ua = UserAchievement(user_id=user.id, achievement_id=a.id)
-            session.add(ua)
-            await session.commit()
-            new_ach.append(a)
-    return new_ach
-
-async def get_weather_forecast(lat, lon, target_date):
-    url = (
-        f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}"
-        f"&daily=temperature_2m_min,temperature_2m_max,precipitation_sum,windspeed_10m_max"
-        f"&timezone=auto&start_date={target_date}&end_date={target_date}"
-    )
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as resp:
-            data = await resp.json()
-            daily = data.get("daily", {})
-            if not daily or not daily.get("temperature_2m_min"):
-                return None
-            t_min = daily["temperature_2m_min"][0]
-            t_max = daily["temperature_2m_max"][0]
-            precip = daily["precipitation_sum"][0]
-            wind = daily["windspeed_10m_max"][0]
-            return t_min, t_max, precip, wind
-
-async def send_hike_reminders():
-    from asyncio import sleep
-    while True:
-        tomorrow = date.today().toordinal() + 1
-        tomorrow_date = date.fromordinal(tomorrow)
-        async with SessionLocal() as session:
-            q = (
-                select(Hike, Route)
-                .join(Route, Hike.route_id == Route.id)
-                .where(Hike.date == tomorrow_date)
-            )
-            hikes = await session.execute(q)
-            hikes = hikes.all()
-            for hike, route in hikes:
-                # Получить прогноз
-                if route.latitude is not None and route.longitude is not None:
-                    weather = await get_weather_forecast(route.latitude, route.longitude, tomorrow_date)
-                else:
-                    weather = None
-                # Получить участников
-                q2 = (
-                    select(HikeParticipant, User)
-                    .join(User, HikeParticipant.user_id == User.id)
-                    .where(HikeParticipant.hike_id == hike.id, HikeParticipant.completed == 1)
-                )
-                participants = await session.execute(q2)
-                participants = participants.all()
-                for hp, user in participants:
-                    if getattr(user, 'notifications_enabled', 1) != 1:
-                        continue
-                    msg = f"Завтра поход по маршруту '{route.name}'!\n"
-                    if weather:
-                        t_min, t_max, precip, wind = weather
-                        msg += (
-                            f"Погода: {t_min:.0f}…{t_max:.0f}°C, осадки: {precip:.1f} мм, ветер: {wind:.0f} м/с.\n"
-                        )
-                        if t_min < 5:
-                            msg += "Рекомендуется тёплая одежда. "
-                        if precip > 0:
-                            msg += "Возможен дождь — возьмите непромокаемую одежду. "
-                    else:
-                        msg += "(Не удалось получить прогноз погоды)\n"
-                    msg += "Не забудьте снаряжение и хорошее настроение! 🥾"
-                    try:
-                        await bot.send_message(user.telegram_id, msg)
-                    except Exception:
-                        pass
-        await sleep(60*60*12)  # Проверять каждые 12 часов
+async def send_hike_reminders(scheduled_for):
+    # scheduled_for — плановое время запуска (UTC); «завтра» — по часам клуба.
+    # Запуск, догнанный после полуночи, напоминает о том же походе, но уже как о сегодняшнем.
+    # Ошибку обработает планировщик: запуск повторится через JOB_RETRY_DELAY.
+    tomorrow_date = jobs.local_date(scheduled_for) + timedelta(days=1)
+    with priority(PRIORITY_REMINDER):
+        sent = await reminders.send_reminders(bot, tomorrow_date, today=jobs.local_date(jobs.utcnow()))
+    print(f"Напоминания на {tomorrow_date}: отправлено {sent}")
+
+job_scheduler.add("hike_reminders", jobs.Daily(*REMINDER_TIMES), send_hike_reminders,
+              grace=timedelta(hours=REMINDER_CATCHUP_HOURS))
+
+async def prefetch_weather(scheduled_for):
+    stored = await weather.prefetch()
+    print(f"Прогнозы погоды обновлены: {stored}")
+
+job_scheduler.add("weather_prefetch", jobs.Every(WEATHER_PREFETCH_INTERVAL), prefetch_weather)
+metrics.register("jobs", job_scheduler.stats)
 
 async def log_admin_action(session, admin_id, action, details):
     log = AdminLog(admin_id=admin_id, action=action, details=details)
     session.add(log)
     await session.commit()
 
-# Хелпер для удаления сообщений бота в группах
-async def delete_later(message: types.Message, delay=15):
-    try:
-        await asyncio.sleep(delay)
-        await message.delete()
-    except Exception:
-        pass
-
-# Миксин для удаления сообщений после ответа в группах
+# Миксин для удаления сообщений после ответа в группах (через общую очередь bot.auto_delete)
 async def auto_delete_reply(message: types.Message, text, **kwargs):
     reply = await message.answer(text, **kwargs)
     if message.chat.type in ("group", "supergroup"):
-        asyncio.create_task(delete_later(reply))
+        auto_deleter.schedule(reply.chat.id, reply.message_id)
 
-# Приветствие новых участников
-@dp.message(F.chat.type.in_(['group', 'supergroup']))
+# Приветствие новых участников (остальной трафик групп сюда даже не попадает)
+@dp.message(F.chat.type.in_(['group', 'supergroup']), F.new_chat_members)
 async def welcome_new_members(message: types.Message):
-    if message.new_chat_members:
-        for user in message.new_chat_members:
-            if user.is_bot:
-                continue
-            await message.reply(f"👋 Добро пожаловать, {user.full_name}!\nЭто бот клуба походов. Для регистрации напиши мне в ЛС /start.")
+    for user in message.new_chat_members:
+        if user.is_bot:
+            continue
+        await message.reply(f"👋 Добро пожаловать, {user.full_name}!\nЭто бот клуба походов. Для регистрации напиши мне в ЛС /start.")
 
 # Главное меню
 main_menu = ReplyKeyboardMarkup(
     keyboard=[
         [KeyboardButton(text="👤 Профиль"), KeyboardButton(text="🗺️ Маршруты")],
         [KeyboardButton(text="🚶 Ближайшие походы"), KeyboardButton(text="🏆 Лидеры")],
-        [KeyboardButton(text="❓ Помощь")],
+        [KeyboardButton(text="📍 Маршруты рядом"), KeyboardButton(text="❓ Помощь")],
     ],
     resize_keyboard=True
 )
@@ -218,21 +141,21 @@ profile_inline = InlineKeyboardMarkup(
     ]
 )
 
-@dp.message(flags={"block": False})
+# Только личные сообщения: трафик групп отсекается фильтром ещё до обращения к БД.
+# Возврат из обработчика в aiogram 3 завершает обработку, поэтому дальше пропускаем через SkipHandler
+@dp.message(F.chat.type == "private")
 async def catch_unregistered(message: types.Message, state: FSMContext):
     # Не мешаем обработчикам команд
     if message.text and message.text.startswith("/"):
-        return
+        raise SkipHandler()
     current_state = await state.get_state()
     if current_state is not None:
-        return  # Дай FSM обработать шаг регистрации!
-    # Проверяем, зарегистрирован ли пользователь
-    async with SessionLocal() as session:
-        res = await session.execute(select(User).where(User.telegram_id == message.from_user.id))
-        user = res.scalar_one_or_none()
-        if not user:
-            await message.answer("Ты еще не зарегистрирован. Напиши /start для регистрации.")
-            await state.set_state(RegStates.name)
+        raise SkipHandler()  # Дай FSM обработать шаг регистрации!
+    # Проверяем, зарегистрирован ли пользователь (кэш, в БД — только при промахе)
+    if await registered_users.is_registered(message.from_user.id):
+        raise SkipHandler()
+    await message.answer("Ты еще не зарегистрирован. Напиши /start для регистрации.")
+    await state.set_state(RegStates.name)
 
 @dp.message(CommandStart())
 async def cmd_start(message: types.Message, state: FSMContext):
@@ -263,6 +186,40 @@ async def menu_leaders(message: types.Message):
 async def menu_help(message: types.Message):
     await help_cmd(message)
 
+# Кнопка запроса геопозиции работает только в личке, поэтому она не в главном меню
+location_kb = ReplyKeyboardMarkup(
+    keyboard=[[KeyboardButton(text="📍 Отправить геопозицию", request_location=True)], [KeyboardButton(text="Отмена")]],
+    resize_keyboard=True, one_time_keyboard=True
+)
+
+@dp.message(Command("nearby"))
+async def nearby_start(message: types.Message):
+    if message.chat.type != "private":
+        await auto_delete_reply(message, "📍 Напиши мне в ЛС /nearby — покажу маршруты рядом с тобой.")
+        return
+    await message.answer("Отправь геопозицию — покажу ближайшие маршруты.", reply_markup=location_kb)
+
+@dp.message(lambda m: m.text == "📍 Маршруты рядом")
+async def menu_nearby(message: types.Message):
+    await nearby_start(message)
+
+@dp.message(StateFilter(None), F.text == "Отмена")
+async def nearby_cancel(message: types.Message):
+    await message.answer("Главное меню.", reply_markup=main_menu)
+
+@dp.message(F.chat.type == "private", F.location)
+async def nearby_routes(message: types.Message):
+    # Поиск по индексу в памяти, без запросов к БД
+    found = nearby_index.nearest(message.location.latitude, message.location.longitude, NEARBY_LIMIT)
+    if not found:
+        await message.answer("Пока нет маршрутов с координатами старта.", reply_markup=main_menu)
+        return
+    lines = [
+        f"{r.id}. {r.name} — {dist:.1f} км от тебя ({r.distance} км, {r.elevation} м, сложность: {r.difficulty})"
+        for dist, r in found
+    ]
+    await message.answer("📍 Ближайшие маршруты:\n" + "\n".join(lines), reply_markup=main_menu)
+
 @dp.callback_query(lambda c: c.data == "profile")
 async def cb_profile(callback: types.CallbackQuery):
     await profile(callback.message)
@@ -324,6 +281,7 @@ async def reg_age(message: types.Message, state: FSMContext):
             )
             session.add(user)
             await session.commit()
+            registered_users.add(user.telegram_id)
             await message.answer("Регистрация завершена! Добро пожаловать в клуб походов! 🥾")
     await state.clear()
 
@@ -357,42 +315,144 @@ async def profile(message: types.Message):
         )
         await message.answer(text, parse_mode="HTML", reply_markup=profile_inline)
 
-@dp.message(Command("history"))
-async def history(message: types.Message):
-    async with SessionLocal() as session:
-        res = await session.execute(select(User).where(User.telegram_id == message.from_user.id))
-        user = res.scalar_one_or_none()
-        if not user:
-            await message.answer("Ты еще не зарегистрирован. Напиши /start для регистрации.")
-            return
-        # Получаем все походы пользователя
-        q = (
-            select(Hike, Route)
+# Постраничные списки: /history, /routes, /upcoming и выбор в админских диалогах
+def hike_line(row):
+    return f"{row.date:%d.%m.%Y} — {row.Route.name} ({row.Route.distance} км, {row.Route.elevation} м)"
+
+def upcoming_line(row):
+    # Прогноз — из таблицы forecasts (предзагрузка), без запросов к API
+    forecast = weather.forecast_tuple(row.Forecast)
+    if forecast is None:
+        return hike_line(row)
+    t_min, t_max, precip, _ = forecast
+    return hike_line(row) + f"\n   🌤 {t_min:.0f}…{t_max:.0f}°C" + (f", осадки {precip:.1f} мм" if precip else "")
+
+def route_line(r):
+    return f"{r.id}. {r.name} — {r.distance} км, {r.elevation} м, сложность: {r.difficulty}"
+
+def hike_choice(row):
+    return f"{row.id}. {row.date:%d.%m.%Y} — {row.Route.name}"
+
+LISTINGS = {listing.name: listing for listing in [
+    pagination.Listing(
+        "history",
+        lambda telegram_id: (
+            select(Route)
+            .join(Hike, Hike.route_id == Route.id)
             .join(HikeParticipant, HikeParticipant.hike_id == Hike.id)
-            .join(Route, Hike.route_id == Route.id)
-            .where(HikeParticipant.user_id == user.id)
-            .order_by(Hike.date.desc())
+            .join(User, HikeParticipant.user_id == User.id)
+            .where(User.telegram_id == telegram_id)
+        ),
+        keys=[Hike.date, Hike.id], descending=True, render=hike_line,
+        empty="У тебя пока нет завершённых походов.",
+    ),
+    pagination.MemoryListing(
+        "routes", route_catalog.all, keys=[Route.id],
+        render=route_line,
+        empty="Маршрутов пока нет.",
+    ),
+    pagination.Listing(
+        "upcoming",
+        lambda: (
+            select(Route, Forecast)
+            .join(Hike, Hike.route_id == Route.id)
+            .outerjoin(Forecast, and_(
+                Forecast.day == Hike.date, Forecast.latitude == Route.latitude, Forecast.longitude == Route.longitude,
+            ))
+            .where(Hike.date >= date.today())
+        ),
+        keys=[Hike.date, Hike.id], render=upcoming_line,
+        empty="Ближайших походов пока нет.",
+    ),
+    pagination.MemoryListing(
+        "plan", route_catalog.all, keys=[Route.id],
+        render=lambda r: f"{r.id}. {r.name} — {r.distance} км, {r.elevation} м",
+        header="Выберите маршрут (введите ID):",
+        empty="Нет маршрутов для планирования. Добавьте маршрут через /add_route.",
+    ),
+    pagination.Listing(
+        "join",
+        lambda: select(Route).join(Hike, Hike.route_id == Route.id).where(Hike.date >= date.today()),
+        keys=[Hike.date, Hike.id], render=hike_choice,
+        header="Выберите поход (введите ID):",
+        empty="Нет запланированных походов.",
+    ),
+    pagination.Listing(
+        "done",
+        lambda: select(Route).join(Hike, Hike.route_id == Route.id).where(Hike.date <= date.today()),
+        keys=[Hike.date, Hike.id], descending=True, render=hike_choice,
+        header="Выберите поход для завершения (введите ID):",
+        empty="Нет завершённых походов.",
+    ),
+]}
+
+async def send_listing(message, name, auto_delete=False, **params):
+    async with SessionLocal() as session:
+        text, kb = await LISTINGS[name].page(session, **params)
+    if auto_delete:
+        await auto_delete_reply(message, text, reply_markup=kb)
+    else:
+        await message.answer(text, reply_markup=kb)
+    return text != LISTINGS[name].empty
+
+@dp.callback_query(pagination.PageCb.filter())
+async def cb_page(callback: types.CallbackQuery, callback_data: pagination.PageCb):
+    listing = LISTINGS.get(callback_data.name)
+    if listing is None:
+        await callback.answer()
+        return
+    params = {"telegram_id": callback.from_user.id} if listing.name == "history" else {}
+    async with SessionLocal() as session:
+        text, kb = await listing.page(
+            session, listing.decode(callback_data.key), callback_data.dir, **params
         )
-        hikes = await session.execute(q)
-        hikes = hikes.all()
-        if not hikes:
-            await message.answer("У тебя пока нет завершённых походов.")
-            return
-        lines = []
-        for hike, route in hikes:
-            lines.append(f"{hike.date:%d.%m.%Y} — {route.name} ({route.distance} км, {route.elevation} м)")
-        await message.answer("\n".join(lines))
+    try:
+        await callback.message.edit_text(text, reply_markup=kb)
+    except Exception:
+        pass  # сообщение не изменилось или уже удалено
+    await callback.answer()
+
+@dp.message(Command("history"))
+async def history(message: types.Message):
+    if not await registered_users.is_registered(message.from_user.id):
+        await message.answer("Ты еще не зарегистрирован. Напиши /start для регистрации.")
+        return
+    await send_listing(message, "history", telegram_id=message.from_user.id)
 
 @dp.message(Command("routes"))
 async def routes_list(message: types.Message):
-    async with SessionLocal() as session:
-        res = await session.execute(select(Route))
-        routes = res.scalars().all()
-        if not routes:
-            await message.answer("Маршрутов пока нет.")
-            return
-        lines = [f"{r.id}. {r.name} — {r.distance} км, {r.elevation} м, сложность: {r.difficulty}" for r in routes]
-        await auto_delete_reply(message, "\n".join(lines))
+    await send_listing(message, "routes", auto_delete=True)
+
+@dp.message(Command("find"))
+async def find_routes(message: types.Message, command: filters.CommandObject):
+    if not command.args:
+        await auto_delete_reply(message, "Использование: /find <часть названия или описания>, например /find пик")
+        return
+    found = route_search.search(command.args, SEARCH_LIMIT)
+    if not found:
+        await auto_delete_reply(message, "Ничего похожего не нашлось.")
+        return
+    await auto_delete_reply(message, "🔎 Найдено:\n" + "\n".join(route_line(r) for _, r in found))
+
+@dp.inline_query()
+async def inline_routes(query: types.InlineQuery):
+    # Пустой запрос — первые маршруты каталога; ответ одинаков для всех, поэтому кэшируется общий
+    if query.query.strip():
+        routes = [r for _, r in route_search.search(query.query, 50)]
+    else:
+        routes = route_catalog.all()[:50]
+    results = [
+        types.InlineQueryResultArticle(
+            id=str(r.id),
+            title=r.name,
+            description=f"{r.distance} км, {r.elevation} м, сложность: {r.difficulty}",
+            input_message_content=types.InputTextMessageContent(
+                message_text=route_line(r) + (f"\n{r.description}" if r.description else "")
+            ),
+        )
+        for r in routes
+    ]
+    await query.answer(results, cache_time=SEARCH_CACHE_TIME, is_personal=False)
 
 @dp.message(Command("add_route"))
 async def add_route_start(message: types.Message, state: FSMContext):
@@ -405,9 +465,40 @@ async def add_route_start(message: types.Message, state: FSMContext):
 @dp.message(AddRouteStates.name)
 async def add_route_name(message: types.Message, state: FSMContext):
     await state.update_data(name=message.text.strip())
-    await message.answer("Протяжённость маршрута (км):")
+    await message.answer("Протяжённость маршрута (км) — или пришлите GPX/KML-трек, "
+                         "и протяжённость, набор высоты и координаты старта посчитаются сами:")
     await state.set_state(AddRouteStates.distance)
 
+# Импорт трека GPX/KML: разбор и расчёт — в отдельном процессе (bot.tracks)
+async def read_track(message: types.Message):
+    doc = message.document
+    if not (doc.file_name or "").lower().endswith((".gpx", ".kml")):
+        await message.answer("Пришлите трек в формате GPX или KML.")
+        return None
+    if doc.file_size and doc.file_size > TRACK_MAX_BYTES:
+        await message.answer(f"Файл слишком большой: максимум {TRACK_MAX_BYTES // (1024 * 1024)} МБ.")
+        return None
+    data = await bot.download(doc)
+    try:
+        return await tracks.analyze_in_worker(data.getvalue())
+    except tracks.TrackError as e:
+        await message.answer(f"⚠️ {e}")
+        return None
+
+def track_summary(track):
+    return (f"📍 Трек: {track.points} точек, {track.distance} км, набор высоты {track.elevation} м, "
+            f"старт {track.latitude}, {track.longitude}")
+
+@dp.message(AddRouteStates.distance, F.document)
+async def add_route_track(message: types.Message, state: FSMContext):
+    track = await read_track(message)
+    if track is None:
+        return
+    await state.update_data(distance=track.distance, elevation=track.elevation,
+                            latitude=track.latitude, longitude=track.longitude)
+    await message.answer(track_summary(track) + "\n\nКраткое описание маршрута:")
+    await state.set_state(AddRouteStates.description)
+
 @dp.message(AddRouteStates.distance)
 async def add_route_distance(message: types.Message, state: FSMContext):
     try:
@@ -443,6 +534,9 @@ async def add_route_description(message: types.Message, state: FSMContext):
 @dp.message(AddRouteStates.difficulty)
 async def add_route_difficulty(message: types.Message, state: FSMContext):
     await state.update_data(difficulty=message.text.strip())
+    if "longitude" in await state.get_data():  # координаты уже взяты из трека
+        await save_new_route(message, state)
+        return
     await message.answer("Координаты старта (широта, например: 42.876):")
     await state.set_state(AddRouteStates.latitude)
 
@@ -465,6 +559,9 @@ async def add_route_longitude(message: types.Message, state: FSMContext):
         await message.answer("Введите число, например: 74.605")
         return
     await state.update_data(longitude=lon)
+    await save_new_route(message, state)
+
+async def save_new_route(message: types.Message, state: FSMContext):
     data = await state.get_data()
     async with SessionLocal() as session:
         route = Route(
@@ -474,10 +571,13 @@ async def add_route_longitude(message: types.Message, state: FSMContext):
             description=data["description"],
             difficulty=data["difficulty"],
             latitude=data["latitude"],
-            longitude=lon
+            longitude=data["longitude"]
         )
         session.add(route)
+        await session.flush()
+        version = await route_catalog.bump(session)
         await session.commit()
+        route_catalog.put(route, version)
         await message.answer(f"Маршрут '{route.name}' успешно добавлен!")
         await log_admin_action(session, message.from_user.id, "add_route", f"{route.name} ({route.distance} км, {route.elevation} м)")
     await state.clear()
@@ -497,16 +597,15 @@ async def edit_route_id(message: types.Message, state: FSMContext):
     except ValueError:
         await message.answer("Введите числовой ID маршрута.")
         return
-    async with SessionLocal() as session:
-        route = await session.get(Route, route_id)
-        if not route:
-            await message.answer("Маршрут с таким ID не найден.")
-            await state.clear()
-            return
-        await state.update_data(route_id=route_id)
-        await state.update_data(name=route.name, distance=route.distance, elevation=route.elevation,
-                               description=route.description, difficulty=route.difficulty,
-                               latitude=route.latitude, longitude=route.longitude)
+    route = route_catalog.get(route_id)
+    if not route:
+        await message.answer("Маршрут с таким ID не найден.")
+        await state.clear()
+        return
+    await state.update_data(route_id=route_id)
+    await state.update_data(name=route.name, distance=route.distance, elevation=route.elevation,
+                           description=route.description, difficulty=route.difficulty,
+                           latitude=route.latitude, longitude=route.longitude)
     await message.answer(
         "Оставьте поле пустым, если не хотите менять значение.\n\nНовое название маршрута:")
     await state.set_state(EditRouteStates.name)
@@ -599,25 +698,42 @@ async def edit_route_longitude(message: types.Message, state: FSMContext):
         route.difficulty = data["difficulty"]
         route.latitude = data["latitude"]
         route.longitude = data["longitude"]
+        version = await route_catalog.bump(session)
         await session.commit()
+        route_catalog.put(route, version)
         await message.answer(f"Маршрут '{route.name}' успешно обновлён!")
         await log_admin_action(session, message.from_user.id, "edit_route", f"{route.name} (ID {route.id})")
     await state.clear()
 
+# Трек с ID маршрута в подписи — пересчитать протяжённость, набор высоты и старт существующего маршрута.
+# Только админ в личке: файлы с числом в подписи от участников группы обработчик не трогает
+@dp.message(F.chat.type == "private", F.from_user.id.in_(ADMINS), F.document, F.caption.regexp(r"^\s*\d+\s*$"))
+async def update_route_track(message: types.Message):
+    track = await read_track(message)
+    if track is None:
+        return
+    async with SessionLocal() as session:
+        route = await session.get(Route, int(message.caption))
+        if not route:
+            await message.answer("Маршрут с таким ID не найден.")
+            return
+        route.distance = track.distance
+        route.elevation = track.elevation
+        route.latitude = track.latitude
+        route.longitude = track.longitude
+        version = await route_catalog.bump(session)
+        await session.commit()
+        route_catalog.put(route, version)
+        await message.answer(f"Маршрут '{route.name}' обновлён по треку.\n{track_summary(track)}")
+        await log_admin_action(session, message.from_user.id, "route_track", f"{route.name} (ID {route.id}): {track.distance} км, {track.elevation} м")
+
 @dp.message(Command("new_hike"))
 async def new_hike_start(message: types.Message, state: FSMContext):
     if message.from_user.id not in ADMINS:
         await message.answer("⛔️ Только администраторы могут планировать походы.")
         return
-    async with SessionLocal() as session:
-        res = await session.execute(select(Route))
-        routes = res.scalars().all()
-        if not routes:
-            await message.answer("Нет маршрутов для планирования. Добавьте маршрут через /add_route.")
-            return
-        lines = [f"{r.id}. {r.name} — {r.distance} км, {r.elevation} м" for r in routes]
-        await message.answer("Выберите маршрут (введите ID):\n" + "\n".join(lines))
-    await state.set_state(NewHikeStates.route_id)
+    if await send_listing(message, "plan"):
+        await state.set_state(NewHikeStates.route_id)
 
 @dp.message(NewHikeStates.route_id)
 async def new_hike_route(message: types.Message, state: FSMContext):
@@ -626,12 +742,10 @@ async def new_hike_route(message: types.Message, state: FSMContext):
     except ValueError:
         await message.answer("Введите числовой ID маршрута.")
         return
-    async with SessionLocal() as session:
-        route = await session.get(Route, route_id)
-        if not route:
-            await message.answer("Маршрут с таким ID не найден. Попробуйте снова.")
-            return
-        await state.update_data(route_id=route_id)
+    if not route_catalog.get(route_id):
+        await message.answer("Маршрут с таким ID не найден. Попробуйте снова.")
+        return
+    await state.update_data(route_id=route_id)
     await message.answer("Введите дату похода в формате ДД.ММ.ГГГГ (например, 25.08.2024):")
     await state.set_state(NewHikeStates.hike_date)
 
@@ -645,6 +759,7 @@ async def new_hike_date(message: types.Message, state: FSMContext):
         await message.answer("Введите корректную дату в формате ДД.ММ.ГГГГ (и не в прошлом)")
         return
     data = await state.get_data()
+    route = route_catalog.get(data["route_id"])
     async with SessionLocal() as session:
         hike = Hike(route_id=data["route_id"], date=hike_date)
         session.add(hike)
@@ -655,22 +770,7 @@ async def new_hike_date(message: types.Message, state: FSMContext):
 
 @dp.message(Command("upcoming"))
 async def upcoming_hikes(message: types.Message):
-    async with SessionLocal() as session:
-        q = (
-            select(Hike, Route)
-            .join(Route, Hike.route_id == Route.id)
-            .where(Hike.date >= date.today())
-            .order_by(Hike.date.asc())
-        )
-        hikes = await session.execute(q)
-        hikes = hikes.all()
-        if not hikes:
-            await message.answer("Ближайших походов пока нет.")
-            return
-        lines = []
-        for hike, route in hikes:
-            lines.append(f"{hike.date:%d.%m.%Y} — {route.name} ({route.distance} км, {route.elevation} м)")
-        await auto_delete_reply(message, "\n".join(lines))
+    await send_listing(message, "upcoming", auto_delete=True)
 
 @dp.message(Command("join"))
 async def join_info(message: types.Message):
@@ -730,21 +830,8 @@ async def add_participant_start(message: types.Message, state: FSMContext):
     if message.from_user.id not in ADMINS:
         await message.answer("⛔️ Только администраторы могут добавлять участников.")
         return
-    async with SessionLocal() as session:
-        q = (
-            select(Hike, Route)
-            .join(Route, Hike.route_id == Route.id)
-            .where(Hike.date >= date.today())
-            .order_by(Hike.date.asc())
-        )
-        hikes = await session.execute(q)
-        hikes = hikes.all()
-        if not hikes:
-            await message.answer("Нет запланированных походов.")
-            return
-        lines = [f"{hike.id}. {hike.date:%d.%m.%Y} — {route.name}" for hike, route in hikes]
-        await message.answer("Выберите поход (введите ID):\n" + "\n".join(lines))
-    await state.set_state(AddParticipantStates.hike_id)
+    if await send_listing(message, "join"):
+        await state.set_state(AddParticipantStates.hike_id)
 
 @dp.message(AddParticipantStates.hike_id)
 async def add_participant_hike(message: types.Message, state: FSMContext):
@@ -799,21 +886,8 @@ async def complete_hike_start(message: types.Message, state: FSMContext):
     if message.from_user.id not in ADMINS:
         await message.answer("⛔️ Только администраторы могут завершать походы.")
         return
-    async with SessionLocal() as session:
-        q = (
-            select(Hike, Route)
-            .join(Route, Hike.route_id == Route.id)
-            .where(Hike.date <= date.today())
-            .order_by(Hike.date.desc())
-        )
-        hikes = await session.execute(q)
-        hikes = hikes.all()
-        if not hikes:
-            await message.answer("Нет завершённых походов.")
-            return
-        lines = [f"{hike.id}. {hike.date:%d.%m.%Y} — {route.name}" for hike, route in hikes]
-        await message.answer("Выберите поход для завершения (введите ID):\n" + "\n".join(lines))
-    await state.set_state(CompleteHikeStates.hike_id)
+    if await send_listing(message, "done"):
+        await state.set_state(CompleteHikeStates.hike_id)
 
 @dp.message(CompleteHikeStates.hike_id)
 async def complete_hike_id(message: types.Message, state: FSMContext):
@@ -857,91 +931,77 @@ async def complete_hike_done(message: types.Message, state: FSMContext):
     data = await state.get_data()
     hike_id = data["hike_id"]
     async with SessionLocal() as session:
-        # Получаем поход и маршрут
-        hike = await session.get(Hike, hike_id)
-        route = await session.get(Route, hike.route_id)
-        # Получаем всех участников
-        q = (
-            select(HikeParticipant, User)
-            .join(User, HikeParticipant.user_id == User.id)
-            .where(HikeParticipant.hike_id == hike_id)
-        )
-        participants = await session.execute(q)
-        participants = participants.all()
-        # Обновляем статус дошедших
-        for hp, user in participants:
-            if user.id in ids:
-                hp.completed = 1
-                # Обновляем статистику
-                user.total_distance += route.distance
-                user.total_elevation += route.elevation
-                user.hikes_count += 1
-                user.rank = get_rank(user.hikes_count, user.total_distance)
-                # В complete_hike_done перед вызовом check_achievements собираю context:
-                # streak (походы подряд)
-                qstreak = (
-                    select(HikeParticipant, Hike)
-                    .join(Hike, HikeParticipant.hike_id == Hike.id)
-                    .where(HikeParticipant.user_id == user.id, HikeParticipant.completed == 1)
-                    .order_by(Hike.date.desc())
-                    .limit(3)
-                )
-                streak_hikes = await session.execute(qstreak)
-                streak_hikes = streak_hikes.all()
-                streak = 1
-                if len(streak_hikes) == 3:
-                    dates = [hike.date for hp, hike in streak_hikes]
-                    if (dates[0] - dates[1]).days == (dates[1] - dates[2]).days == 1:
-                        streak = 3
-                # hard_route
-                hard_route = route.difficulty.lower() == "сложная"
-                # all_routes
-                qall = await session.execute(select(Route.id))
-                all_route_ids = {r[0] for r in qall}
-                quser = await session.execute(
-                    select(Hike.route_id)
-                    .join(HikeParticipant, HikeParticipant.hike_id == Hike.id)
-                    .where(HikeParticipant.user_id == user.id, HikeParticipant.completed == 1)
-                )
-                user_route_ids = {r[0] for r in quser}
-                all_routes = all_route_ids and all_route_ids.issubset(user_route_ids)
-                context = {"streak": streak, "hard_route": hard_route, "all_routes": all_routes}
-                new_ach = await check_achievements(session, user, context)
-                await session.commit()
-                # Уведомление
-                try:
-                    msg = f"Поздравляем! Вы прошли поход '{route.name}' ({route.distance} км, {route.elevation} м).\n"
-                    msg += f"Ваш новый километраж: {user.total_distance:.1f} км, походов: {user.hikes_count}, ранг: {user.rank}."
-                    if new_ach:
-                        msg += "\n\n🎉 Новые достижения: " + ", ".join(f"{a.icon} {a.name}" for a in new_ach)
-                    await bot.send_message(user.telegram_id, msg)
-                except Exception:
-                    pass
-            else:
-                hp.completed = 0
-        await session.commit()
-        await message.answer("Статистика обновлена, участники уведомлены!")
+        route, finished = await completion.complete_hike(session, hike_id, ids, catalog=route_catalog)
         await log_admin_action(session, message.from_user.id, "complete_hike", f"hike_id={hike_id}, completed={ids}")
     await state.clear()
+    await leaderboard.on_hike_completed(hike_id)
+    # Уведомления — уже после коммита, параллельно
+    async def notify(user, new_ach):
+        msg = f"Поздравляем! Вы прошли поход '{route.name}' ({route.distance} км, {route.elevation} м).\n"
+        msg += f"Ваш новый километраж: {user.total_distance:.1f} км, походов: {user.hikes_count}, ранг: {user.rank}."
+        if new_ach:
+            msg += "\n\n🎉 Новые достижения: " + ", ".join(f"{a.icon} {a.name}" for a in new_ach)
+        try:
+            await bot.send_message(user.telegram_id, msg)
+        except Exception:
+            pass
+    with priority(PRIORITY_REMINDER):
+        await asyncio.gather(*(notify(user, new_ach) for user, new_ach in finished))
+    await message.answer("Статистика обновлена, участники уведомлены!")
+
+LEADER_BOARDS = {"all": "За всё время", "month": "Месяц", "season": "Сезон"}
+
+def leaders_kb(current):
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text=("• " if kind == current else "") + title, callback_data=f"leaders:{kind}")
+        for kind, title in LEADER_BOARDS.items()
+    ]])
+
+async def leaders_text(kind, telegram_id):
+    async with SessionLocal() as session:
+        if kind == "all":
+            rows = await leaderboard.top_alltime(session)
+            position = await leaderboard.position_alltime(session, telegram_id)
+            header = f"🏆 Топ-{leaderboard.top_n} участников:"
+            lines = [
+                f"{i+1}. {name} — {dist:.1f} км, {hikes} походов, ранг: {rank}"
+                for i, (name, dist, hikes, rank) in enumerate(rows)
+            ]
+        else:
+            board = await leaderboard.board(session, kind)
+            rows = board.ranking()[:leaderboard.top_n]
+            position = board.position(telegram_id)
+            header = f"🏆 Лидеры — {board.title}:"
+            lines = [
+                f"{i+1}. {name} — {dist:.1f} км, {hikes} походов"
+                for i, (dist, hikes, name, _) in enumerate(rows)
+            ]
+    if not lines:
+        return "Нет данных для лидерборда."
+    text = header + "\n" + "\n".join(lines)
+    if position is not None:
+        text += f"\n\nТвоё место: {position}"
+    return text
 
 @dp.message(Command("leaders"))
-async def leaders(message: types.Message):
-    async with SessionLocal() as session:
-        q = (
-            select(User)
-            .order_by(User.total_distance.desc(), User.hikes_count.desc())
-            .limit(10)
-        )
-        users = await session.execute(q)
-        users = users.scalars().all()
-        if not users:
-            await message.answer("Нет данных для лидерборда.")
-            return
-        lines = [
-            f"{i+1}. {u.name} — {u.total_distance:.1f} км, {u.hikes_count} походов, ранг: {u.rank}"
-            for i, u in enumerate(users)
-        ]
-        await auto_delete_reply(message, "🏆 Топ-10 участников:\n" + "\n".join(lines))
+async def leaders(message: types.Message, command: filters.CommandObject = None):
+    kind = {"month": "month", "месяц": "month", "season": "season", "сезон": "season"}.get(
+        ((command and command.args) or "").strip().lower(), "all")
+    text = await leaders_text(kind, message.from_user.id)
+    await auto_delete_reply(message, text, reply_markup=leaders_kb(kind))
+
+@dp.callback_query(F.data.startswith("leaders:"))
+async def cb_leaders(callback: types.CallbackQuery):
+    kind = callback.data.split(":", 1)[1]
+    if kind not in LEADER_BOARDS:
+        await callback.answer()
+        return
+    text = await leaders_text(kind, callback.from_user.id)
+    try:
+        await callback.message.edit_text(text, reply_markup=leaders_kb(kind))
+    except Exception:
+        pass  # «message is not modified» при повторном нажатии
+    await callback.answer()
 
 @dp.message(Command("broadcast"))
 async def broadcast_start(message: types.Message, state: FSMContext):
@@ -954,21 +1014,14 @@ async def broadcast_start(message: types.Message, state: FSMContext):
 @dp.message(BroadcastStates.text)
 async def broadcast_send(message: types.Message, state: FSMContext):
     text = message.text.strip()
-    async with SessionLocal() as session:
-        res = await session.execute(select(User))
-        users = res.scalars().all()
-        count = 0
-        for user in users:
-            if getattr(user, 'notifications_enabled', 1) != 1:
-                continue
-            try:
-                await bot.send_message(user.telegram_id, f"📢 Объявление:\n{text}")
-                count += 1
-            except Exception:
-                pass
-    await message.answer(f"Рассылка завершена. Сообщение отправлено {count} пользователям.")
+    job = await broadcast.create_job(message.from_user.id, message.chat.id, text)
+    progress = await message.answer(f"⏳ Рассылка #{job.id} запущена, прогресс будет обновляться здесь.")
+    await broadcast.set_progress_message(job.id, progress.message_id)
+    # Рассылка идёт в фоне — FSM админа освобождается сразу
     await state.clear()
-    await log_admin_action(session, message.from_user.id, "broadcast", text)
+    broadcast.start_broadcast(bot, job.id)
+    async with SessionLocal() as session:
+        await log_admin_action(session, message.from_user.id, "broadcast", f"#{job.id}: {text}")
 
 @dp.message(Command("help"))
 async def help_cmd(message: types.Message):
@@ -980,12 +1033,15 @@ async def help_cmd(message: types.Message):
         "/history — история походов\n"
         "/routes — список маршрутов\n"
         "/upcoming — ближайшие походы\n"
+        "/nearby — маршруты рядом с твоей геопозицией\n"
+        "/find текст — найти маршрут по названию или описанию (можно с опечатками)\n"
         "/join — как записаться на поход\n"
-        "/leaders — топ-10 участников\n"
+        "/leaders [month|season] — лидеры за всё время, месяц или сезон\n"
         "/admins — список админов для связи\n"
         "\n<b>Для админов:</b>\n"
         "/add_route — добавить маршрут\n"
         "/edit_route — редактировать маршрут\n"
+        "GPX/KML-трек с ID маршрута в подписи — пересчитать протяжённость и набор высоты\n"
         "/new_hike — запланировать поход\n"
         "/add_participant — добавить участника в поход\n"
         "/complete_hike — завершить поход\n"
@@ -1075,14 +1131,73 @@ async def edit_stats_value(message: types.Message, state: FSMContext):
         elif field == "ранг":
             user.rank = value
         await session.commit()
+        leaderboard.invalidate()
         await message.answer(f"✅ Значение обновлено!", reply_markup=main_menu)
     await state.clear()
 
+@dp.message(Command("stats_debug"))
+async def stats_debug(message: types.Message):
+    if message.from_user.id != OWNER_ID:
+        await message.answer("⛔️ Только владелец бота может смотреть отладочную статистику.")
+        return
+    gw = gateway.stats()
+    text = instrumentation.summary()
+    text += (f"\n🚦 Шлюз: в очереди {sum(gw['queue_depth'].values())}, "
+             f"отправлено {sum(gw['sent'].values())}, RetryAfter {gw['retry_after']}")
+    sched = dp.stats()
+    _, key_wait, _ = QUEUE_WAIT.summary("key")
+    _, slot_wait, _ = QUEUE_WAIT.summary("slot")
+    text += (f"\n🧵 Обновления: в работе {sched['running']}/{sched['concurrency']}, ждут {sched['queued']}, "
+             f"ожидание своей очереди {key_wait * 1000:.1f} мс, свободного слота {slot_wait * 1000:.1f} мс")
+    await message.answer(text)
+
+@dp.message(Command("backfill"))
+async def backfill_cmd(message: types.Message, command: filters.CommandObject):
+    if message.from_user.id != OWNER_ID:
+        await message.answer("⛔️ Только владелец бота может пересчитывать статистику.")
+        return
+    dry_run = (command.args or "").strip().lower() in ("dry", "dry-run", "проверка")
+    status = await message.answer("⏳ Пересчёт рангов и достижений…")
+
+    async def progress(done, total, report):
+        try:
+            await status.edit_text(f"⏳ Пересчёт рангов и достижений… {done}/{total}")
+        except Exception:
+            pass
+
+    report = await backfill.backfill(dry_run=dry_run, progress=progress)
+    await message.answer(backfill.format_report(report, dry_run))
+    if not dry_run:
+        leaderboard.invalidate()
+        async with SessionLocal() as session:
+            await log_admin_action(session, message.from_user.id, "backfill", f"ranks={dict(report['ranks'])}, achievements={dict(report['achievements'])}")
+
 async def main():
-    print("Polling запускается!")
+    print(f"Бот запускается в режиме {BOT_MODE}!")
     import asyncio
-    asyncio.create_task(send_hike_reminders())
-    await dp.start_polling(bot)
+    await weather.start_http()
+    async with SessionLocal() as session:
+        await sync_achievements(session)
+        await session.commit()
+    print(f"Кэш пользователей прогрет: {await registered_users.warm()}")
+    await route_catalog.load()
+    print(f"Каталог маршрутов загружен: {len(route_catalog)}, версия {route_catalog.version}")
+    asyncio.create_task(routes_catalog.watch(route_catalog))
+    print(f"Автоудаление: восстановлено из БД {await auto_deleter.start(bot)}")
+    asyncio.create_task(job_scheduler.run())  # сразу догонит запуски, пропущенные за время простоя
+    if isinstance(dp.storage, fsm_storage.SQLStorage):
+        asyncio.create_task(fsm_storage.purge_loop(dp.storage))
+    await broadcast.resume_broadcasts(bot)
+    try:
+        if BOT_MODE == "webhook":
+            await webhook.run_webhook(dp, bot)  # /metrics — на том же сервере
+        else:
+            if METRICS_PORT:
+                await metrics.serve()
+            await dp.start_polling(bot)
+    finally:
+        await weather.close_http()
+        tracks.shutdown()
 
 if __name__ == "__main__":
     import asyncio
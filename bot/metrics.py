@@ -0,0 +1,136 @@
+from aiohttp import web
+from bot.config import METRICS_HOST, METRICS_PORT
+
+# Метрики в текстовом формате Prometheus. Подсистемы регистрируют функцию stats(),
+# возвращающую плоский словарь чисел или словари {метка: число} (отдаются как gauge),
+# либо заводят Counter/Histogram с метками.
+
+_collectors = []
+_metrics = []
+
+
+def register(prefix, stats_fn):
+    _collectors.append((prefix, stats_fn))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, help="", labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        _metrics.append(self)
+
+    def inc(self, *labels, value=1):
+        self.values[labels] = self.values.get(labels, 0) + value
+
+    def get(self, *labels):
+        return self.values.get(labels, 0)
+
+    def lines(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for key, value in self.values.items():
+            yield f"{self.name}{_labels(self.labels, key)} {value}"
+
+
+class Histogram:
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name, help="", labels=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series = {}  # метки -> [счётчики по корзинам, сумма, количество]
+        _metrics.append(self)
+
+    def observe(self, *labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][i] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    def summary(self, *labels, q=0.95):
+        # (количество, среднее, оценка квантиля q по верхней границе корзины)
+        series = self.series.get(labels)
+        if not series or not series[2]:
+            return 0, 0.0, 0.0
+        counts, total, n = series
+        need, seen = q * n, 0
+        quantile = float("inf")
+        for bound, count in zip(self.buckets, counts):
+            seen += count
+            if seen >= need:
+                quantile = bound
+                break
+        return n, total / n, quantile
+
+    def lines(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for key, (counts, total, n) in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                yield f"{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}"
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_labels(self.labels, key, le)} {n}"
+            yield f"{self.name}_sum{_labels(self.labels, key)} {total}"
+            yield f"{self.name}_count{_labels(self.labels, key)} {n}"
+
+
+def _lines(name, value):
+    if isinstance(value, dict):
+        for label, v in value.items():
+            yield f'{name}{{key="{label}"}} {v}'
+    else:
+        yield f"{name} {value}"
+
+
+def render():
+    lines = []
+    for prefix, stats_fn in _collectors:
+        try:
+            stats = stats_fn()
+        except Exception as e:
+            print(f"Метрики {prefix}: {e!r}")
+            continue
+        for key, value in stats.items():
+            name = f"bot_{prefix}_{key}"
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(_lines(name, value))
+    for metric in _metrics:
+        lines.extend(metric.lines())
+    return "\n".join(lines) + "\n"
+
+
+async def serve(host=METRICS_HOST, port=METRICS_PORT):
+    # Отдельный сервер /metrics для режима polling (в webhook-режиме /metrics отдаёт webhook-сервер)
+    async def metrics_route(request):
+        return web.Response(text=render(), content_type="text/plain")
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_route)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"Метрики: http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,175 @@
+import heapq
+import math
+from collections import defaultdict
+from operator import itemgetter
+
+# «Маршруты рядом»: k ближайших к присланной геопозиции точек старта.
+# Индекс — сетка geohash: каждый маршрут лежит в ячейках всех длин префикса 1..PRECISION.
+# Поиск начинается с мелкой ячейки запроса и её восьми соседей и укрупняет блок,
+# пока k-й найденный маршрут не окажется ближе любой точки за пределами блока,
+# поэтому расстояние считается только для кандидатов, а не для всего каталога.
+# Индекс подписан на каталог маршрутов и пересчитывает ячейки только изменившихся маршрутов.
+
+EARTH_RADIUS_KM = 6371.0088
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+PRECISION = 6  # ячейка ~1.2 × 0.6 км
+
+
+def encode(lat, lon, precision=PRECISION):
+    lat_lo, lat_hi, lon_lo, lon_hi = -90.0, 90.0, -180.0, 180.0
+    chars = []
+    value = bits = 0
+    even = True  # биты чередуются: долгота, широта, долгота...
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                value, lon_lo = value * 2 + 1, mid
+            else:
+                value, lon_hi = value * 2, mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                value, lat_lo = value * 2 + 1, mid
+            else:
+                value, lat_hi = value * 2, mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            value = bits = 0
+    return "".join(chars)
+
+
+def bounds(code):
+    # -> (юг, север, запад, восток) ячейки
+    lat_lo, lat_hi, lon_lo, lon_hi = -90.0, 90.0, -180.0, 180.0
+    even = True
+    for char in code:
+        value = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            if even:
+                mid = (lon_lo + lon_hi) / 2
+                lon_lo, lon_hi = (mid, lon_hi) if bit else (lon_lo, mid)
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                lat_lo, lat_hi = (mid, lat_hi) if bit else (lat_lo, mid)
+            even = not even
+    return lat_lo, lat_hi, lon_lo, lon_hi
+
+
+def neighbours(code):
+    # Ячейка и восемь соседних той же длины (через линию перемены дат — с переходом)
+    lat_lo, lat_hi, lon_lo, lon_hi = bounds(code)
+    height, width = lat_hi - lat_lo, lon_hi - lon_lo
+    lat_c, lon_c = (lat_lo + lat_hi) / 2, (lon_lo + lon_hi) / 2
+    cells = set()
+    for dy in (-1, 0, 1):
+        lat = lat_c + dy * height
+        if not -90 < lat < 90:
+            continue  # за полюсом соседей нет
+        for dx in (-1, 0, 1):
+            lon = (lon_c + dx * width + 180) % 360 - 180
+            cells.add(encode(lat, lon, len(code)))
+    return cells
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+
+def clearance_km(lat, lon, code):
+    # Нижняя граница расстояния от точки до любой точки вне блока 3×3 вокруг ячейки code
+    lat_lo, lat_hi, lon_lo, lon_hi = bounds(code)
+    height, width = lat_hi - lat_lo, lon_hi - lon_lo
+    north = lat_hi + height - lat if lat_hi + height < 90 else math.inf
+    south = lat - (lat_lo - height) if lat_lo - height > -90 else math.inf
+    by_lat = EARTH_RADIUS_KM * math.radians(min(north, south))
+    # По долготе: расстояние до меридиана на угол dlon — asin(cos φ · sin dlon), а не дуга параллели
+    dlon = min(lon - (lon_lo - width), lon_hi + width - lon)
+    by_lon = EARTH_RADIUS_KM * math.asin(
+        min(1.0, math.cos(math.radians(lat)) * math.sin(math.radians(min(dlon, 90))))
+    )
+    return min(by_lat, by_lon)
+
+
+class NearbyIndex:
+    def __init__(self, precision=PRECISION):
+        self.precision = precision
+        self.routes = {}  # id -> RouteInfo, только маршруты с координатами старта
+        self._codes = {}  # id -> geohash полной длины
+        self._cells = defaultdict(set)  # префикс geohash -> id маршрутов
+        self.queries = 0
+        self.scans = 0  # запросы, где пришлось перебрать весь каталог
+        self.examined = 0  # сколько раз считалось расстояние
+
+    def _add(self, route):
+        code = encode(route.latitude, route.longitude, self.precision)
+        self._codes[route.id] = code
+        for length in range(1, self.precision + 1):
+            self._cells[code[:length]].add(route.id)
+
+    def _remove(self, route_id):
+        code = self._codes.pop(route_id)
+        for length in range(1, self.precision + 1):
+            cell = self._cells[code[:length]]
+            cell.discard(route_id)
+            if not cell:
+                del self._cells[code[:length]]
+
+    def update(self, route):
+        old = self.routes.get(route.id)
+        has_point = route.latitude is not None and route.longitude is not None
+        if old is not None and has_point and (old.latitude, old.longitude) == (route.latitude, route.longitude):
+            self.routes[route.id] = route  # сменились только название или описание
+            return
+        if old is not None:
+            self._remove(route.id)
+            del self.routes[route.id]
+        if has_point:
+            self.routes[route.id] = route
+            self._add(route)
+
+    def sync(self, catalog):
+        # Подписчик каталога: после put() меняется одна запись, после load() — все
+        for route_id in self.routes.keys() - catalog.routes.keys():
+            self._remove(route_id)
+            del self.routes[route_id]
+        for route in catalog.all():
+            if self.routes.get(route.id) is not route:
+                self.update(route)
+
+    def _rank(self, lat, lon, routes, k):
+        self.examined += len(routes)
+        return heapq.nsmallest(
+            k, ((distance_km(lat, lon, r.latitude, r.longitude), r) for r in routes), key=itemgetter(0)
+        )
+
+    def nearest(self, lat, lon, k):
+        # -> [(расстояние в км, RouteInfo)] по возрастанию расстояния
+        self.queries += 1
+        if k <= 0 or not self.routes:
+            return []
+        need = min(k, len(self.routes))
+        code = encode(lat, lon, self.precision)
+        for length in range(self.precision, 0, -1):
+            cell = code[:length]
+            ids = set().union(*(self._cells.get(c, ()) for c in neighbours(cell)))
+            if len(ids) < need:
+                continue
+            found = self._rank(lat, lon, [self.routes[i] for i in ids], k)
+            if len(ids) == len(self.routes) or found[-1][0] <= clearance_km(lat, lon, cell):
+                return found
+        self.scans += 1
+        return self._rank(lat, lon, list(self.routes.values()), k)
+
+    def stats(self):
+        return {"size": len(self.routes), "cells": len(self._cells), "queries": self.queries,
+                "scans": self.scans, "examined": self.examined}
+
+
+nearby_index = NearbyIndex()
@@ -0,0 +1,98 @@
+from bisect import bisect_left, bisect_right
+from datetime import date
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from sqlalchemy import tuple_
+from bot.config import PAGE_SIZE
+
+# Постраничные списки по ключу (keyset): страница — один запрос
+# WHERE (ключ) > курсор ORDER BY ключ LIMIT n+1, сколько бы строк ни было в таблице.
+# Лишняя (n+1)-я строка говорит, есть ли следующая страница.
+
+
+class PageCb(CallbackData, prefix="pg"):
+    name: str
+    dir: str  # "n" — вперёд от последней строки, "p" — назад от первой
+    key: str
+
+
+DECODERS = {"int": int, "date": date.fromisoformat}
+
+
+class Listing:
+    def __init__(self, name, query, keys, render, header="", empty="", descending=False, page_size=PAGE_SIZE):
+        # query(**params) -> Select; keys — столбцы ключа вида (Hike.date, Hike.id),
+        # последним должен идти уникальный столбец
+        self.name = name
+        self.query = query
+        self.keys = keys
+        self.render = render
+        self.header = header
+        self.empty = empty
+        self.descending = descending
+        self.page_size = page_size
+
+    def _key_of(self, row):
+        return tuple(getattr(row, col.key) for col in self.keys)
+
+    def encode(self, key):
+        return "|".join(v.isoformat() if isinstance(v, date) else str(v) for v in key)
+
+    def decode(self, raw):
+        kinds = ["date" if col.type.python_type is date else "int" for col in self.keys]
+        return tuple(DECODERS[k](v) for k, v in zip(kinds, raw.split("|")))
+
+    async def fetch(self, session, cursor=None, direction="n", **params):
+        # Возвращает (строки, есть_предыдущая, есть_следующая)
+        forward = direction == "n"
+        q = self.query(**params).add_columns(*self.keys)
+        key = tuple_(*self.keys)
+        if cursor is not None:
+            q = q.where(key < tuple_(*cursor) if forward == self.descending else key > tuple_(*cursor))
+        # Назад идём в обратном порядке от первой строки и потом переворачиваем
+        order = [c.desc() if forward == self.descending else c.asc() for c in self.keys]
+        res = await session.execute(q.order_by(*order).limit(self.page_size + 1))
+        rows = res.all()
+        more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if forward:
+            return rows, cursor is not None, more
+        return rows[::-1], more, True
+
+    def keyboard(self, rows, has_prev, has_next):
+        buttons = []
+        if has_prev:
+            key = self.encode(self._key_of(rows[0]))
+            buttons.append(InlineKeyboardButton(text="◀️ Назад", callback_data=PageCb(name=self.name, dir="p", key=key).pack()))
+        if has_next:
+            key = self.encode(self._key_of(rows[-1]))
+            buttons.append(InlineKeyboardButton(text="Далее ▶️", callback_data=PageCb(name=self.name, dir="n", key=key).pack()))
+        return InlineKeyboardMarkup(inline_keyboard=[buttons]) if buttons else None
+
+    async def page(self, session, cursor=None, direction="n", **params):
+        # Текст страницы и клавиатура навигации; (empty, None), если строк нет
+        rows, has_prev, has_next = await self.fetch(session, cursor, direction, **params)
+        if not rows:
+            return self.empty, None
+        lines = [self.render(row) for row in rows]
+        text = (self.header + "\n" if self.header else "") + "\n".join(lines)
+        return text, self.keyboard(rows, has_prev, has_next)
+
+
+class MemoryListing(Listing):
+    # Тот же интерфейс для данных, уже лежащих в памяти: rows(**params) —
+    # список, отсортированный по ключу по возрастанию. Сессия не используется.
+    def __init__(self, name, rows, keys, render, **kwargs):
+        super().__init__(name, None, keys, render, **kwargs)
+        self.rows = rows
+
+    async def fetch(self, session, cursor=None, direction="n", **params):
+        rows = self.rows(**params)
+        keys = [self._key_of(row) for row in rows]
+        n = self.page_size
+        if direction == "n":
+            start = bisect_right(keys, tuple(cursor)) if cursor is not None else 0
+            return rows[start:start + n], start > 0, start + n < len(rows)
+        end = bisect_left(keys, tuple(cursor))
+        start = max(0, end - n)
+        return rows[start:end], start > 0, end < len(rows)
@@ -0,0 +1,132 @@
+import asyncio
+from datetime import timedelta
+from sqlalchemy import select, delete, exists, tuple_
+from bot.config import REMINDER_CONCURRENCY
+from bot.db import SessionLocal, User, Hike, Route, HikeParticipant, ReminderMark, dialect_insert
+from bot.weather import get_weather_forecast, stored_forecasts
+
+# Напоминания о походах на завтра:
+# 1) один запрос — все походы дня вместе с подписанными участниками, которым ещё не отправляли;
+# 2) отметки reminder_marks вставляются до отправки — кого уже отметил другой запуск, пропускаем;
+# 3) прогноз — из таблицы forecasts (её заполняет предзагрузка bot.weather.prefetch); точки,
+#    которых там нет, запрашиваются у API параллельно (сессия БД к этому моменту уже закрыта);
+# 4) рассылка с ограниченным параллелизмом (лимиты Telegram соблюдает шлюз bot.sender).
+# Неудачная отправка снимает отметку, чтобы повтор задачи попробовал ещё раз; если процесс
+# упал посреди рассылки, отметки остаются — лучше пропустить напоминание, чем прислать дважды.
+
+
+async def collect_reminders(day, session_factory=SessionLocal):
+    async with session_factory() as session:
+        q = (
+            select(Hike.id, Route.name, Route.latitude, Route.longitude, User.telegram_id, User.id)
+            .join(Route, Hike.route_id == Route.id)
+            .join(HikeParticipant, HikeParticipant.hike_id == Hike.id)
+            .join(User, HikeParticipant.user_id == User.id)
+            .where(
+                Hike.date == day, HikeParticipant.completed == 1, User.notifications_enabled == 1,
+                ~exists().where(ReminderMark.hike_id == Hike.id, ReminderMark.user_id == User.id),
+            )
+            .order_by(Hike.id, User.id)
+        )
+        res = await session.execute(q)
+        return res.all()
+
+
+MARKS_BATCH = 500  # строк на запрос: лимит параметров SQLite и Postgres не достигается
+
+
+async def claim_marks(rows, session_factory=SessionLocal):
+    # Оставляет только строки, отметку для которых вставил именно этот запуск.
+    # Вставка пачками, но в одной транзакции
+    pairs = [(hike_id, user_id) for hike_id, *_, user_id in rows]
+    claimed = set()
+    async with session_factory() as session:
+        insert = dialect_insert(session)
+        for i in range(0, len(pairs), MARKS_BATCH):
+            res = await session.execute(
+                insert(ReminderMark)
+                .values([{"hike_id": h, "user_id": u} for h, u in pairs[i:i + MARKS_BATCH]])
+                .on_conflict_do_nothing()
+                .returning(ReminderMark.hike_id, ReminderMark.user_id)
+            )
+            claimed.update(tuple(row) for row in res)
+        await session.commit()
+    return [row for row in rows if (row[0], row[-1]) in claimed]
+
+
+async def release_marks(pairs, session_factory=SessionLocal):
+    async with session_factory() as session:
+        for i in range(0, len(pairs), MARKS_BATCH):
+            await session.execute(
+                delete(ReminderMark)
+                .where(tuple_(ReminderMark.hike_id, ReminderMark.user_id).in_(pairs[i:i + MARKS_BATCH]))
+            )
+        await session.commit()
+
+
+async def fetch_forecasts(coords, day, forecast=get_weather_forecast):
+    coords = list(coords)
+    results = await asyncio.gather(*(forecast(lat, lon, day) for lat, lon in coords), return_exceptions=True)
+    forecasts = {}
+    for point, weather in zip(coords, results):
+        if isinstance(weather, Exception):
+            print(f"Прогноз для {point} недоступен: {weather!r}")
+            weather = None
+        forecasts[point] = weather
+    return forecasts
+
+
+def render_reminder(route_name, weather, when="Завтра"):
+    msg = f"{when} поход по маршруту '{route_name}'!\n"
+    if weather:
+        t_min, t_max, precip, wind = weather
+        msg += (
+            f"Погода: {t_min:.0f}…{t_max:.0f}°C, осадки: {precip:.1f} мм, ветер: {wind:.0f} м/с.\n"
+        )
+        if t_min < 5:
+            msg += "Рекомендуется тёплая одежда. "
+        if precip > 0:
+            msg += "Возможен дождь — возьмите непромокаемую одежду. "
+    else:
+        msg += "(Не удалось получить прогноз погоды)\n"
+    msg += "Не забудьте снаряжение и хорошее настроение! 🥾"
+    return msg
+
+
+async def send_reminders(bot, day, session_factory=SessionLocal, forecast=get_weather_forecast, today=None):
+    # today — дата по часам клуба; догнанный после полуночи запуск напоминает о походе уже сегодня
+    if today is None:
+        today = day - timedelta(days=1)
+    when = "Сегодня" if day <= today else "Завтра"
+    rows = await collect_reminders(day, session_factory)
+    if rows:
+        rows = await claim_marks(rows, session_factory)
+    if not rows:
+        return 0
+    coords = {(lat, lon) for _, _, lat, lon, _, _ in rows if lat is not None and lon is not None}
+    forecasts = await stored_forecasts(coords, day, session_factory)
+    missing = coords - forecasts.keys()
+    if missing:
+        forecasts.update(await fetch_forecasts(missing, day, forecast))
+    sem = asyncio.Semaphore(REMINDER_CONCURRENCY)
+
+    async def deliver(telegram_id, text):
+        async with sem:
+            try:
+                await bot.send_message(telegram_id, text)
+                return True
+            except Exception as e:
+                print(f"Напоминание для {telegram_id} не отправлено: {e!r}")
+                return False
+
+    texts = {}
+    jobs = []
+    for hike_id, route_name, lat, lon, telegram_id, _ in rows:
+        if hike_id not in texts:
+            texts[hike_id] = render_reminder(route_name, forecasts.get((lat, lon)), when)
+        jobs.append(deliver(telegram_id, texts[hike_id]))
+    results = await asyncio.gather(*jobs)
+    failed = [(row[0], row[-1]) for row, ok in zip(rows, results) if not ok]
+    if failed:
+        await release_marks(failed, session_factory)
+    return sum(results)
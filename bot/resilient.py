@@ -0,0 +1,143 @@
+import asyncio
+import random
+import time
+import aiohttp
+from bot import metrics
+
+# Устойчивый клиент внешних HTTP API: таймаут на попытку и общий дедлайн на вызов,
+# ограниченное число повторов с экспоненциальной паузой и случайным разбросом (jitter),
+# предохранитель (circuit breaker): после серии неудачных вызовов (сбоем считается вызов,
+# у которого кончились все попытки, а не каждая попытка) вызовы сразу завершаются ошибкой,
+# пока не пройдёт reset_after секунд, затем пропускается один пробный вызов.
+# Повторяются только временные сбои: таймауты, сетевые ошибки, 5xx, 429 и ответ не-JSON.
+
+REQUEST_SECONDS = metrics.Histogram("bot_upstream_seconds", "Время успешных запросов к внешним API", ["upstream"])
+REQUEST_ERRORS = metrics.Counter("bot_upstream_errors_total", "Сбои запросов к внешним API", ["upstream", "kind"])
+CALLS = metrics.Counter("bot_upstream_calls_total", "Вызовы внешних API по итогу", ["upstream", "result"])
+
+
+class UpstreamError(Exception):
+    pass
+
+
+class CircuitOpenError(UpstreamError):
+    pass
+
+
+class RetryableStatus(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+class CircuitBreaker:
+    def __init__(self, failures=5, reset_after=60.0):
+        self.threshold = failures
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.opened = 0
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.probing:
+            self.probing = True  # одна пробная попытка, остальные ждут её итога
+            return True
+        return False
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def failure(self):
+        self.failures += 1
+        if self.probing or self.failures >= self.threshold:
+            if self.opened_at is None:
+                self.opened += 1
+            self.opened_at = time.monotonic()  # проба не удалась — снова ждём reset_after
+        self.probing = False
+
+    def stats(self):
+        return {"state": {"closed": 0, "half_open": 1, "open": 2}[self.state], "failures": self.failures, "opened": self.opened}
+
+
+class ResilientClient:
+    def __init__(self, name, session, attempts=3, attempt_timeout=4.0, deadline=10.0,
+                 backoff=0.5, backoff_max=4.0, breaker=None):
+        # session — корутина-функция, возвращающая общий aiohttp.ClientSession
+        self.name = name
+        self.session = session
+        self.attempts = attempts
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+
+    def _pause(self, attempt):
+        # «Equal jitter»: половина паузы фиксирована, половина случайна
+        pause = min(self.backoff_max, self.backoff * 2 ** attempt)
+        return pause / 2 + random.uniform(0, pause / 2)
+
+    async def _request(self, url, params):
+        http = await self.session()
+        async with http.get(url, params=params) as resp:
+            if resp.status >= 500 or resp.status == 429:
+                raise RetryableStatus(resp.status)
+            resp.raise_for_status()  # прочие 4xx — ошибка запроса, повтор не поможет
+            return await resp.json(content_type=None)
+
+    async def get_json(self, url, params=None):
+        # Предохранитель видит вызов целиком: одна проверка до первой попытки
+        # и один сбой, когда повторы исчерпаны, — а не сбой на каждую попытку
+        if not self.breaker.allow():
+            REQUEST_ERRORS.inc(self.name, "circuit_open")
+            CALLS.inc(self.name, "short_circuit")
+            raise CircuitOpenError(f"{self.name}: предохранитель разомкнут")
+        give_up_at = time.monotonic() + self.deadline
+        for attempt in range(self.attempts):
+            remaining = give_up_at - time.monotonic()
+            start = time.monotonic()
+            try:
+                data = await asyncio.wait_for(self._request(url, params), min(self.attempt_timeout, remaining))
+            except asyncio.CancelledError:
+                self.breaker.probing = False  # отменённая проба не должна держать предохранитель
+                raise
+            except aiohttp.ClientResponseError as e:
+                self.breaker.success()  # сервис ответил — он жив, ошибка в запросе
+                REQUEST_ERRORS.inc(self.name, f"http_{e.status}")
+                CALLS.inc(self.name, "error")
+                raise UpstreamError(f"{self.name}: HTTP {e.status}") from e
+            except asyncio.TimeoutError as e:
+                error, kind = e, "timeout"
+            except RetryableStatus as e:
+                error, kind = e, f"http_{e.status}"
+            except ValueError as e:  # тело не JSON
+                error, kind = e, "bad_response"
+            except aiohttp.ClientError as e:
+                error, kind = e, "network"
+            else:
+                self.breaker.success()
+                REQUEST_SECONDS.observe(self.name, value=time.monotonic() - start)
+                CALLS.inc(self.name, "ok")
+                return data
+            REQUEST_ERRORS.inc(self.name, kind)
+            pause = self._pause(attempt)
+            if attempt == self.attempts - 1 or time.monotonic() + pause >= give_up_at:
+                break
+            await asyncio.sleep(pause)
+        self.breaker.failure()
+        CALLS.inc(self.name, "error")
+        raise UpstreamError(f"{self.name}: {kind} после {attempt + 1} попыток") from error
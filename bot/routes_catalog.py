@@ -0,0 +1,106 @@
+import asyncio
+from collections import namedtuple
+from sqlalchemy import select
+from bot.config import CATALOG_CHECK_INTERVAL
+from bot.db import SessionLocal, Route, CacheVersion, dialect_insert
+
+# Каталог маршрутов в памяти: таблица маленькая и меняется редко.
+# Изменения пишутся сквозь кэш (add/edit route), а счётчик в cache_versions
+# позволяет другим процессам заметить устаревание одним запросом по ключу.
+
+RouteInfo = namedtuple("RouteInfo", "id name distance elevation description difficulty latitude longitude")
+VERSION_KEY = "routes"
+
+
+def route_info(route):
+    return RouteInfo(route.id, route.name, route.distance, route.elevation, route.description,
+                     route.difficulty, route.latitude, route.longitude)
+
+
+class RouteCatalog:
+    def __init__(self):
+        self.routes = {}
+        self.version = None
+        self.reloads = 0
+        self._sorted = []
+        self._listeners = []
+
+    def subscribe(self, fn):
+        # fn(catalog) вызывается после каждой загрузки и каждого изменения
+        self._listeners.append(fn)
+
+    def _set(self, routes):
+        self.routes = routes
+        self._sorted = sorted(routes.values(), key=lambda r: r.id)
+        for fn in self._listeners:
+            try:
+                fn(self)
+            except Exception as e:
+                print(f"Каталог маршрутов: ошибка подписчика {fn!r}: {e!r}")
+
+    def get(self, route_id):
+        return self.routes.get(route_id)
+
+    def all(self):
+        return self._sorted
+
+    def __len__(self):
+        return len(self.routes)
+
+    def stats(self):
+        return {"size": len(self.routes), "version": self.version or 0, "reloads": self.reloads}
+
+    async def _read_version(self, session):
+        res = await session.execute(select(CacheVersion.version).where(CacheVersion.name == VERSION_KEY))
+        return res.scalar() or 0
+
+    async def load(self, session_factory=SessionLocal):
+        async with session_factory() as session:
+            version = await self._read_version(session)
+            res = await session.execute(select(Route))
+            routes = {r.id: route_info(r) for r in res.scalars()}
+        self.version = version
+        self.reloads += 1
+        self._set(routes)
+
+    async def check(self, session_factory=SessionLocal):
+        # True, если каталог пришлось перечитать
+        async with session_factory() as session:
+            version = await self._read_version(session)
+        if version == self.version:
+            return False
+        await self.load(session_factory)
+        return True
+
+    async def bump(self, session):
+        # Вызывается в транзакции изменения маршрута, до commit; возвращает новую версию
+        insert = dialect_insert(session)
+        res = await session.execute(
+            insert(CacheVersion)
+            .values(name=VERSION_KEY, version=1)
+            .on_conflict_do_update(index_elements=[CacheVersion.name], set_={"version": CacheVersion.version + 1})
+            .returning(CacheVersion.version)
+        )
+        return res.scalar_one()
+
+    def put(self, route, version):
+        # После commit: обновляем запись сразу. Если между нашими версиями
+        # вклинился другой процесс, версию не двигаем — check() перечитает всё
+        routes = dict(self.routes)
+        routes[route.id] = route_info(route)
+        if self.version == version - 1:
+            self.version = version
+        self._set(routes)
+
+
+async def watch(catalog, interval=CATALOG_CHECK_INTERVAL, session_factory=SessionLocal):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if await catalog.check(session_factory):
+                print(f"Каталог маршрутов перечитан, версия {catalog.version}")
+        except Exception as e:
+            print(f"Ошибка проверки каталога маршрутов: {e!r}")
+
+
+route_catalog = RouteCatalog()
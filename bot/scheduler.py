@@ -0,0 +1,103 @@
+import asyncio
+import time
+from contextlib import nullcontext
+from aiogram import Dispatcher
+from aiogram.dispatcher.middlewares.user_context import UserContextMiddleware
+from bot import metrics, fsm_storage
+from bot.config import UPDATE_CONCURRENCY
+
+# Планировщик обновлений: обновления разных пользователей обрабатываются параллельно
+# (не больше UPDATE_CONCURRENCY одновременно), а обновления одного пользователя в одном
+# чате — строго по очереди, чтобы шаги FSM-диалогов не перепутались.
+# Замки ключей честные (FIFO), а до первого await порядок задачи не меняется,
+# поэтому обновления одного ключа выполняются в порядке поступления.
+
+QUEUE_WAIT = metrics.Histogram(
+    "bot_update_queue_wait_seconds", "Ожидание перед обработкой обновления", ["stage"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+
+
+def update_key(update):
+    # Тот же ключ, что у FSM по умолчанию: пользователь в чате
+    context = UserContextMiddleware.resolve_event_context(update)
+    chat_id = context.chat.id if context.chat else None
+    user_id = context.user.id if context.user else None
+    if chat_id is None and user_id is None:
+        return None  # опросы и прочее без отправителя — без упорядочивания
+    return chat_id, user_id
+
+
+class OrderedDispatcher(Dispatcher):
+    def __init__(self, *args, concurrency=UPDATE_CONCURRENCY, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.concurrency = concurrency
+        self._slots = None  # семафор и цикл событий, в котором он создан, — см. _slots_for_loop()
+        self._slots_loop = None
+        self._locks = {}  # ключ -> [замок, сколько обновлений его держат или ждут]
+        self.queued = 0
+        self.running = 0
+        self.waited_for_key = 0
+
+    def _slots_for_loop(self):
+        # dp собирается при импорте bot.main, вне цикла событий, а примитивы asyncio
+        # привязываются к циклу (в Python 3.9 — уже при создании). Поэтому семафор
+        # создаётся в работающем цикле, а новый цикл (перезапуск, тесты) получает свой
+        loop = asyncio.get_running_loop()
+        if self._slots_loop is not loop:
+            self._slots, self._slots_loop = asyncio.Semaphore(self.concurrency), loop
+        return self._slots
+
+    def _lock(self, key):
+        if key is None:
+            return nullcontext()
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        if entry[1] > 1:
+            self.waited_for_key += 1
+        return entry[0]
+
+    def _release(self, key):
+        entry = self._locks.get(key)
+        if entry is not None:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    async def feed_update(self, bot, update, **kwargs):
+        key = update_key(update)
+        slots = self._slots_for_loop()
+        lock = self._lock(key)
+        self.queued += 1
+        started = False
+        try:
+            start = time.perf_counter()
+            async with lock:
+                locked = time.perf_counter()
+                QUEUE_WAIT.observe("key", value=locked - start)
+                async with slots:
+                    QUEUE_WAIT.observe("slot", value=time.perf_counter() - locked)
+                    self.queued -= 1
+                    self.running += 1
+                    started = True
+                    try:
+                        with fsm_storage.update_scope():  # чтения FSM — общие только внутри обновления
+                            return await super().feed_update(bot, update, **kwargs)
+                    finally:
+                        self.running -= 1
+        finally:
+            if not started:
+                self.queued -= 1
+            if key is not None:
+                self._release(key)
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "queued": self.queued,
+            "keys": len(self._locks),
+            "concurrency": self.concurrency,
+            "waited_for_key": self.waited_for_key,
+        }
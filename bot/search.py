@@ -0,0 +1,107 @@
+import re
+from collections import defaultdict
+
+# Нечёткий поиск маршрутов по названию и описанию для /find и inline-режима.
+# Текст нормализуется (регистр, ё → е, знаки препинания) и режется на триграммы слов,
+# как в pg_trgm: «  пик » даёт «  п», « пи», «пик», «ик ». Опечатка портит лишь две-три
+# триграммы из многих, поэтому совпадение остаётся высоким. Индекс — обратные списки
+# триграмма -> маршруты; оценка считается только для маршрутов, у которых есть хоть
+# одна общая триграмма с запросом. Индекс подписан на каталог и пересчитывает только
+# маршруты, у которых изменились название или описание.
+
+THRESHOLD = 0.3  # ниже — уже не похоже
+DESCRIPTION_WEIGHT = 0.6  # совпадение в описании весит меньше, чем в названии
+
+_separators = re.compile(r"[\W_]+")
+
+
+def normalize(text):
+    return _separators.sub(" ", (text or "").lower().replace("ё", "е")).strip()
+
+
+def trigrams(text):
+    grams = set()
+    for word in normalize(text).split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    def __init__(self, threshold=THRESHOLD):
+        self.threshold = threshold
+        self.routes = {}  # id -> RouteInfo
+        self._grams = {}  # id -> (триграммы названия, триграммы описания)
+        self._names = defaultdict(set)  # триграмма -> id маршрутов
+        self._descriptions = defaultdict(set)
+        self.queries = 0
+        self.scored = 0  # сколько маршрутов пришлось оценить
+
+    def _add(self, route):
+        name, description = trigrams(route.name), trigrams(route.description)
+        self._grams[route.id] = (name, description)
+        for gram in name:
+            self._names[gram].add(route.id)
+        for gram in description:
+            self._descriptions[gram].add(route.id)
+
+    def _remove(self, route_id):
+        name, description = self._grams.pop(route_id)
+        for postings, grams in ((self._names, name), (self._descriptions, description)):
+            for gram in grams:
+                postings[gram].discard(route_id)
+                if not postings[gram]:
+                    del postings[gram]
+
+    def update(self, route):
+        old = self.routes.get(route.id)
+        self.routes[route.id] = route
+        if old is not None and (old.name, old.description) == (route.name, route.description):
+            return  # текст не менялся — триграммы те же
+        if old is not None:
+            self._remove(route.id)
+        self._add(route)
+
+    def sync(self, catalog):
+        # Подписчик каталога, как и индекс «маршруты рядом»
+        for route_id in self.routes.keys() - catalog.routes.keys():
+            self._remove(route_id)
+            del self.routes[route_id]
+        for route in catalog.all():
+            if self.routes.get(route.id) is not route:
+                self.update(route)
+
+    def search(self, text, limit=10):
+        # -> [(оценка 0..1, RouteInfo)] по убыванию оценки
+        self.queries += 1
+        query = trigrams(text)
+        if not query:
+            return []
+        name_hits = defaultdict(int)
+        description_hits = defaultdict(int)
+        for gram in query:
+            for route_id in self._names.get(gram, ()):
+                name_hits[route_id] += 1
+            for route_id in self._descriptions.get(gram, ()):
+                description_hits[route_id] += 1
+        candidates = name_hits.keys() | description_hits.keys()
+        self.scored += len(candidates)
+        results = []
+        for route_id in candidates:
+            name, _ = self._grams[route_id]
+            shared = name_hits.get(route_id, 0)
+            # Доля триграмм запроса, нашедшихся в тексте: короткий запрос находит длинное название
+            score = max(shared / len(query), DESCRIPTION_WEIGHT * description_hits.get(route_id, 0) / len(query))
+            if score >= self.threshold:
+                # При равной оценке выше то название, что ближе к запросу целиком
+                closeness = shared / (len(query) + len(name) - shared)
+                results.append((score, closeness, self.routes[route_id]))
+        results.sort(key=lambda r: (-r[0], -r[1], r[2].id))
+        return [(score, route) for score, _, route in results[:limit]]
+
+    def stats(self):
+        return {"size": len(self.routes), "trigrams": len(self._names) + len(self._descriptions),
+                "queries": self.queries, "scored": self.scored}
+
+
+route_search = TrigramIndex()
@@ -0,0 +1,154 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram import methods
+from bot.config import SEND_GLOBAL_RATE, SEND_CHAT_RATE, SEND_GROUP_RATE_PER_MIN
+
+# Единый шлюз исходящих сообщений. Подключается как middleware сессии бота,
+# поэтому через него проходят все вызовы — и bot.send_message, и message.answer.
+# Лимиты Telegram: ~30 сообщений/с на бота, ~1/с в личный чат, ~20/мин в группу.
+
+PRIORITY_INTERACTIVE = 0  # ответы на действия пользователя
+PRIORITY_REMINDER = 1     # напоминания и уведомления
+PRIORITY_BROADCAST = 2    # массовые рассылки
+LANES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_REMINDER: "reminder", PRIORITY_BROADCAST: "broadcast"}
+
+send_priority = ContextVar("send_priority", default=PRIORITY_INTERACTIVE)
+
+# Методы, которые создают/меняют сообщения и попадают под лимиты
+RATE_LIMITED = (
+    methods.SendMessage, methods.SendPhoto, methods.SendDocument, methods.SendLocation,
+    methods.SendMediaGroup, methods.CopyMessage, methods.ForwardMessage, methods.EditMessageText,
+)
+
+MAX_RETRIES = 3
+MAX_CHAT_BUCKETS = 10000
+
+
+@contextmanager
+def priority(level):
+    token = send_priority.set(level)
+    try:
+        yield
+    finally:
+        send_priority.reset(token)
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        # Бронирует токен и возвращает, сколько секунд подождать до его появления.
+        # Токены могут уйти в минус — так одновременные ожидающие выстраиваются в очередь.
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(wait, self.blocked_until - now)
+
+    def time_until_token(self):
+        now = time.monotonic()
+        self._refill(now)
+        wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0
+        return max(wait, self.blocked_until - now)
+
+    def block(self, seconds):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class OutboundGateway(BaseRequestMiddleware):
+    def __init__(self, global_rate=SEND_GLOBAL_RATE, chat_rate=SEND_CHAT_RATE, group_rate_per_min=SEND_GROUP_RATE_PER_MIN):
+        self.global_bucket = TokenBucket(global_rate, capacity=global_rate)
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate_per_min / 60
+        self._chat_buckets = OrderedDict()
+        self._waiters = []  # куча (priority, seq, future)
+        self._seq = itertools.count()
+        self._pump_task = None
+        self.queued = {lane: 0 for lane in LANES}
+        self.sent = {lane: 0 for lane in LANES}
+        self.retry_after = 0
+        self.max_depth = 0
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            # В группах (отрицательный chat_id) лимит строже
+            rate = self.group_rate if isinstance(chat_id, int) and chat_id < 0 else self.chat_rate
+            bucket = TokenBucket(rate)
+            self._chat_buckets[chat_id] = bucket
+            if len(self._chat_buckets) > MAX_CHAT_BUCKETS:
+                self._chat_buckets.popitem(last=False)
+        else:
+            self._chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    async def _pump(self):
+        while self._waiters:
+            wait = self.global_bucket.time_until_token()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            prio, _, fut = heapq.heappop(self._waiters)
+            self.queued[prio] -= 1
+            if fut.done():
+                continue  # ожидающего отменили
+            self.global_bucket.reserve()
+            fut.set_result(None)
+
+    async def acquire(self, chat_id, prio):
+        if chat_id is not None:
+            wait = self._chat_bucket(chat_id).reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (prio, next(self._seq), fut))
+        self.queued[prio] += 1
+        self.max_depth = max(self.max_depth, len(self._waiters))
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.create_task(self._pump())
+        await fut
+
+    async def __call__(self, make_request, bot, method):
+        if not isinstance(method, RATE_LIMITED):
+            return await make_request(bot, method)
+        chat_id = getattr(method, "chat_id", None)
+        prio = send_priority.get()
+        for attempt in range(MAX_RETRIES):
+            await self.acquire(chat_id, prio)
+            try:
+                result = await make_request(bot, method)
+                self.sent[prio] += 1
+                return result
+            except TelegramRetryAfter as e:
+                self.retry_after += 1
+                print(f"Flood control для {chat_id}: ждём {e.retry_after} с")
+                if chat_id is not None:
+                    self._chat_bucket(chat_id).block(e.retry_after)
+                else:
+                    self.global_bucket.block(e.retry_after)
+                if attempt == MAX_RETRIES - 1:
+                    raise
+
+    def stats(self):
+        return {
+            "queue_depth": {LANES[p]: n for p, n in self.queued.items()},
+            "sent": {LANES[p]: n for p, n in self.sent.items()},
+            "retry_after": self.retry_after,
+            "max_depth": self.max_depth,
+        }
@@ -0,0 +1,136 @@
+import asyncio
+import io
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree.ElementTree import iterparse
+import numpy as np
+from bot.config import TRACK_WORKERS, TRACK_SMOOTHING
+
+# Импорт трека GPX/KML: расстояние, набор высоты и точка старта маршрута.
+# Документ читается потоково (iterparse, обработанные элементы сразу очищаются),
+# расчёт — векторно по всему массиву точек. Разбор идёт в отдельном процессе,
+# чтобы трек на несколько мегабайт не останавливал обработку других обновлений.
+
+EARTH_RADIUS_KM = 6371.0088
+
+Track = namedtuple("Track", "name distance elevation latitude longitude points")
+
+
+class TrackError(ValueError):
+    pass
+
+
+def _local(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def _kml_coordinates(text):
+    # «lon,lat[,alt] lon,lat[,alt] ...»
+    for chunk in text.split():
+        parts = chunk.split(",")
+        if len(parts) >= 2:
+            yield float(parts[1]), float(parts[0]), float(parts[2]) if len(parts) > 2 else np.nan
+
+
+def parse_track(source):
+    # source — bytes или файловый объект; -> (имя, широты, долготы, высоты)
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    name = None
+    lats, lons, eles = [], [], []
+    ele = np.nan
+    in_point = False  # координаты отдельных меток KML (Point) — не часть трека
+    try:
+        for event, elem in iterparse(source, events=("start", "end")):
+            tag = _local(elem.tag)
+            if event == "start":
+                if tag in ("trkpt", "rtept"):
+                    ele = np.nan
+                elif tag == "Point":
+                    in_point = True
+                continue
+            if tag == "Point":
+                in_point = False
+            if tag == "ele":
+                ele = float(elem.text) if elem.text and elem.text.strip() else np.nan
+            elif tag in ("trkpt", "rtept"):
+                lats.append(float(elem.get("lat")))
+                lons.append(float(elem.get("lon")))
+                eles.append(ele)
+                elem.clear()
+            elif tag == "coordinates" and elem.text and not in_point:
+                for lat, lon, alt in _kml_coordinates(elem.text):
+                    lats.append(lat)
+                    lons.append(lon)
+                    eles.append(alt)
+                elem.clear()
+            elif tag == "coord" and elem.text:  # gx:Track — «lon lat alt»
+                parts = elem.text.split()
+                lons.append(float(parts[0]))
+                lats.append(float(parts[1]))
+                eles.append(float(parts[2]) if len(parts) > 2 else np.nan)
+                elem.clear()
+            elif tag == "name" and name is None and elem.text and elem.text.strip():
+                name = elem.text.strip()
+            elif tag in ("trkseg", "Placemark"):
+                elem.clear()
+    except (SyntaxError, TypeError, ValueError, IndexError) as e:
+        raise TrackError(f"Не удалось разобрать трек: {e}") from e
+    return name, np.array(lats), np.array(lons), np.array(eles)
+
+
+def haversine_km(lats, lons):
+    # Длины всех отрезков ломаной разом
+    phi = np.radians(lats)
+    lam = np.radians(lons)
+    dphi = np.diff(phi)
+    dlam = np.diff(lam)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi[:-1]) * np.cos(phi[1:]) * np.sin(dlam / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def elevation_gain(eles, window=TRACK_SMOOTHING):
+    # Набор высоты по сглаженному профилю: скользящее среднее гасит шум GPS,
+    # который иначе складывается в сотни лишних метров
+    eles = eles[~np.isnan(eles)]
+    if len(eles) < 2:
+        return 0.0
+    window = max(1, min(window, len(eles)))
+    if window > 1:
+        padded = np.pad(eles, (window // 2, window - 1 - window // 2), mode="edge")
+        eles = np.convolve(padded, np.ones(window) / window, mode="valid")
+    rises = np.diff(eles)
+    return float(rises[rises > 0].sum())
+
+
+def analyze(source, window=TRACK_SMOOTHING):
+    name, lats, lons, eles = parse_track(source)
+    if len(lats) < 2:
+        raise TrackError("В треке меньше двух точек")
+    if np.abs(lats).max() > 90 or np.abs(lons).max() > 180:
+        raise TrackError("Координаты вне допустимого диапазона")
+    return Track(
+        name=name,
+        distance=round(float(haversine_km(lats, lons).sum()), 2),
+        elevation=int(round(elevation_gain(eles, window))),
+        latitude=round(float(lats[0]), 6),
+        longitude=round(float(lons[0]), 6),
+        points=len(lats),
+    )
+
+
+_pool = None
+
+
+async def analyze_in_worker(data):
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=TRACK_WORKERS)
+    return await asyncio.get_running_loop().run_in_executor(_pool, analyze, bytes(data))
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,74 @@
+import time
+from collections import OrderedDict
+from sqlalchemy import select
+from bot.config import USER_CACHE_SIZE, USER_NEGATIVE_TTL
+from bot.db import SessionLocal, User
+
+# Кэш зарегистрированных telegram_id. Прогревается при старте, пополняется при регистрации.
+# Обе части ограничены по размеру (LRU); «не зарегистрирован» живёт не дольше USER_NEGATIVE_TTL,
+# чтобы регистрация из другого процесса была видна без перезапуска.
+
+
+class RegisteredUsers:
+    def __init__(self, maxsize=USER_CACHE_SIZE, negative_ttl=USER_NEGATIVE_TTL, negative_maxsize=None):
+        self.maxsize = maxsize
+        self.negative_ttl = negative_ttl
+        self.negative_maxsize = negative_maxsize or max(1, maxsize // 10)
+        self._known = OrderedDict()
+        self._unknown = OrderedDict()  # telegram_id -> expires_at
+        self.hits = 0
+        self.misses = 0
+
+    async def warm(self, session_factory=SessionLocal):
+        async with session_factory() as session:
+            res = await session.execute(select(User.telegram_id).order_by(User.id.desc()).limit(self.maxsize))
+            ids = [r[0] for r in res]
+        for telegram_id in reversed(ids):
+            self.add(telegram_id)
+        return len(ids)
+
+    def add(self, telegram_id):
+        self._unknown.pop(telegram_id, None)
+        self._known[telegram_id] = True
+        self._known.move_to_end(telegram_id)
+        if len(self._known) > self.maxsize:
+            self._known.popitem(last=False)
+
+    def _add_unknown(self, telegram_id):
+        self._unknown[telegram_id] = time.monotonic() + self.negative_ttl
+        self._unknown.move_to_end(telegram_id)
+        if len(self._unknown) > self.negative_maxsize:
+            self._unknown.popitem(last=False)
+
+    def lookup(self, telegram_id):
+        # True/False, если ответ есть в кэше, иначе None
+        if telegram_id in self._known:
+            self._known.move_to_end(telegram_id)
+            return True
+        expires = self._unknown.get(telegram_id)
+        if expires is not None:
+            if expires > time.monotonic():
+                return False
+            del self._unknown[telegram_id]
+        return None
+
+    async def is_registered(self, telegram_id, session_factory=SessionLocal):
+        cached = self.lookup(telegram_id)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        async with session_factory() as session:
+            res = await session.execute(select(User.id).where(User.telegram_id == telegram_id))
+            found = res.first() is not None
+        if found:
+            self.add(telegram_id)
+        else:
+            self._add_unknown(telegram_id)
+        return found
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "known": len(self._known), "unknown": len(self._unknown)}
+
+
+registered_users = RegisteredUsers()
@@ -0,0 +1,249 @@
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+import aiohttp
+from sqlalchemy import select, delete, and_, or_
+from bot.config import (
+    OPEN_METEO_URL, WEATHER_TIMEOUT, WEATHER_CACHE_TTL, WEATHER_CACHE_SIZE, WEATHER_ROUND,
+    WEATHER_PREFETCH_DAYS, WEATHER_BATCH_SIZE, WEATHER_ATTEMPT_TIMEOUT, WEATHER_ATTEMPTS,
+    WEATHER_BREAKER_FAILURES, WEATHER_BREAKER_RESET,
+)
+from bot.db import SessionLocal, Hike, Route, Forecast, dialect_insert
+from bot.resilient import ResilientClient, CircuitBreaker, UpstreamError
+
+# Общий HTTP-клиент приложения: открывается при старте бота и закрывается при остановке.
+_http = None
+
+
+async def start_http():
+    global _http
+    if _http is None or _http.closed:
+        _http = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=WEATHER_TIMEOUT),
+            connector=aiohttp.TCPConnector(limit=20, ttl_dns_cache=300),
+        )
+    return _http
+
+
+async def close_http():
+    global _http
+    if _http is not None:
+        await _http.close()
+        _http = None
+
+
+class ForecastCache:
+    # TTL + LRU по ключу (округлённые lat/lon, дата). Одновременные запросы одного ключа
+    # ждут один и тот же запрос к API (single-flight).
+    def __init__(self, ttl=WEATHER_CACHE_TTL, maxsize=WEATHER_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._items = OrderedDict()  # key -> (expires_at, value)
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def key(lat, lon, target_date):
+        return round(lat, WEATHER_ROUND), round(lon, WEATHER_ROUND), str(target_date)
+
+    def _store(self, key, value):
+        self._items[key] = (time.monotonic() + self.ttl, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    async def get(self, key, loader):
+        entry = self._items.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self.hits += 1
+                self._items.move_to_end(key)
+                return entry[1]
+            del self._items[key]
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.coalesced += 1
+            return await asyncio.shield(fut)
+        self.misses += 1
+        fut = asyncio.get_running_loop().create_future()
+        # Ошибку заберёт любой из ожидающих; если их нет — не ругаемся в лог
+        fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = fut
+        try:
+            value = await loader()
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                fut.cancel()
+            else:
+                fut.set_exception(e)
+            raise
+        else:
+            self._store(key, value)
+            fut.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def clear(self):
+        self._items.clear()
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "size": len(self._items),
+        }
+
+
+forecast_cache = ForecastCache()
+
+# Все запросы к open-meteo — через устойчивый клиент (таймауты, повторы, предохранитель)
+client = ResilientClient(
+    "open_meteo", start_http, attempts=WEATHER_ATTEMPTS, attempt_timeout=WEATHER_ATTEMPT_TIMEOUT,
+    deadline=WEATHER_TIMEOUT, breaker=CircuitBreaker(WEATHER_BREAKER_FAILURES, WEATHER_BREAKER_RESET),
+)
+
+
+DAILY = "temperature_2m_min,temperature_2m_max,precipitation_sum,windspeed_10m_max"
+
+
+async def _fetch_forecast(lat, lon, target_date):
+    params = {
+        "latitude": lat,
+        "longitude": lon,
+        "daily": DAILY,
+        "timezone": "auto",
+        "start_date": str(target_date),
+        "end_date": str(target_date),
+    }
+    data = await client.get_json(OPEN_METEO_URL, params)
+    daily = data.get("daily", {}) if isinstance(data, dict) else {}
+    if not daily or not daily.get("temperature_2m_min"):
+        return None
+    values = tuple((daily.get(k) or [None])[0] for k in DAILY.split(","))
+    if None in values:
+        return None  # open-meteo отдаёт null по отдельным полям — прогноз неполный
+    return values
+
+
+async def get_weather_forecast(lat, lon, target_date):
+    # None — прогноз недоступен (API сбоит или предохранитель разомкнут); в кэш такой ответ не попадает
+    key = ForecastCache.key(lat, lon, target_date)
+    # Запрашиваем прогноз для округлённой точки — соседние маршруты делят одну запись кэша
+    try:
+        return await forecast_cache.get(key, lambda: _fetch_forecast(key[0], key[1], target_date))
+    except UpstreamError as e:
+        print(f"Прогноз для {key} недоступен: {e}")
+        return None
+
+
+# Предзагрузка: раз в WEATHER_PREFETCH_INTERVAL все различные точки походов на ближайшие
+# WEATHER_PREFETCH_DAYS дней запрашиваются у open-meteo пачками (несколько точек в одном
+# запросе через списки latitude/longitude) и сохраняются в таблицу forecasts.
+# /upcoming и напоминания читают прогноз из БД, без сетевых запросов на пути ответа.
+# Ключ — точные координаты маршрута, чтобы прогноз присоединялся к походу обычным JOIN.
+
+
+async def fetch_many(points, start, end):
+    # points — [(lat, lon)]; ответ — {(lat, lon): {день: (t_min, t_max, осадки, ветер)}}
+    params = {
+        "latitude": ",".join(str(lat) for lat, _ in points),
+        "longitude": ",".join(str(lon) for _, lon in points),
+        "daily": DAILY,
+        "timezone": "auto",
+        "start_date": str(start),
+        "end_date": str(end),
+    }
+    data = await client.get_json(OPEN_METEO_URL, params)
+    if isinstance(data, dict):
+        data = [data]  # для одной точки open-meteo отвечает объектом, а не списком
+    result = {}
+    for point, item in zip(points, data):
+        daily = item.get("daily") or {}
+        columns = [daily.get(k) or [] for k in DAILY.split(",")]
+        result[point] = {
+            date.fromisoformat(day): values
+            for day, *values in zip(daily.get("time") or [], *columns)
+        }
+    return result
+
+
+async def upcoming_points(today, days, session_factory=SessionLocal):
+    async with session_factory() as session:
+        res = await session.execute(
+            select(Route.latitude, Route.longitude, Hike.date)
+            .join(Hike, Hike.route_id == Route.id)
+            .where(
+                Hike.date >= today, Hike.date <= today + timedelta(days=days),
+                Route.latitude.is_not(None), Route.longitude.is_not(None),
+            )
+            .distinct()
+        )
+        wanted = {}
+        for lat, lon, day in res:
+            wanted.setdefault((lat, lon), set()).add(day)
+        return wanted
+
+
+async def prefetch(days=WEATHER_PREFETCH_DAYS, session_factory=SessionLocal, fetch=fetch_many, today=None):
+    today = today or date.today()
+    wanted = await upcoming_points(today, days, session_factory)
+    points = sorted(wanted)
+    batches = [points[i:i + WEATHER_BATCH_SIZE] for i in range(0, len(points), WEATHER_BATCH_SIZE)]
+    end = max((max(d) for d in wanted.values()), default=today)
+    results = await asyncio.gather(*(fetch(batch, today, end) for batch in batches), return_exceptions=True)
+    rows = []
+    for batch, result in zip(batches, results):
+        if isinstance(result, Exception):
+            print(f"Предзагрузка погоды: пачка из {len(batch)} точек не загружена: {result!r}")
+            continue
+        for point in batch:
+            by_day = result.get(point, {})
+            for day in wanted[point]:
+                if day in by_day:
+                    t_min, t_max, precip, wind = by_day[day]
+                    rows.append({"day": day, "latitude": point[0], "longitude": point[1],
+                                 "t_min": t_min, "t_max": t_max, "precipitation": precip, "wind": wind})
+    async with session_factory() as session:
+        if rows:
+            insert = dialect_insert(session)
+            stmt = insert(Forecast)
+            await session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["day", "latitude", "longitude"],
+                    set_={c: stmt.excluded[c] for c in ("t_min", "t_max", "precipitation", "wind", "fetched_at")},
+                ),
+                rows,
+            )
+        await session.execute(delete(Forecast).where(Forecast.day < today))
+        await session.commit()
+    return len(rows)
+
+
+def forecast_tuple(forecast):
+    # Строка forecasts -> (t_min, t_max, осадки, ветер), как у get_weather_forecast;
+    # None, если хоть одно поле пустое — иначе форматирование в напоминаниях упадёт
+    if forecast is None:
+        return None
+    values = forecast.t_min, forecast.t_max, forecast.precipitation, forecast.wind
+    return None if None in values else values
+
+
+async def stored_forecasts(coords, day, session_factory=SessionLocal):
+    # {(lat, lon): прогноз} для точек, по которым в БД есть прогноз на day
+    coords = list(coords)
+    if not coords:
+        return {}
+    async with session_factory() as session:
+        res = await session.execute(
+            select(Forecast).where(
+                Forecast.day == day,
+                or_(*(and_(Forecast.latitude == lat, Forecast.longitude == lon) for lat, lon in coords)),
+            )
+        )
+        # Неполные строки не возвращаем — для них прогноз запросят заново
+        return {(f.latitude, f.longitude): t for f in res.scalars() if (t := forecast_tuple(f))}
@@ -0,0 +1,114 @@
+import asyncio
+from contextlib import nullcontext
+from aiohttp import web
+from aiogram import types
+from bot import metrics
+from bot.config import (
+    WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT,
+    WEBHOOK_DRAIN_TIMEOUT,
+)
+
+# Режим webhook: встроенный aiohttp-сервер. Telegram получает 200 сразу,
+# обновление обрабатывается в фоне. Параллелизм и порядок обновлений одного
+# пользователя обеспечивает OrderedDispatcher; workers — лимит для обычного Dispatcher.
+# На том же сервере — /healthz и /metrics.
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class UpdateWorkers:
+    def __init__(self, dp, bot, workers=None):
+        self.dp = dp
+        self.bot = bot
+        # Свой семафор занимал бы слот, пока обновление ждёт очереди своего пользователя
+        self.sem = asyncio.Semaphore(workers) if workers else nullcontext()
+        self.tasks = set()
+        self.accepting = True
+        self.received = 0
+        self.failed = 0
+
+    def submit(self, update):
+        self.received += 1
+        task = asyncio.create_task(self._process(update))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _process(self, update):
+        async with self.sem:
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception as e:
+                self.failed += 1
+                print(f"Ошибка обработки update {update.update_id}: {e!r}")
+
+    async def drain(self, timeout=WEBHOOK_DRAIN_TIMEOUT):
+        # Перестаём принимать новые обновления и ждём начатые
+        self.accepting = False
+        if not self.tasks:
+            return 0
+        done, pending = await asyncio.wait(set(self.tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        return len(pending)
+
+    def stats(self):
+        return {"in_flight": len(self.tasks), "received": self.received, "failed": self.failed}
+
+
+WORKERS_KEY = web.AppKey("workers", UpdateWorkers)
+
+
+def create_app(dp, bot, secret=WEBHOOK_SECRET, path=WEBHOOK_PATH, workers=None):
+    pool = UpdateWorkers(dp, bot, workers)
+
+    async def handle_update(request):
+        if secret and request.headers.get(SECRET_HEADER) != secret:
+            return web.Response(status=401)
+        if not pool.accepting:
+            return web.Response(status=503)  # Telegram повторит доставку позже
+        try:
+            data = await request.json()
+            update = types.Update.model_validate(data, context={"bot": bot})
+        except Exception:
+            return web.Response(status=400)
+        pool.submit(update)
+        return web.Response(status=200)
+
+    async def healthz(request):
+        status = 200 if pool.accepting else 503
+        return web.json_response({"status": "ok" if pool.accepting else "draining", **pool.stats()}, status=status)
+
+    async def metrics_route(request):
+        return web.Response(text=metrics.render(), content_type="text/plain")
+
+    async def on_shutdown(app):
+        left = await pool.drain()
+        if left:
+            print(f"Webhook: прервано необработанных обновлений: {left}")
+
+    app = web.Application()
+    app[WORKERS_KEY] = pool
+    app.router.add_post(path, handle_update)
+    app.router.add_get("/healthz", healthz)
+    app.router.add_get("/metrics", metrics_route)
+    app.on_shutdown.append(on_shutdown)
+    return app
+
+
+async def run_webhook(dp, bot):
+    app = create_app(dp, bot)
+    metrics.register("webhook", app[WORKERS_KEY].stats)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    await site.start()
+    await bot.set_webhook(
+        WEBHOOK_BASE_URL.rstrip("/") + WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET or None,
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+    print(f"Webhook слушает {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()  # on_shutdown дождётся начатых обновлений
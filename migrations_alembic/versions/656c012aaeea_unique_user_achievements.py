@@ -0,0 +1,33 @@
+"""unique user achievements
+
+Revision ID: 656c012aaeea
+Revises: 38811f35798d
+Create Date: 2026-10-18 11:02:17.164902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '656c012aaeea'
+down_revision: Union[str, Sequence[str], None] = '38811f35798d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Убираем дубли, оставшиеся от старого check_achievements
+    op.execute(
+        "DELETE FROM user_achievements WHERE id NOT IN ("
+        "SELECT MIN(id) FROM user_achievements GROUP BY user_id, achievement_id)"
+    )
+    op.create_unique_constraint('uq_user_achievements_user_achievement', 'user_achievements', ['user_id', 'achievement_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_user_achievements_user_achievement', 'user_achievements', type_='unique')
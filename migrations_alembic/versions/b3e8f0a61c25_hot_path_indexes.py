@@ -0,0 +1,45 @@
+"""hot path indexes
+
+Revision ID: b3e8f0a61c25
+Revises: 4f1d2b7c9a10
+Create Date: 2026-10-18 15:10:44.902117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e8f0a61c25'
+down_revision: Union[str, Sequence[str], None] = '4f1d2b7c9a10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Повторные записи одного участника в поход: оставляем первую, отметку «дошёл» берём из любой
+    op.execute(
+        "UPDATE hike_participants SET completed = 1 WHERE completed = 0 AND id IN ("
+        "SELECT MIN(id) FROM hike_participants GROUP BY hike_id, user_id HAVING MAX(completed) = 1)"
+    )
+    op.execute(
+        "DELETE FROM hike_participants WHERE id NOT IN ("
+        "SELECT MIN(id) FROM hike_participants GROUP BY hike_id, user_id)"
+    )
+    op.create_index('uq_hike_participants_hike_user', 'hike_participants', ['hike_id', 'user_id'], unique=True)
+    op.create_index('ix_hike_participants_user_completed', 'hike_participants', ['user_id', 'completed'], unique=False)
+    op.create_index('ix_hikes_date_id', 'hikes', ['date', 'id'], unique=False)
+    op.create_index(op.f('ix_hikes_route_id'), 'hikes', ['route_id'], unique=False)
+    op.create_index('ix_users_leaderboard', 'users', ['total_distance', 'hikes_count'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_users_leaderboard', table_name='users')
+    op.drop_index(op.f('ix_hikes_route_id'), table_name='hikes')
+    op.drop_index('ix_hikes_date_id', table_name='hikes')
+    op.drop_index('ix_hike_participants_user_completed', table_name='hike_participants')
+    op.drop_index('uq_hike_participants_hike_user', table_name='hike_participants')
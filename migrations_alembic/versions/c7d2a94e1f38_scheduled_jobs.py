@@ -0,0 +1,44 @@
+"""scheduled jobs and reminder marks
+
+Revision ID: c7d2a94e1f38
+Revises: b3e8f0a61c25
+Create Date: 2026-10-18 16:41:09.275310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7d2a94e1f38'
+down_revision: Union[str, Sequence[str], None] = 'b3e8f0a61c25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('scheduled_jobs',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('next_run_at', sa.DateTime(), nullable=False),
+    sa.Column('last_run_at', sa.DateTime(), nullable=True),
+    sa.Column('lease_owner', sa.String(length=128), nullable=True),
+    sa.Column('lease_until', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.create_table('reminder_marks',
+    sa.Column('hike_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('sent_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['hike_id'], ['hikes.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('hike_id', 'user_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('reminder_marks')
+    op.drop_table('scheduled_jobs')
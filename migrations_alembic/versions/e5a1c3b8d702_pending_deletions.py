@@ -0,0 +1,35 @@
+"""pending deletions
+
+Revision ID: e5a1c3b8d702
+Revises: c7d2a94e1f38
+Create Date: 2026-10-18 17:20:52.114807
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a1c3b8d702'
+down_revision: Union[str, Sequence[str], None] = 'c7d2a94e1f38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('pending_deletions',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('chat_id', sa.BigInteger(), nullable=False),
+    sa.Column('message_id', sa.Integer(), nullable=False),
+    sa.Column('delete_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('chat_id', 'message_id', name='uq_pending_deletions_chat_message')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('pending_deletions')
@@ -0,0 +1,38 @@
+"""forecasts
+
+Revision ID: f2b6d8e0a417
+Revises: e5a1c3b8d702
+Create Date: 2026-10-18 18:05:37.640215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b6d8e0a417'
+down_revision: Union[str, Sequence[str], None] = 'e5a1c3b8d702'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('forecasts',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('latitude', sa.Float(), nullable=False),
+    sa.Column('longitude', sa.Float(), nullable=False),
+    sa.Column('t_min', sa.Float(), nullable=True),
+    sa.Column('t_max', sa.Float(), nullable=True),
+    sa.Column('precipitation', sa.Float(), nullable=True),
+    sa.Column('wind', sa.Float(), nullable=True),
+    sa.Column('fetched_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'latitude', 'longitude')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('forecasts')
@@ -0,0 +1,49 @@
+import os
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+# До первого импорта bot: bot.config читает .env, но не перезаписывает уже заданные переменные,
+# поэтому bot.db.engine в тестах — SQLite в памяти, а не настоящая БД из .env
+DATABASE_URL = "sqlite+aiosqlite:///:memory:"
+os.environ["DATABASE_URL"] = DATABASE_URL
+os.environ.setdefault("BOT_TOKEN", "123456:ABCdef")
+
+from bot.db import Base
+from benchmarks.query_budget import QueryBudget
+
+
+@pytest.fixture
+def query_budget():
+    # with query_budget(engine, max_statements=5): await handler(...)
+    return QueryBudget
+
+
+# Общая тестовая БД: пустая SQLite в памяти со всеми таблицами, своя на каждый тест.
+# Модули, которым нужны данные, переопределяют фикстуру с тем же именем и наполняют её.
+@pytest.fixture
+async def engine():
+    engine = create_async_engine(DATABASE_URL, echo=False, future=True)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return async_sessionmaker(engine, expire_on_commit=False)
+
+
+@pytest.fixture
+async def app_db(monkeypatch):
+    # БД самого бота (bot.db.engine) для тестов через Dispatcher из bot.main.
+    # После теста соединение закрывается, и база в памяти исчезает вместе с ним — drop_all не нужен
+    from bot import main
+    from bot.db import engine as app_engine
+    from bot.users_cache import RegisteredUsers
+    assert app_engine.url.database == ":memory:", app_engine.url
+    async with app_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    monkeypatch.setattr(main, "registered_users", RegisteredUsers())
+    yield app_engine
+    await app_engine.dispose()
@@ -0,0 +1,87 @@
+import pytest
+import asyncio
+import time
+from sqlalchemy import select, func
+from aiogram import Bot
+from aiogram.methods import DeleteMessages
+from bot.db import PendingDeletion
+from bot.auto_delete import AutoDeleter
+from benchmarks.fake_bot import RecordingSession
+
+class DeletingSession(RecordingSession):
+    def __init__(self):
+        super().__init__()
+        self.deleted = []
+
+    async def make_request(self, bot, method, timeout=None):
+        if isinstance(method, DeleteMessages):
+            self.deleted.append((method.chat_id, list(method.message_ids)))
+        return await super().make_request(bot, method, timeout)
+
+async def pending(session_factory):
+    async with session_factory() as session:
+        return await session.scalar(select(func.count()).select_from(PendingDeletion))
+
+@pytest.mark.asyncio
+async def test_due_messages_are_deleted_in_batches_per_chat(session_factory):
+    bot = Bot(token="123456:ABCdef", session=DeletingSession())
+    deleter = AutoDeleter(session_factory, delay=15, window=1)
+    for message_id in range(1, 151):
+        deleter.schedule(-100, message_id)
+    deleter.schedule(-200, 7)
+    deleter.schedule(-200, 8, delay=60)
+    now = time.time()
+    assert await deleter.run_once(bot, now) == 0
+    assert await pending(session_factory) == 152
+    assert await deleter.run_once(bot, now + 15) == 151
+    assert bot.session.deleted == [(-200, [7]), (-100, list(range(1, 101))), (-100, list(range(101, 151)))]
+    assert deleter.stats()["api_calls"] == 3
+    assert await pending(session_factory) == 1  # осталось сообщение с задержкой 60 с
+
+@pytest.mark.asyncio
+async def test_pending_deletions_survive_restart(session_factory):
+    bot = Bot(token="123456:ABCdef", session=DeletingSession())
+    first = AutoDeleter(session_factory, delay=15)
+    first.schedule(-100, 1)
+    first.schedule(-100, 2, delay=-5)  # уже просрочено
+    await first.run_once(bot, time.time() - 30)  # только запись в БД, «процесс упал»
+    second = AutoDeleter(session_factory, delay=15)
+    assert await second.load() == 2
+    assert await second.run_once(bot) == 1
+    assert bot.session.deleted == [(-100, [2])]
+    assert await second.run_once(bot, time.time() + 15) == 1
+    assert await pending(session_factory) == 0
+
+@pytest.mark.asyncio
+async def test_worker_wakes_for_new_messages(session_factory):
+    bot = Bot(token="123456:ABCdef", session=DeletingSession())
+    deleter = AutoDeleter(session_factory, delay=0.05, window=0.01)
+    await deleter.start(bot)
+    for message_id in (1, 2, 3):
+        deleter.schedule(-100, message_id)
+    await asyncio.sleep(0.3)
+    deleter._task.cancel()
+    assert bot.session.deleted == [(-100, [1, 2, 3])]
+    assert await pending(session_factory) == 0
+
+@pytest.mark.asyncio
+async def test_worker_survives_unexpected_errors(session_factory):
+    bot = Bot(token="123456:ABCdef", session=DeletingSession())
+    deleter = AutoDeleter(session_factory, delay=0.05, window=0.01)
+    deleter.schedule(-100, 1)  # до start(): события пробуждения ещё нет
+    wait = deleter._wait
+    failures = []
+
+    async def flaky_wait():
+        if not failures:
+            failures.append(1)
+            raise RuntimeError("Future attached to a different loop")
+        await wait()
+
+    deleter._wait = flaky_wait
+    await deleter.start(bot)
+    deleter.schedule(-100, 2)
+    await asyncio.sleep(0.3)
+    deleter._task.cancel()
+    assert failures == [1]
+    assert sorted(m for _, ids in bot.session.deleted for m in ids) == [1, 2]
@@ -0,0 +1,58 @@
+import pytest
+from datetime import date
+from sqlalchemy import select
+from bot.db import User, Route, Hike, HikeParticipant, Achievement, UserAchievement
+from bot import achievements
+from bot.backfill import backfill
+
+@pytest.fixture(scope="function")
+async def session_factory(session_factory):
+    achievements._catalog.clear()
+    async with session_factory() as session:
+        veteran = User(telegram_id=1, name="Ветеран", phone="+7", age=40, hikes_count=12, total_distance=120.0, total_elevation=0)
+        walker = User(telegram_id=2, name="Ходок", phone="+7", age=30, hikes_count=3, total_distance=30.0, total_elevation=0)
+        newbie = User(telegram_id=3, name="Новичок", phone="+7", age=20, hikes_count=0, total_distance=0.0, total_elevation=0)
+        route = Route(name="Пик", distance=10, elevation=100, description="d", difficulty="сложная")
+        session.add_all([veteran, walker, newbie, route])
+        await session.flush()
+        for day in (1, 2, 3, 10):
+            hike = Hike(route_id=route.id, date=date(2024, 8, day))
+            session.add(hike)
+            await session.flush()
+            session.add(HikeParticipant(hike_id=hike.id, user_id=walker.id, completed=1))
+            if day in (1, 3, 10):
+                session.add(HikeParticipant(hike_id=hike.id, user_id=veteran.id, completed=1))
+        await session.commit()
+    return session_factory
+
+@pytest.mark.asyncio
+async def test_backfill_dry_run_and_apply(session_factory):
+    seen = []
+
+    async def progress(done, total, report):
+        seen.append((done, total))
+
+    dry = await backfill(session_factory, dry_run=True, batch_size=2, progress=progress)
+    assert seen == [(2, 3), (3, 3)]
+    assert dry["users"] == 3
+    assert dry["ranks"] == {"Турист": 1, "Новичок+": 1}
+    assert dry["achievements"]["3 подряд"] == 1
+    assert dry["achievements"]["Все маршруты клуба"] == 2
+    assert dry["achievements"]["Серебряный туризм"] == 1
+    assert dry["achievements"]["Сложный маршрут"] == 2
+    async with session_factory() as session:
+        res = await session.execute(select(UserAchievement))
+        assert res.scalars().all() == []
+
+    report = await backfill(session_factory, batch_size=2)
+    assert report["achievements"] == dry["achievements"]
+    async with session_factory() as session:
+        res = await session.execute(select(User.name, User.rank).order_by(User.id))
+        assert res.all() == [("Ветеран", "Турист"), ("Ходок", "Новичок+"), ("Новичок", "Новичок")]
+        res = await session.execute(
+            select(Achievement.name).join(UserAchievement).join(User).where(User.name == "Ходок")
+        )
+        assert set(res.scalars()) == {"Первый поход", "3 подряд", "Сложный маршрут", "Все маршруты клуба"}
+
+    again = await backfill(session_factory)
+    assert not again["ranks"] and not again["achievements"]
@@ -0,0 +1,22 @@
+import pytest
+from sqlalchemy import select, func
+from bot.db import User, Hike, HikeParticipant
+from benchmarks.datagen import generate, telegram_id
+
+@pytest.mark.asyncio
+async def test_generator_is_consistent(engine, session_factory):
+    await generate(engine, users=50, routes=5, hikes=20, participations=203, progress=lambda *a: None)
+    async with session_factory() as session:
+        assert (await session.execute(select(func.count()).select_from(HikeParticipant))).scalar() == 203
+        assert (await session.execute(select(func.count()).select_from(Hike))).scalar() == 20
+        # Итоги пользователей совпадают с завершёнными прошлыми участиями
+        res = await session.execute(
+            select(HikeParticipant.user_id, func.count())
+            .join(Hike, HikeParticipant.hike_id == Hike.id)
+            .where(HikeParticipant.completed == 1, Hike.date < func.current_date())
+            .group_by(HikeParticipant.user_id)
+        )
+        done = dict(res.all())
+        users = (await session.execute(select(User))).scalars().all()
+        assert {u.id: u.hikes_count for u in users if u.hikes_count} == done
+        assert users[0].telegram_id == telegram_id(users[0].id)
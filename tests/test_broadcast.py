@@ -0,0 +1,85 @@
+import pytest
+import asyncio
+from aiogram.exceptions import TelegramForbiddenError
+from sqlalchemy import select
+from bot.db import User, BroadcastJob, BroadcastDelivery
+from bot import broadcast
+
+class FakeBot:
+    def __init__(self, blocked=()):
+        self.sent = []
+        self.edits = []
+        self.blocked = set(blocked)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if chat_id in self.blocked:
+            raise TelegramForbiddenError(method=None, message="bot was blocked by the user")
+        self.sent.append(chat_id)
+
+    async def edit_message_text(self, text, **kwargs):
+        self.edits.append(text)
+
+@pytest.fixture(scope="function")
+async def session_factory(session_factory):
+    async with session_factory() as session:
+        session.add_all([
+            User(telegram_id=1000 + i, name=f"u{i}", phone="+7", age=20, notifications_enabled=0 if i == 3 else 1)
+            for i in range(10)
+        ])
+        await session.commit()
+    return session_factory
+
+@pytest.mark.asyncio
+async def test_broadcast_ledger(session_factory, monkeypatch):
+    monkeypatch.setattr(broadcast, "BROADCAST_BATCH_SIZE", 4)
+    bot = FakeBot(blocked={1005})
+    job = await broadcast.create_job(1, 1, "Привет", session_factory)
+    await broadcast.set_progress_message(job.id, 42, session_factory)
+    job = await broadcast.run_broadcast(bot, job.id, session_factory)
+    assert job.status == "done"
+    assert (job.sent, job.blocked, job.failed) == (8, 1, 0)
+    assert 1003 not in bot.sent
+    assert bot.edits[-1].startswith("Рассылка завершена.")
+    async with session_factory() as session:
+        res = await session.execute(select(BroadcastDelivery.status).where(BroadcastDelivery.job_id == job.id))
+        statuses = sorted(r[0] for r in res)
+    assert statuses.count("sent") == 8 and statuses.count("blocked") == 1
+
+@pytest.mark.asyncio
+async def test_broadcast_resume(session_factory, monkeypatch):
+    monkeypatch.setattr(broadcast, "BROADCAST_BATCH_SIZE", 3)
+    job = await broadcast.create_job(1, 1, "Привет", session_factory)
+    bot = FakeBot()
+    first = await broadcast._claim_batch(job.id, 0, session_factory)
+    results = await asyncio.gather(*(broadcast._deliver(bot, tg, "Привет", asyncio.Semaphore(2)) for _, tg in first))
+    await broadcast._record_batch(job.id, first, results, session_factory)
+    await broadcast._claim_batch(job.id, first[-1][0], session_factory)  # пачка «в полёте» в момент падения
+    job = await broadcast.run_broadcast(bot, job.id, session_factory)
+    assert job.status == "done"
+    assert len(bot.sent) == len(set(bot.sent)) == 6
+    assert (job.sent, job.failed) == (6, 3)
+    async with session_factory() as session:
+        res = await session.execute(select(BroadcastDelivery).where(BroadcastDelivery.error == "interrupted"))
+        assert len(res.scalars().all()) == 3
+
+@pytest.mark.asyncio
+async def test_broadcast_failure_is_recorded_and_reported(session_factory, monkeypatch):
+    monkeypatch.setattr(broadcast, "BROADCAST_BATCH_SIZE", 3)
+    record = broadcast._record_batch
+    calls = []
+
+    async def flaky_record(*args):
+        calls.append(1)
+        if len(calls) == 2:
+            raise RuntimeError("database is locked")
+        return await record(*args)
+
+    monkeypatch.setattr(broadcast, "_record_batch", flaky_record)
+    job = await broadcast.create_job(1, 77, "Привет", session_factory)
+    bot = FakeBot()
+    job = await broadcast.run_broadcast(bot, job.id, session_factory)
+    assert job.status == "failed" and job.finished_at is not None
+    assert (job.sent, job.failed) == (3, 3)  # вторая пачка ушла, но итог не записан
+    assert bot.sent[-1] == 77  # админу — сообщение о сбое
+    # Упавшая задача не продолжается при старте
+    assert await broadcast.resume_broadcasts(bot, session_factory) == []
@@ -0,0 +1,88 @@
+import pytest
+from datetime import date
+from sqlalchemy import select, func
+from bot.db import User, Route, Hike, HikeParticipant, UserAchievement
+from bot.routes_catalog import RouteCatalog, route_info
+from bot.completion import complete_hike
+from bot import achievements
+from bot.achievements import award_achievements
+
+@pytest.fixture(scope="function")
+async def session(session_factory):
+    async with session_factory() as session:
+        yield session
+
+async def seed(session):
+    achievements._catalog.clear()
+    users = [User(telegram_id=700 + i, name=f"u{i}", phone="+7", age=20) for i in range(3)]
+    easy = Route(name="Лёгкий", distance=5.0, elevation=300, description="d", difficulty="лёгкая")
+    hard = Route(name="Сложный", distance=20.0, elevation=1200, description="d", difficulty="Сложная")
+    session.add_all(users + [easy, hard])
+    await session.flush()
+    hikes = [
+        Hike(route_id=easy.id, date=date(2024, 8, 1)),
+        Hike(route_id=easy.id, date=date(2024, 8, 2)),
+        Hike(route_id=hard.id, date=date(2024, 8, 3)),
+    ]
+    session.add_all(hikes)
+    await session.flush()
+    for hike in hikes:
+        for user in users:
+            session.add(HikeParticipant(hike_id=hike.id, user_id=user.id, completed=0))
+    await session.commit()
+    return users, hikes
+
+@pytest.mark.asyncio
+async def test_complete_hike_updates_stats_in_bulk(session):
+    users, hikes = await seed(session)
+    u0, u1, u2 = (u.id for u in users)
+    route, finished = await complete_hike(session, hikes[0].id, [u0, u1, 9999])
+    assert route.name == "Лёгкий"
+    assert sorted(u.id for u, _ in finished) == [u0, u1]
+    for user, new_ach in finished:
+        assert (user.total_distance, user.total_elevation, user.hikes_count) == (5.0, 300, 1)
+        assert [a.name for a in new_ach] == ["Первый поход"]
+    res = await session.execute(
+        select(HikeParticipant.user_id, HikeParticipant.completed).where(HikeParticipant.hike_id == hikes[0].id)
+    )
+    assert dict(res.all()) == {u0: 1, u1: 1, u2: 0}
+    untouched = await session.get(User, u2)
+    assert untouched.hikes_count == 0
+
+@pytest.mark.asyncio
+async def test_complete_hike_context(session):
+    users, hikes = await seed(session)
+    uid = users[0].id
+    await complete_hike(session, hikes[0].id, [uid])
+    await complete_hike(session, hikes[1].id, [uid])
+    route, finished = await complete_hike(session, hikes[2].id, [uid])
+    (user, new_ach), = finished
+    names = {a.name for a in new_ach}
+    assert names == {"3 подряд", "Сложный маршрут", "Все маршруты клуба"}
+    assert user.hikes_count == 3 and user.rank == "Новичок+"
+    assert user.total_distance == 30.0
+
+@pytest.mark.asyncio
+async def test_complete_hike_with_route_catalog(session):
+    users, hikes = await seed(session)
+    uid = users[0].id
+    catalog = RouteCatalog()
+    catalog._set({r.id: route_info(r) for r in (await session.execute(select(Route))).scalars()})
+    await complete_hike(session, hikes[0].id, [uid], catalog=catalog)
+    await complete_hike(session, hikes[1].id, [uid], catalog=catalog)
+    route, finished = await complete_hike(session, hikes[2].id, [uid], catalog=catalog)
+    assert route.name == "Сложный"
+    (user, new_ach), = finished
+    assert {a.name for a in new_ach} == {"3 подряд", "Сложный маршрут", "Все маршруты клуба"}
+
+@pytest.mark.asyncio
+async def test_award_is_idempotent(session):
+    users, hikes = await seed(session)
+    user = users[0]
+    user.hikes_count = 5
+    first = await award_achievements(session, [user])
+    assert [a.name for a in first[user.id]] == ["Первые шаги"]
+    second = await award_achievements(session, [user])
+    assert second[user.id] == []
+    res = await session.execute(select(func.count()).select_from(UserAchievement))
+    assert res.scalar() == 1
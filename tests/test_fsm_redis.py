@@ -0,0 +1,63 @@
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+
+fakeredis = pytest.importorskip("fakeredis")
+from bot.fsm_redis import BatchedRedisStorage
+from bot.fsm_storage import update_scope
+
+KEY = StorageKey(bot_id=1, chat_id=42, user_id=42)
+
+
+class CountingRedis(fakeredis.FakeAsyncRedis):
+    reads = 0
+
+    async def mget(self, *args, **kwargs):
+        CountingRedis.reads += 1
+        return await super().mget(*args, **kwargs)
+
+
+@pytest.fixture
+def redis():
+    CountingRedis.reads = 0
+    return CountingRedis()
+
+
+@pytest.mark.asyncio
+async def test_state_and_data_round_trip(redis):
+    storage = BatchedRedisStorage(redis=redis)
+    await storage.set_state(KEY, "AddRouteStates:name")
+    assert await storage.update_data(KEY, {"name": "Пик Каракол"}) == {"name": "Пик Каракол"}
+    restarted = BatchedRedisStorage(redis=redis)
+    assert await restarted.get_state(KEY) == "AddRouteStates:name"
+    assert await restarted.get_data(KEY) == {"name": "Пик Каракол"}
+    await restarted.set_state(KEY, None)
+    await restarted.set_data(KEY, {})
+    assert await storage.get_state(KEY) is None and await storage.get_data(KEY) == {}
+
+
+@pytest.mark.asyncio
+async def test_one_read_per_update(redis):
+    storage = BatchedRedisStorage(redis=redis)
+    await storage.set_state(KEY, "RegStates:name")
+    CountingRedis.reads = 0
+    with update_scope():
+        await storage.get_state(KEY)
+        await storage.get_data(KEY)
+        await storage.update_data(KEY, {"name": "Айбек"})
+        assert await storage.get_data(KEY) == {"name": "Айбек"}
+    assert CountingRedis.reads == 1
+
+
+@pytest.mark.asyncio
+async def test_next_update_sees_other_worker_write(redis):
+    first, second = BatchedRedisStorage(redis=redis), BatchedRedisStorage(redis=redis)
+    with update_scope():
+        await first.set_state(KEY, "RegStates:name")
+        await first.get_data(KEY)
+    with update_scope():
+        await second.set_state(KEY, "RegStates:phone")
+        await second.update_data(KEY, {"name": "Айбек"})
+    with update_scope():
+        assert await first.get_state(KEY) == "RegStates:phone"
+        await first.update_data(KEY, {"phone": "+996"})
+    assert await second.get_data(KEY) == {"name": "Айбек", "phone": "+996"}
@@ -0,0 +1,54 @@
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+from sqlalchemy import event
+from bot.fsm_storage import SQLStorage, update_scope
+from bot.main import AddRouteStates
+
+KEY = StorageKey(bot_id=1, chat_id=42, user_id=42)
+
+@pytest.mark.asyncio
+async def test_state_survives_restart(session_factory):
+    storage = SQLStorage(session_factory)
+    await storage.set_state(KEY, AddRouteStates.distance)
+    await storage.update_data(KEY, {"name": "Пик Каракол"})
+    # «Перезапуск»: новое хранилище без кэша
+    restarted = SQLStorage(session_factory)
+    assert await restarted.get_state(KEY) == AddRouteStates.distance.state
+    assert await restarted.get_data(KEY) == {"name": "Пик Каракол"}
+    await restarted.set_state(KEY, None)
+    await restarted.set_data(KEY, {})
+    assert await SQLStorage(session_factory).get_state(KEY) is None
+
+@pytest.mark.asyncio
+async def test_one_read_per_update(engine, session_factory):
+    await SQLStorage(session_factory).set_state(KEY, "RegStates:name")
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    storage = SQLStorage(session_factory)
+    with update_scope():
+        await storage.get_state(KEY)
+        await storage.get_data(KEY)
+    assert len(statements) == 1
+
+@pytest.mark.asyncio
+async def test_next_update_sees_other_worker_write(session_factory):
+    # Два процесса на одном токене: обновление N — в первом, N+1 — во втором, N+2 — снова в первом
+    first, second = SQLStorage(session_factory), SQLStorage(session_factory)
+    with update_scope():
+        await first.set_state(KEY, AddRouteStates.name)
+        await first.update_data(KEY, {"step": 1})
+    with update_scope():
+        assert await second.get_state(KEY) == AddRouteStates.name.state
+        await second.set_state(KEY, AddRouteStates.distance)
+        await second.update_data(KEY, {"name": "Пик Каракол"})
+    with update_scope():
+        assert await first.get_state(KEY) == AddRouteStates.distance.state
+        await first.update_data(KEY, {"distance": 12})
+    assert await second.get_data(KEY) == {"step": 1, "name": "Пик Каракол", "distance": 12}
+
+@pytest.mark.asyncio
+async def test_expired_state_is_ignored_and_purged(session_factory):
+    await SQLStorage(session_factory).set_state(KEY, "RegStates:name")
+    stale = SQLStorage(session_factory, state_ttl=-1)
+    assert await stale.get_state(KEY) is None
+    assert await stale.purge_expired() == 1
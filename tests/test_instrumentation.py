@@ -0,0 +1,50 @@
+import pytest
+from datetime import datetime
+from aiogram import Bot, Dispatcher, types
+from aiogram.filters import Command
+from sqlalchemy import text
+from bot import metrics
+from bot.instrumentation import instrument, summary, HANDLER_SECONDS, HANDLER_QUERIES, HANDLER_API_CALLS, API_CALLS
+from benchmarks.fake_bot import RecordingSession
+
+def update(update_id, text_):
+    return types.Update(update_id=update_id, message=types.Message(
+        message_id=update_id, date=datetime.now(), text=text_,
+        chat=types.Chat(id=42, type="private"), from_user=types.User(id=42, is_bot=False, first_name="u"),
+    ))
+
+@pytest.mark.asyncio
+async def test_queries_and_api_calls_are_attributed_to_handler(engine):
+    bot = Bot(token="123456:ABCdef", session=RecordingSession())
+    dp = Dispatcher()
+
+    @dp.message(Command("probe"))
+    async def probe_handler(message: types.Message):
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            await conn.execute(text("SELECT 2"))
+        await message.answer("ok")
+
+    instrument(dp, bot, engine)
+    await dp.feed_update(bot, update(1, "/probe"))
+    await dp.feed_update(bot, update(2, "просто текст"))
+    n, mean, _ = HANDLER_QUERIES.summary("probe_handler")
+    assert (n, mean) == (1, 2)
+    assert HANDLER_API_CALLS.get("probe_handler") == 1
+    assert API_CALLS.get("SendMessage", "ok") >= 1
+    assert HANDLER_SECONDS.summary("unhandled")[0] == 1
+    rendered = metrics.render()
+    assert 'bot_handler_seconds_count{handler="probe_handler"} 1' in rendered
+    assert 'bot_handler_db_queries_bucket{handler="probe_handler",le="2"} 1' in rendered
+    assert "probe_handler: 1 шт." in summary()
+
+def test_histogram_buckets_and_quantile():
+    hist = metrics.Histogram("bot_test_seconds", "тест", ["kind"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.05, 0.5, 5.0):
+        hist.observe("a", value=value)
+    lines = list(hist.lines())
+    assert 'bot_test_seconds_bucket{kind="a",le="0.1"} 2' in lines
+    assert 'bot_test_seconds_bucket{kind="a",le="1.0"} 3' in lines
+    assert 'bot_test_seconds_bucket{kind="a",le="+Inf"} 4' in lines
+    assert hist.summary("a", q=0.5) == (4, 1.4, 0.1)
+    assert hist.summary("a", q=0.95)[2] == float("inf")
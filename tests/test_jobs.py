@@ -0,0 +1,119 @@
+import pytest
+import asyncio
+from datetime import datetime, date, timedelta
+from sqlalchemy import select
+from bot.db import ScheduledJob
+from bot.jobs import Daily, JobScheduler, local_date
+
+TZ = "Asia/Bishkek"  # UTC+6
+START = datetime(2024, 8, 1, 6, 0)  # 12:00 по Бишкеку
+
+def test_daily_trigger_in_club_timezone():
+    trigger = Daily("09:00", "18:00", tz=TZ)
+    assert trigger.next_after(START) == datetime(2024, 8, 1, 12, 0)  # 18:00 местного
+    assert trigger.next_after(datetime(2024, 8, 1, 12, 0)) == datetime(2024, 8, 2, 3, 0)
+    assert trigger.next_after(datetime(2024, 8, 1, 20, 0)) == datetime(2024, 8, 2, 3, 0)
+    assert local_date(datetime(2024, 8, 1, 19, 0), TZ) == date(2024, 8, 2)
+
+async def job_row(session_factory, name):
+    async with session_factory() as session:
+        return (await session.execute(select(ScheduledJob).where(ScheduledJob.name == name))).scalar_one()
+
+@pytest.mark.asyncio
+async def test_runs_once_per_occurrence_across_processes(session_factory):
+    runs = []
+
+    async def job(scheduled_for):
+        runs.append(scheduled_for)
+        await asyncio.sleep(0.01)
+
+    a = JobScheduler(session_factory, owner="a")
+    b = JobScheduler(session_factory, owner="b")
+    for s in (a, b):
+        s.add("reminders", Daily("18:00", tz=TZ), job)
+        await s.register(START)
+    await a.tick(START)
+    assert runs == []  # ещё рано
+    due = datetime(2024, 8, 1, 12, 0, 30)
+    await asyncio.gather(a.tick(due), b.tick(due))
+    assert runs == [datetime(2024, 8, 1, 12, 0)]
+    row = await job_row(session_factory, "reminders")
+    assert row.next_run_at == datetime(2024, 8, 2, 12, 0) and row.lease_owner is None
+    await b.tick(due + timedelta(minutes=1))
+    assert len(runs) == 1
+
+@pytest.mark.asyncio
+async def test_catch_up_after_downtime(session_factory):
+    runs = []
+
+    async def job(scheduled_for):
+        runs.append(scheduled_for)
+
+    s = JobScheduler(session_factory, owner="a")
+    s.add("reminders", Daily("18:00", tz=TZ), job, grace=timedelta(hours=12))
+    await s.register(START)
+    # Процесс лежал три дня: пропущенные запуски сливаются в один — последний
+    await s.tick(datetime(2024, 8, 4, 14, 0))
+    assert runs == [datetime(2024, 8, 4, 12, 0)]
+    # Запуск, опоздавший больше чем на grace, пропускается
+    await s.tick(datetime(2024, 8, 6, 6, 0))
+    assert len(runs) == 1 and s.skipped == 1
+    assert (await job_row(session_factory, "reminders")).next_run_at == datetime(2024, 8, 6, 12, 0)
+
+@pytest.mark.asyncio
+async def test_failed_run_is_retried_for_the_same_occurrence(session_factory):
+    runs = []
+
+    async def job(scheduled_for):
+        runs.append(scheduled_for)
+        if len(runs) == 1:
+            raise RuntimeError("boom")
+
+    s = JobScheduler(session_factory, owner="a", retry_delay=600)
+    s.add("reminders", Daily("18:00", tz=TZ), job)
+    await s.register(START)
+    due = datetime(2024, 8, 1, 12, 0)
+    await s.tick(due)
+    await s.tick(due + timedelta(minutes=5))  # пауза перед повтором
+    await s.tick(due + timedelta(minutes=11))
+    assert runs == [due, due]
+    assert (s.failed, s.runs) == (1, 1)
+
+@pytest.mark.asyncio
+async def test_expired_lease_is_taken_over(session_factory):
+    runs = []
+
+    async def job(scheduled_for):
+        runs.append(scheduled_for)
+
+    s = JobScheduler(session_factory, owner="b", lease=300)
+    s.add("reminders", Daily("18:00", tz=TZ), job)
+    await s.register(START)
+    due = datetime(2024, 8, 1, 12, 0)
+    async with session_factory() as session:
+        row = await session.get(ScheduledJob, "reminders")
+        row.lease_owner, row.lease_until = "упавший", due + timedelta(minutes=5)
+        await session.commit()
+    await s.tick(due + timedelta(minutes=1))
+    assert runs == []
+    await s.tick(due + timedelta(minutes=6))
+    assert runs == [due]
+
+@pytest.mark.asyncio
+async def test_lost_lease_fails_the_run(session_factory):
+    async def job(scheduled_for):
+        # Пока задача идёт, аренду перехватывает другой процесс
+        async with session_factory() as session:
+            row = await session.get(ScheduledJob, "reminders")
+            row.lease_owner = "b"
+            await session.commit()
+        await asyncio.sleep(0.1)
+
+    s = JobScheduler(session_factory, owner="a", lease=0.06)
+    s.add("reminders", Daily("18:00", tz=TZ), job)
+    await s.register(START)
+    due = datetime(2024, 8, 1, 12, 0)
+    assert await s.run_due(s.jobs["reminders"], due) is False
+    assert (s.failed, s.runs) == (1, 0)
+    row = await job_row(session_factory, "reminders")
+    assert row.next_run_at == due and row.lease_owner == "b"  # запуск не засчитан, чужую аренду не трогаем
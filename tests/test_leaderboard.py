@@ -0,0 +1,67 @@
+import pytest
+from datetime import date
+from sqlalchemy import event, update
+from bot.db import User, Route, Hike, HikeParticipant
+from bot.completion import complete_hike
+from bot.leaderboard import Leaderboard, period_bounds
+
+async def seed(Session):
+    async with Session() as session:
+        users = [
+            User(telegram_id=800 + i, name=f"u{i}", phone="+7", age=20, total_distance=d, hikes_count=n)
+            for i, (d, n) in enumerate([(50.0, 5), (80.0, 7), (50.0, 6)])
+        ]
+        route = Route(name="Ала-Арча", distance=10.0, elevation=800, description="d", difficulty="средняя")
+        session.add_all(users + [route])
+        await session.flush()
+        hikes = [Hike(route_id=route.id, date=date(2024, 7, 10)), Hike(route_id=route.id, date=date(2024, 7, 20))]
+        session.add_all(hikes)
+        await session.flush()
+        session.add(HikeParticipant(hike_id=hikes[0].id, user_id=users[0].id, completed=1))
+        for user in users:
+            session.add(HikeParticipant(hike_id=hikes[1].id, user_id=user.id, completed=0))
+        await session.commit()
+        return [u.id for u in users], [h.id for h in hikes]
+
+def test_period_bounds():
+    assert period_bounds("month", date(2024, 12, 15))[:2] == (date(2024, 12, 1), date(2025, 1, 1))
+    assert period_bounds("season", date(2025, 2, 1))[:2] == (date(2024, 12, 1), date(2025, 3, 1))
+    assert period_bounds("season", date(2024, 10, 3))[:2] == (date(2024, 9, 1), date(2024, 12, 1))
+
+@pytest.mark.asyncio
+async def test_alltime_snapshot_and_position(engine, session_factory):
+    await seed(session_factory)
+    board = Leaderboard(top_n=2)
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    async with session_factory() as session:
+        top = await board.top_alltime(session)
+        assert [row.name for row in top] == ["u1", "u2"]
+        await board.top_alltime(session)
+        assert len(statements) == 1  # второй раз — из снимка
+        assert await board.position_alltime(session, 800) == 3
+        assert await board.position_alltime(session, 802) == 2
+        assert await board.position_alltime(session, 999) is None
+        await session.execute(update(User).where(User.telegram_id == 800).values(total_distance=100.0))
+        await session.commit()
+        board.invalidate()
+        assert [row.name for row in await board.top_alltime(session)] == ["u0", "u1"]
+
+@pytest.mark.asyncio
+async def test_period_board_refreshes_only_hike_participants(engine, session_factory):
+    (u0, u1, u2), (_, hike_id) = await seed(session_factory)
+    board = Leaderboard()
+    async with session_factory() as session:
+        month = await board.board(session, "month", date(2024, 7, 1))
+    assert [(d, n, name) for d, n, name, _ in month.ranking()] == [(10.0, 1, "u0")]
+    async with session_factory() as session:
+        await complete_hike(session, hike_id, [u0, u2])
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    await board.on_hike_completed(hike_id, session_factory=session_factory)
+    assert len(statements) == 2  # участники похода + их итоги за период
+    async with session_factory() as session:
+        assert await board.board(session, "month", date(2024, 7, 5)) is month
+    assert [(d, name) for d, _, name, _ in month.ranking()] == [(20.0, "u0"), (10.0, "u2")]
+    assert month.position(802) == 2
+    assert month.position(801) is None
@@ -0,0 +1,56 @@
+import random
+import pytest
+from bot.nearby import NearbyIndex, encode, bounds, neighbours, distance_km
+from bot.routes_catalog import RouteCatalog, RouteInfo
+
+
+def info(route_id, lat, lon, name=None):
+    return RouteInfo(route_id, name or f"r{route_id}", 10.0, 500, "d", "средняя", lat, lon)
+
+
+def brute(routes, lat, lon, k):
+    return sorted((distance_km(lat, lon, r.latitude, r.longitude), r.id) for r in routes)[:k]
+
+
+def test_geohash_known_value_and_neighbours():
+    assert encode(42.605, -5.603, 5) == "ezs42"
+    lat_lo, lat_hi, lon_lo, lon_hi = bounds("ezs42")
+    assert lat_lo <= 42.605 <= lat_hi and lon_lo <= -5.603 <= lon_hi
+    assert len(neighbours("ezs42")) == 9
+    # Через линию перемены дат соседи берутся с другой стороны
+    assert any(bounds(c)[2] < 0 for c in neighbours(encode(0.0, 179.99, 3)))
+
+
+def test_matches_brute_force():
+    rnd = random.Random(7)
+    index = NearbyIndex()
+    routes = [info(i, 42 + rnd.uniform(-1, 1), 74.5 + rnd.uniform(-1.5, 1.5)) for i in range(300)]
+    routes += [info(500 + i, 42.87 + rnd.uniform(-0.03, 0.03), 74.6 + rnd.uniform(-0.03, 0.03)) for i in range(20)]
+    routes += [info(1000 + i, rnd.uniform(-89, 89), rnd.uniform(-180, 180)) for i in range(50)]
+    for route in routes:
+        index.update(route)
+    queries = [(42.87, 74.6), (42.0, 73.0), (0.0, 179.9), (-60.0, -70.0), (89.5, 10.0)]
+    for lat, lon in queries:
+        for k in (1, 5, 20):
+            found = index.nearest(lat, lon, k)
+            assert [(pytest.approx(d), r.id) for d, r in found] == brute(routes, lat, lon, k)
+    # Запрос в гуще маршрутов не считает расстояния до всего каталога
+    before = index.examined
+    index.nearest(42.87, 74.6, 5)
+    assert index.examined - before < len(routes) // 4
+
+
+def test_follows_catalog_changes():
+    catalog = RouteCatalog()
+    index = NearbyIndex()
+    catalog.subscribe(index.sync)
+    catalog._set({1: info(1, 42.6, 74.5), 2: info(2, 42.7, 74.6), 3: info(3, None, None)})
+    assert {r.id for _, r in index.nearest(42.6, 74.5, 5)} == {1, 2}
+    # Маршрут 2 перенесли далеко, маршруту 3 задали старт рядом
+    catalog._set({**catalog.routes, 2: info(2, 40.0, 70.0), 3: info(3, 42.61, 74.51, "новый")})
+    assert [r.id for _, r in index.nearest(42.6, 74.5, 2)] == [1, 3]
+    assert index.nearest(42.6, 74.5, 1)[0][1].name == "r1"
+    catalog._set({3: catalog.routes[3]})
+    assert [r.id for _, r in index.nearest(42.6, 74.5, 5)] == [3]
+    assert index.stats()["size"] == 1
+    assert NearbyIndex().nearest(42.6, 74.5, 5) == []
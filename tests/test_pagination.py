@@ -0,0 +1,94 @@
+import pytest
+from datetime import date, timedelta
+from sqlalchemy import event
+from bot.db import User, Route, Hike, HikeParticipant
+from bot.pagination import PageCb
+from bot.main import LISTINGS
+from bot.routes_catalog import route_catalog
+
+async def seed(Session):
+    async with Session() as session:
+        user = User(telegram_id=900, name="u", phone="+7", age=20)
+        routes = [Route(name=f"r{i}", distance=5.0, elevation=100, description="d", difficulty="лёгкая") for i in range(3)]
+        session.add_all([user] + routes)
+        await session.flush()
+        # 25 походов, по два в некоторые дни — ключ (date, id) должен различать их
+        hikes = [Hike(route_id=routes[i % 3].id, date=date(2024, 1, 1) + timedelta(days=i // 2)) for i in range(25)]
+        session.add_all(hikes)
+        await session.flush()
+        session.add_all(HikeParticipant(hike_id=h.id, user_id=user.id) for h in hikes)
+        await session.commit()
+        return [h.id for h in hikes]
+
+def navigate(kb, direction):
+    for button in kb.inline_keyboard[0]:
+        cb = PageCb.unpack(button.callback_data)
+        if cb.dir == direction:
+            return cb
+    return None
+
+@pytest.mark.asyncio
+async def test_history_pages_forward_and_back(engine, session_factory):
+    hike_ids = await seed(session_factory)
+    listing = LISTINGS["history"]
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    seen = []
+    pages = []
+    async with session_factory() as session:
+        rows, has_prev, has_next = await listing.fetch(session, telegram_id=900)
+        assert not has_prev and has_next
+        while True:
+            seen.extend(row.id for row in rows)
+            pages.append([row.id for row in rows])
+            if not has_next:
+                break
+            cursor = listing.decode(listing.encode(listing._key_of(rows[-1])))
+            rows, has_prev, has_next = await listing.fetch(session, cursor, "n", telegram_id=900)
+            assert has_prev
+        assert len(statements) == 3  # одна ограниченная выборка на страницу
+        assert seen == sorted(hike_ids, key=lambda i: (hike_ids.index(i) // 2, i), reverse=True)
+        # Назад с последней страницы — ровно предыдущая
+        cursor = listing._key_of(rows[0])
+        back, has_prev, has_next = await listing.fetch(session, cursor, "p", telegram_id=900)
+        assert [row.id for row in back] == pages[1] and has_prev and has_next
+    assert "LIMIT" in statements[0] and "ORDER BY" in statements[0]
+
+@pytest.mark.asyncio
+async def test_page_keyboard_and_empty_listing(session_factory):
+    await route_catalog.load(session_factory)
+    async with session_factory() as session:
+        text, kb = await LISTINGS["routes"].page(session)
+        assert (text, kb) == ("Маршрутов пока нет.", None)
+    await seed(session_factory)
+    await route_catalog.load(session_factory)
+    async with session_factory() as session:
+        text, kb = await LISTINGS["routes"].page(session)
+        assert text.splitlines()[0].startswith("1. r0")
+        assert kb is None  # три маршрута помещаются на одну страницу
+        text, kb = await LISTINGS["history"].page(session, telegram_id=900)
+        assert len(text.splitlines()) == 10
+        cb = navigate(kb, "n")
+        assert navigate(kb, "p") is None and len(cb.pack()) <= 64
+        text, kb = await LISTINGS["history"].page(session, LISTINGS["history"].decode(cb.key), cb.dir, telegram_id=900)
+        assert navigate(kb, "p") is not None and navigate(kb, "n") is not None
+
+@pytest.mark.asyncio
+async def test_upcoming_shows_stored_forecast(session_factory):
+    from bot.db import Forecast
+    today = date.today()
+    async with session_factory() as session:
+        routes = [Route(name=f"r{i}", distance=5.0, elevation=100, description="d", difficulty="лёгкая",
+                        latitude=42.5, longitude=74.0 + i) for i in range(2)]
+        session.add_all(routes)
+        await session.flush()
+        session.add_all([Hike(route_id=routes[0].id, date=today + timedelta(days=1)),
+                         Hike(route_id=routes[1].id, date=today + timedelta(days=2))])
+        session.add(Forecast(day=today + timedelta(days=1), latitude=42.5, longitude=74.0,
+                             t_min=4.0, t_max=15.0, precipitation=2.5, wind=6.0))
+        await session.commit()
+    async with session_factory() as session:
+        text, _ = await LISTINGS["upcoming"].page(session)
+    lines = text.splitlines()
+    assert lines[0].endswith("(5.0 км, 100 м)") and lines[1].strip() == "🌤 4…15°C, осадки 2.5 мм"
+    assert len(lines) == 3  # у второго похода прогноза пока нет
@@ -0,0 +1,105 @@
+import pytest
+from datetime import date, timedelta
+from sqlalchemy import select, text
+from bot import main, reminders
+from bot.achievements import award_achievements
+from bot.completion import complete_hike
+from bot.db import User, Hike, HikeParticipant
+from bot.routes_catalog import route_catalog
+from benchmarks.datagen import generate, telegram_id
+from benchmarks.fake_bot import RecordingSession
+from benchmarks.scenarios import SCENARIOS, Bench, fake_forecast
+from benchmarks.query_budget import normalize
+
+FSM_WRITES = ("fsm_states",)  # clear() = set_state + set_data: две записи на обновление
+
+@pytest.fixture(scope="function")
+async def engine(engine):
+    await generate(engine, users=60, routes=5, hikes=30, participations=600, progress=lambda *a: None)
+    return engine
+
+def test_normalize_collapses_parameters():
+    assert normalize("SELECT * FROM users WHERE id IN (?, ?, ?)") == normalize("SELECT * FROM users WHERE id IN (?)")
+    assert normalize("SELECT * FROM t WHERE a = 5 AND b = 'x'") == "SELECT * FROM t WHERE a = ? AND b = ?"
+    assert normalize("SELECT * FROM t WHERE a = $1") == normalize("SELECT * FROM t WHERE a = %(a_1)s")
+
+@pytest.mark.asyncio
+async def test_detector_flags_n_plus_one(engine, session_factory, query_budget):
+    with pytest.raises(AssertionError, match="N\\+1"):
+        with query_budget(engine):
+            async with session_factory() as session:
+                for uid in (1, 2, 3):
+                    await session.get(User, uid)
+    with pytest.raises(AssertionError, match="бюджет"):
+        with query_budget(engine, max_statements=1):
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+                await conn.execute(text("SELECT 2"))
+    with query_budget(engine, max_statements=1) as budget:
+        async with session_factory() as session:
+            await session.execute(select(User).where(User.id.in_([1, 2, 3])))
+    assert budget.count == 1
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("finishers", [2, 20])
+async def test_complete_hike_budget_does_not_grow(engine, session_factory, query_budget, finishers):
+    async with session_factory() as session:
+        hike = Hike(route_id=1, date=date.today() - timedelta(days=1))
+        session.add(hike)
+        await session.flush()
+        hike_id = hike.id
+        session.add_all(HikeParticipant(hike_id=hike_id, user_id=uid, completed=0) for uid in range(21, 21 + finishers))
+        await session.commit()
+    with query_budget(engine, max_statements=8):  # завершение + достижения
+        async with session_factory() as session:
+            _, finished = await complete_hike(session, hike_id, list(range(21, 21 + finishers)))
+    assert len(finished) == finishers
+
+@pytest.mark.asyncio
+async def test_award_achievements_budget(engine, session_factory, query_budget):
+    async with session_factory() as session:
+        users = (await session.execute(select(User).limit(25))).scalars().all()
+        await award_achievements(session, users[:1])  # каталог достижений загружается один раз
+        with query_budget(engine, max_statements=2):
+            await award_achievements(session, users)
+
+@pytest.mark.asyncio
+async def test_reminders_budget(engine, session_factory, query_budget):
+    session = RecordingSession()
+
+    class Sender:
+        async def send_message(self, chat_id, text, **kwargs):
+            await session.make_request(None, None)
+
+    with query_budget(engine, max_statements=3):  # выборка, отметки reminder_marks, прогнозы из forecasts
+        await reminders.send_reminders(Sender(), date.today() + timedelta(days=1), session_factory, forecast=fake_forecast)
+    assert session.total() > 1
+
+# Обработчики целиком — через Dispatcher из bot.main, со всеми мидлварями и FSM
+
+@pytest.fixture(scope="function")
+async def bench(app_db, monkeypatch):
+    await generate(app_db, users=60, routes=5, hikes=30, participations=600, progress=lambda *a: None)
+    await route_catalog.load()
+    session = RecordingSession()
+    monkeypatch.setattr(main.bot, "session", session)
+    bench = Bench(session, users=60)
+    bench.admin = 1
+    yield bench
+    bench.close()
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("command, budget", [("/profile", 3), ("/history", 3), ("/leaders", 4), ("/leaders month", 3)])
+async def test_handler_budgets(app_db, bench, query_budget, command, budget):
+    with query_budget(app_db, max_statements=budget):
+        await bench.send_text(telegram_id(7), command)
+    assert bench.session.calls["SendMessage"] == 1
+
+@pytest.mark.asyncio
+async def test_complete_hike_done_budget(app_db, bench, query_budget):
+    await bench.setup()
+    prepare, _ = SCENARIOS["complete_hike_done"]
+    run = await prepare(bench)
+    with query_budget(app_db, max_statements=12, ignore=FSM_WRITES):
+        await run()
+    assert bench.session.calls["SendMessage"] >= 2
@@ -0,0 +1,140 @@
+import re
+import pytest
+from datetime import date, timedelta
+from sqlalchemy import event
+from bot.db import Base, User, Route, Hike, HikeParticipant
+from bot.completion import complete_hike
+from bot.leaderboard import Leaderboard
+from bot.main import LISTINGS
+from bot.reminders import collect_reminders
+from bot.users_cache import RegisteredUsers
+
+# Планы горячих запросов: каждый запрос, который выполняют эти пути, прогоняется
+# через EXPLAIN QUERY PLAN, и полный проход по таблице (SCAN без индекса) — ошибка.
+
+TODAY = date.today()
+# Справочники, которые намеренно читаются в память целиком
+LOOKUP_TABLES = {"achievements", "routes"}
+TABLES = set(Base.metadata.tables) - LOOKUP_TABLES
+FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(.*)$")
+
+@pytest.fixture(scope="function")
+async def session_factory(session_factory):
+    async with session_factory() as session:
+        users = [User(telegram_id=10_000 + i, name=f"u{i}", phone="+7", age=30,
+                      total_distance=float(i % 50), hikes_count=i % 7) for i in range(200)]
+        routes = [Route(name=f"r{i}", distance=10.0, elevation=500, description="d", difficulty="средняя",
+                        latitude=42.5, longitude=74.5) for i in range(20)]
+        session.add_all(users + routes)
+        await session.flush()
+        hikes = [Hike(route_id=routes[i % 20].id, date=TODAY + timedelta(days=i - 150)) for i in range(300)]
+        session.add_all(hikes)
+        await session.flush()
+        session.add_all(
+            HikeParticipant(hike_id=h.id, user_id=users[(i * 7 + k) % 200].id, completed=int(h.date < TODAY))
+            for i, h in enumerate(hikes) for k in range(5)
+        )
+        await session.commit()
+    return session_factory
+
+async def capture(engine, work):
+    statements = []
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            statements.append((statement, parameters))
+    event.listen(engine.sync_engine, "before_cursor_execute", listener)
+    try:
+        await work()
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", listener)
+    return statements
+
+async def plans(engine, statements):
+    result = []
+    async with engine.connect() as conn:
+        for statement, parameters in statements:
+            res = await conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+            result.append((statement, [row[-1] for row in res]))
+    return result
+
+def full_scans(plan):
+    found = []
+    for line in plan:
+        m = FULL_SCAN.match(line)
+        if m and m.group(1) in TABLES and "USING" not in m.group(2):
+            found.append(line)
+    return found
+
+async def assert_indexed(engine, work, ordered=False):
+    statements = await capture(engine, work)
+    assert statements
+    for statement, plan in await plans(engine, statements):
+        assert not full_scans(plan), f"{statement}\n{plan}"
+        if ordered:
+            assert not any("TEMP B-TREE" in line for line in plan), f"{statement}\n{plan}"
+
+@pytest.mark.asyncio
+async def test_user_lookup_plan(engine, session_factory):
+    await assert_indexed(engine, lambda: RegisteredUsers().is_registered(10_005, session_factory))
+
+@pytest.mark.asyncio
+async def test_leaderboard_plans(engine, session_factory):
+    board = Leaderboard()
+
+    async def top():
+        async with session_factory() as session:
+            await board.top_alltime(session)
+
+    async def position():
+        async with session_factory() as session:
+            await board.position_alltime(session, 10_042)
+
+    async def periods():
+        async with session_factory() as session:
+            await board.board(session, "month")
+            await board.board(session, "season")
+        await board.on_hike_completed(1, session_factory=session_factory)
+
+    await assert_indexed(engine, top, ordered=True)
+    await assert_indexed(engine, position)
+    await assert_indexed(engine, periods)
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("name", ["upcoming", "join", "done"])
+async def test_hike_listing_plans(engine, session_factory, name):
+    listing = LISTINGS[name]
+
+    async def pages():
+        async with session_factory() as session:
+            rows, _, _ = await listing.fetch(session)
+            await listing.fetch(session, listing._key_of(rows[-1]), "n")
+            await listing.fetch(session, listing._key_of(rows[-1]), "p")
+
+    await assert_indexed(engine, pages, ordered=True)
+
+@pytest.mark.asyncio
+async def test_history_plan(engine, session_factory):
+
+    async def page():
+        async with session_factory() as session:
+            await LISTINGS["history"].fetch(session, telegram_id=10_007)
+
+    await assert_indexed(engine, page)
+
+@pytest.mark.asyncio
+async def test_reminders_plan(engine, session_factory):
+    await assert_indexed(engine, lambda: collect_reminders(TODAY + timedelta(days=1), session_factory))
+
+@pytest.mark.asyncio
+async def test_complete_hike_plans(engine, session_factory):
+
+    async def complete():
+        async with session_factory() as session:
+            await complete_hike(session, 100, [1, 2, 3])
+
+    await assert_indexed(engine, complete)
+
+def test_full_scan_detection():
+    assert full_scans(["SCAN hikes"]) == ["SCAN hikes"]
+    assert full_scans(["SCAN TABLE users"]) == ["SCAN TABLE users"]
+    assert full_scans(["SCAN users USING INDEX ix_users_leaderboard", "SCAN ranked", "SCAN achievements"]) == []
@@ -0,0 +1,102 @@
+import pytest
+from datetime import date
+from bot.db import User, Route, Hike, HikeParticipant
+from bot import reminders
+
+DAY = date(2024, 8, 2)
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+
+@pytest.fixture(scope="function")
+async def session_factory(session_factory):
+    async with session_factory() as session:
+        users = [User(telegram_id=500 + i, name=f"u{i}", phone="+7", age=20, notifications_enabled=0 if i == 2 else 1)
+                 for i in range(4)]
+        r1 = Route(name="Пик", distance=10, elevation=800, description="d", difficulty="средняя", latitude=42.8, longitude=74.6)
+        r2 = Route(name="Ущелье", distance=8, elevation=400, description="d", difficulty="лёгкая", latitude=42.8, longitude=74.6)
+        session.add_all(users + [r1, r2])
+        await session.flush()
+        h1 = Hike(route_id=r1.id, date=DAY)
+        h2 = Hike(route_id=r2.id, date=DAY)
+        h3 = Hike(route_id=r1.id, date=date(2024, 8, 3))
+        session.add_all([h1, h2, h3])
+        await session.flush()
+        session.add_all([
+            HikeParticipant(hike_id=h1.id, user_id=users[0].id),
+            HikeParticipant(hike_id=h1.id, user_id=users[1].id),
+            HikeParticipant(hike_id=h2.id, user_id=users[2].id),
+            HikeParticipant(hike_id=h2.id, user_id=users[3].id),
+            HikeParticipant(hike_id=h3.id, user_id=users[3].id),
+        ])
+        await session.commit()
+    return session_factory
+
+@pytest.mark.asyncio
+async def test_reminders_pipeline(session_factory):
+    calls = []
+
+    async def forecast(lat, lon, day):
+        calls.append((lat, lon, day))
+        return -2.0, 6.0, 1.5, 4.0
+
+    bot = FakeBot()
+    sent = await reminders.send_reminders(bot, DAY, session_factory, forecast)
+    assert sent == 3
+    assert calls == [(42.8, 74.6, DAY)]  # одни координаты — один запрос прогноза
+    assert sorted(chat_id for chat_id, _ in bot.sent) == [500, 501, 503]
+    assert all("тёплая одежда" in text and text.startswith("Завтра поход") for _, text in bot.sent)
+
+@pytest.mark.asyncio
+async def test_catch_up_after_midnight_says_today(session_factory):
+    async def forecast(lat, lon, day):
+        return 10.0, 20.0, 0.0, 3.0
+
+    bot = FakeBot()
+    assert await reminders.send_reminders(bot, DAY, session_factory, forecast, today=DAY) == 3
+    assert all(text.startswith("Сегодня поход") for _, text in bot.sent)
+
+@pytest.mark.asyncio
+async def test_reminders_without_weather(session_factory):
+    async def forecast(lat, lon, day):
+        raise TimeoutError
+
+    bot = FakeBot()
+    assert await reminders.send_reminders(bot, DAY, session_factory, forecast) == 3
+    assert all("Не удалось получить прогноз" in text for _, text in bot.sent)
+
+@pytest.mark.asyncio
+async def test_reminders_are_sent_once(session_factory):
+    async def forecast(lat, lon, day):
+        return 10.0, 20.0, 0.0, 3.0
+
+    class FlakyBot(FakeBot):
+        failed = False
+
+        async def send_message(self, chat_id, text, **kwargs):
+            if chat_id == 501 and not self.failed:
+                self.failed = True
+                raise RuntimeError("network")
+            await super().send_message(chat_id, text)
+
+    bot = FlakyBot()
+    assert await reminders.send_reminders(bot, DAY, session_factory, forecast) == 2
+    # Повтор (второй запуск в тот же день, другой процесс) шлёт только то, что не дошло
+    assert await reminders.send_reminders(bot, DAY, session_factory, forecast) == 1
+    assert await reminders.send_reminders(bot, DAY, session_factory, forecast) == 0
+    assert sorted(chat_id for chat_id, _ in bot.sent) == [500, 501, 503]
+
+@pytest.mark.asyncio
+async def test_marks_are_claimed_in_batches(session_factory, monkeypatch):
+    # Большой день не упирается в лимит параметров: вставка и снятие отметок идут пачками
+    monkeypatch.setattr(reminders, "MARKS_BATCH", 2)
+    rows = await reminders.collect_reminders(DAY, session_factory)
+    assert len(rows) == 3
+    assert await reminders.claim_marks(rows[:1], session_factory) == rows[:1]
+    assert await reminders.claim_marks(rows, session_factory) == rows[1:]
+    await reminders.release_marks([(row[0], row[-1]) for row in rows], session_factory)
+    assert await reminders.collect_reminders(DAY, session_factory) == rows
@@ -0,0 +1,121 @@
+import pytest
+import asyncio
+import time
+import aiohttp
+from datetime import date
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from bot import weather
+from bot.resilient import ResilientClient, CircuitBreaker, UpstreamError, CircuitOpenError, REQUEST_ERRORS
+
+DAY = date(2024, 8, 2)
+FORECAST = {"daily": {"temperature_2m_min": [3.0], "temperature_2m_max": [12.0],
+                      "precipitation_sum": [0.0], "windspeed_10m_max": [5.0]}}
+
+@pytest.fixture(scope="function")
+async def upstream():
+    # Локальная замена API: script — очередь ответов («hang», «500», «html», «ok», «404»)
+    state = {"script": [], "hits": 0}
+
+    async def handler(request):
+        state["hits"] += 1
+        step = state["script"].pop(0) if state["script"] else "ok"
+        if step == "hang":
+            await asyncio.sleep(5)
+        if step == "500":
+            return web.Response(status=500, text="upstream down")
+        if step == "404":
+            return web.Response(status=404)
+        if step == "html":
+            return web.Response(text="<html>maintenance</html>", content_type="text/html")
+        return web.json_response(FORECAST)
+
+    app = web.Application()
+    app.router.add_get("/v1/forecast", handler)
+    server = TestServer(app)
+    await server.start_server()
+    http = aiohttp.ClientSession()
+
+    async def session():
+        return http
+
+    state["url"] = str(server.make_url("/v1/forecast"))
+    state["session"] = session
+    yield state
+    await http.close()
+    await server.close()
+
+def client(upstream, **kwargs):
+    options = dict(attempts=3, attempt_timeout=0.2, deadline=2.0, backoff=0.01, backoff_max=0.02)
+    options.update(kwargs)
+    return ResilientClient("test_upstream", upstream["session"], **options)
+
+@pytest.mark.asyncio
+async def test_retries_transient_failures(upstream):
+    upstream["script"] = ["hang", "500", "ok"]
+    start = time.monotonic()
+    assert await client(upstream).get_json(upstream["url"]) == FORECAST
+    assert upstream["hits"] == 3
+    assert time.monotonic() - start < 1  # зависший запрос оборван таймаутом попытки
+    assert REQUEST_ERRORS.get("test_upstream", "timeout") >= 1
+
+@pytest.mark.asyncio
+async def test_gives_up_on_bad_responses_and_client_errors(upstream):
+    upstream["script"] = ["html", "html", "html"]
+    with pytest.raises(UpstreamError, match="bad_response"):
+        await client(upstream).get_json(upstream["url"])
+    assert upstream["hits"] == 3
+    upstream["script"] = ["404"]
+    with pytest.raises(UpstreamError, match="404"):
+        await client(upstream).get_json(upstream["url"])
+    assert upstream["hits"] == 4  # 4xx не повторяется
+
+@pytest.mark.asyncio
+async def test_total_deadline(upstream):
+    upstream["script"] = ["hang"] * 10
+    start = time.monotonic()
+    with pytest.raises(UpstreamError, match="timeout"):
+        await client(upstream, attempts=10, attempt_timeout=0.2, deadline=0.5).get_json(upstream["url"])
+    assert time.monotonic() - start < 0.8
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_short_circuits_and_recovers(upstream):
+    breaker = CircuitBreaker(failures=2, reset_after=0.2)
+    c = client(upstream, attempts=1, breaker=breaker)
+    upstream["script"] = ["500", "500"]
+    for _ in range(2):
+        with pytest.raises(UpstreamError):
+            await c.get_json(upstream["url"])
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        await c.get_json(upstream["url"])
+    assert upstream["hits"] == 2  # без обращения к API
+    await asyncio.sleep(0.25)
+    assert breaker.state == "half_open"
+    assert await c.get_json(upstream["url"]) == FORECAST
+    assert breaker.state == "closed" and breaker.stats()["opened"] == 1
+
+@pytest.mark.asyncio
+async def test_forecast_unavailable_is_not_cached(upstream, monkeypatch):
+    monkeypatch.setattr(weather, "OPEN_METEO_URL", upstream["url"])
+    monkeypatch.setattr(weather, "forecast_cache", weather.ForecastCache(ttl=60))
+    monkeypatch.setattr(weather, "client", client(upstream, attempts=2))
+    upstream["script"] = ["500", "hang"]
+    assert await weather.get_weather_forecast(42.8, 74.6, DAY) is None
+    assert await weather.get_weather_forecast(42.8, 74.6, DAY) == (3.0, 12.0, 0.0, 5.0)
+
+@pytest.mark.asyncio
+async def test_breaker_counts_calls_not_attempts(upstream):
+    breaker = CircuitBreaker(failures=3, reset_after=60)
+    c = client(upstream, attempts=3, breaker=breaker)
+    upstream["script"] = ["500"] * 3
+    with pytest.raises(UpstreamError):
+        await c.get_json(upstream["url"])
+    # Три неудачные попытки одного вызова — один сбой, предохранитель замкнут
+    assert upstream["hits"] == 3
+    assert breaker.state == "closed" and breaker.failures == 1
+    upstream["script"] = ["500"] * 6
+    for _ in range(2):
+        with pytest.raises(UpstreamError):
+            await c.get_json(upstream["url"])
+    assert breaker.state == "open"
@@ -0,0 +1,66 @@
+import pytest
+from sqlalchemy import event
+from bot.db import Route
+from bot.pagination import MemoryListing
+from bot.routes_catalog import RouteCatalog
+
+def make_route(name):
+    return Route(name=name, distance=10.0, elevation=500, description="d", difficulty="средняя",
+                 latitude=42.5, longitude=74.5)
+
+async def add_route(catalog, Session, name):
+    async with Session() as session:
+        route = make_route(name)
+        session.add(route)
+        await session.flush()
+        version = await catalog.bump(session)
+        await session.commit()
+    catalog.put(route, version)
+    return route
+
+@pytest.mark.asyncio
+async def test_write_through_and_zero_query_reads(engine, session_factory):
+    catalog = RouteCatalog()
+    seen = []
+    catalog.subscribe(lambda c: seen.append(len(c)))
+    await catalog.load(session_factory)
+    assert (len(catalog), catalog.version) == (0, 0)
+    route = await add_route(catalog, session_factory, "Ала-Арча")
+    assert catalog.version == 1 and catalog.get(route.id).name == "Ала-Арча"
+    assert seen == [0, 1]
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    listing = MemoryListing("routes", catalog.all, keys=[Route.id], render=lambda r: r.name)
+    assert (await listing.page(None))[0] == "Ала-Арча"
+    assert catalog.get(route.id).distance == 10.0
+    assert statements == []
+    # Своё изменение версию не опережает — перечитывать нечего
+    assert await catalog.check(session_factory) is False
+    assert catalog.reloads == 1
+
+@pytest.mark.asyncio
+async def test_other_process_change_is_detected(session_factory):
+    mine, other = RouteCatalog(), RouteCatalog()
+    await mine.load(session_factory)
+    await other.load(session_factory)
+    await add_route(other, session_factory, "Пик Каракол")
+    await add_route(mine, session_factory, "Сокулук")
+    # Версия 2 при нашей 0: запись видна сразу, но полный каталог перечитается
+    assert mine.version == 0 and len(mine) == 1
+    assert await mine.check(session_factory) is True
+    assert sorted(r.name for r in mine.all()) == ["Пик Каракол", "Сокулук"]
+    assert mine.version == 2
+
+@pytest.mark.asyncio
+async def test_memory_listing_pages(session_factory):
+    catalog = RouteCatalog()
+    await catalog.load(session_factory)
+    for i in range(7):
+        await add_route(catalog, session_factory, f"r{i}")
+    listing = MemoryListing("routes", catalog.all, keys=[Route.id], render=lambda r: r.name, page_size=3)
+    rows, has_prev, has_next = await listing.fetch(None)
+    assert [r.name for r in rows] == ["r0", "r1", "r2"] and not has_prev and has_next
+    rows, has_prev, has_next = await listing.fetch(None, listing._key_of(rows[-1]), "n")
+    assert [r.name for r in rows] == ["r3", "r4", "r5"] and has_prev and has_next
+    rows, has_prev, has_next = await listing.fetch(None, listing._key_of(rows[0]), "p")
+    assert [r.name for r in rows] == ["r0", "r1", "r2"] and not has_prev and has_next
@@ -0,0 +1,106 @@
+import pytest
+import asyncio
+from datetime import datetime
+from aiogram import Bot, types
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from bot.scheduler import OrderedDispatcher, QUEUE_WAIT, update_key
+from benchmarks.fake_bot import RecordingSession
+
+class Wizard(StatesGroup):
+    first = State()
+    second = State()
+
+def update(update_id, user_id, text_):
+    return types.Update(update_id=update_id, message=types.Message(
+        message_id=update_id, date=datetime.now(), text=text_,
+        chat=types.Chat(id=user_id, type="private"), from_user=types.User(id=user_id, is_bot=False, first_name="u"),
+    ))
+
+@pytest.fixture
+def bot():
+    return Bot(token="123456:ABCdef", session=RecordingSession())
+
+@pytest.mark.asyncio
+async def test_same_user_is_serialized_other_users_run_concurrently(bot):
+    dp = OrderedDispatcher(concurrency=10)
+    log = []
+
+    @dp.message()
+    async def slow(message: types.Message):
+        log.append(("start", message.from_user.id, message.text))
+        await asyncio.sleep(0.05 if message.text == "медленно" else 0)
+        log.append(("end", message.from_user.id, message.text))
+
+    await asyncio.gather(
+        dp.feed_update(bot, update(1, 1, "медленно")),
+        dp.feed_update(bot, update(2, 1, "второе")),
+        dp.feed_update(bot, update(3, 2, "другой")),
+    )
+    # Второе сообщение пользователя 1 — только после первого, пользователь 2 не ждёт
+    assert log.index(("start", 1, "второе")) > log.index(("end", 1, "медленно"))
+    assert log.index(("end", 2, "другой")) < log.index(("end", 1, "медленно"))
+    assert dp.stats()["waited_for_key"] == 1
+    assert dp.stats()["keys"] == 0 and dp.stats()["queued"] == 0
+    assert QUEUE_WAIT.summary("key")[0] >= 3
+
+@pytest.mark.asyncio
+async def test_wizard_steps_keep_order(bot):
+    dp = OrderedDispatcher(concurrency=10)
+    seen = []
+
+    @dp.message(Wizard.first)
+    async def first(message: types.Message, state: FSMContext):
+        await asyncio.sleep(0.02)  # чтение/запись FSM в хранилище
+        await state.update_data(first=message.text)
+        await state.set_state(Wizard.second)
+
+    @dp.message(Wizard.second)
+    async def second(message: types.Message, state: FSMContext):
+        seen.append(((await state.get_data())["first"], message.text))
+        await state.clear()
+
+    @dp.message()
+    async def start(message: types.Message, state: FSMContext):
+        await state.set_state(Wizard.first)
+
+    await asyncio.gather(*(dp.feed_update(bot, update(i, 5, t)) for i, t in enumerate(["/go", "раз", "два"])))
+    assert seen == [("раз", "два")]
+
+@pytest.mark.asyncio
+async def test_global_cap(bot):
+    dp = OrderedDispatcher(concurrency=2)
+    running, peak = 0, 0
+
+    @dp.message()
+    async def handler(message: types.Message):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    await asyncio.gather(*(dp.feed_update(bot, update(i, 100 + i, "x")) for i in range(8)))
+    assert peak == 2
+    assert dp.stats()["running"] == 0
+
+def test_update_key():
+    assert update_key(update(1, 7, "x")) == (7, 7)
+    assert update_key(types.Update(update_id=2)) is None
+
+def test_slots_follow_the_running_loop(bot):
+    # dp из bot.main создаётся при импорте, а работает в цикле asyncio.run() — и не в одном
+    dp = OrderedDispatcher(concurrency=1)
+
+    @dp.message()
+    async def handler(message: types.Message):
+        await asyncio.sleep(0.01)
+
+    async def burst():
+        await asyncio.gather(*(dp.feed_update(bot, update(i, 200 + i, "x")) for i in range(3)))
+        return dp._slots
+
+    first = asyncio.run(burst())
+    second = asyncio.run(burst())
+    assert first is not second
+    assert dp.stats()["running"] == 0 and dp.stats()["queued"] == 0
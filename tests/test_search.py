@@ -0,0 +1,54 @@
+from bot.routes_catalog import RouteCatalog, RouteInfo
+from bot.search import TrigramIndex, normalize, trigrams
+
+
+def info(route_id, name, description="d"):
+    return RouteInfo(route_id, name, 10.0, 500, description, "средняя", 42.5, 74.5)
+
+
+ROUTES = [
+    info(1, "Пик Каракол", "Подъём через ущелье Ала-Арча"),
+    info(2, "Водопад Барскоон", "Лёгкая прогулка к водопаду"),
+    info(3, "Пик Учитель", "Высокогорный маршрут, нужен опыт"),
+    info(4, "Озеро Сон-Куль", "Ночёвка у озера, ёлки и юрты"),
+]
+
+
+def make_index():
+    index = TrigramIndex()
+    for route in ROUTES:
+        index.update(route)
+    return index
+
+
+def test_normalize_and_trigrams():
+    assert normalize("  Сон-Куль, ЁЛКИ!") == "сон куль елки"
+    assert trigrams("Пик") == {"  п", " пи", "пик", "ик "}
+
+
+def test_case_typos_and_ranking():
+    index = make_index()
+    assert [r.id for _, r in index.search("КАРАКОЛ")] == [1]
+    assert [r.id for _, r in index.search("каракл")][0] == 1  # пропущена буква
+    assert [r.id for _, r in index.search("барскон")][0] == 2
+    peaks = [r.id for _, r in index.search("пик")]
+    assert set(peaks[:2]) == {1, 3}
+    # Слово из описания тоже находит маршрут, «ё» и «е» не различаются
+    assert [r.id for _, r in index.search("елки")] == [4]
+    assert index.search("zzzz") == [] and index.search("!!") == []
+    assert len(index.search("пик", limit=1)) == 1
+
+
+def test_follows_catalog_changes():
+    catalog = RouteCatalog()
+    index = TrigramIndex()
+    catalog.subscribe(index.sync)
+    catalog._set({r.id: r for r in ROUTES})
+    assert [r.id for _, r in index.search("учитель")] == [3]
+    catalog._set({**catalog.routes, 3: info(3, "Пик Семёнова")})
+    assert index.search("учитель") == []
+    assert [r.id for _, r in index.search("семенова")] == [3]
+    catalog._set({1: catalog.routes[1]})
+    assert index.search("водопад") == []
+    assert index.stats()["size"] == 1
+    assert not any(3 in ids for ids in index._names.values())
@@ -0,0 +1,58 @@
+import pytest
+import asyncio
+from aiogram import methods
+from aiogram.exceptions import TelegramRetryAfter
+from bot.sender import OutboundGateway, priority, PRIORITY_INTERACTIVE, PRIORITY_BROADCAST
+
+@pytest.mark.asyncio
+async def test_interactive_goes_before_broadcast():
+    gateway = OutboundGateway(global_rate=50, chat_rate=100)
+    gateway.global_bucket.tokens = 0  # бакет пуст — все встают в очередь
+    order = []
+
+    async def make_request(bot, method):
+        order.append(method.chat_id)
+        return True
+
+    async def send(chat_id, level):
+        with priority(level):
+            await gateway(make_request, None, methods.SendMessage(chat_id=chat_id, text="x"))
+
+    tasks = [asyncio.create_task(send(i, PRIORITY_BROADCAST)) for i in range(1, 4)]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(send(100, PRIORITY_INTERACTIVE)))
+    await asyncio.gather(*tasks)
+    assert order[0] == 100
+    assert gateway.stats()["sent"] == {"interactive": 1, "reminder": 0, "broadcast": 3}
+    assert gateway.stats()["queue_depth"]["broadcast"] == 0
+
+@pytest.mark.asyncio
+async def test_retry_after_is_honoured():
+    gateway = OutboundGateway()
+    calls = []
+
+    async def make_request(bot, method):
+        calls.append(method)
+        if len(calls) == 1:
+            raise TelegramRetryAfter(method=method, message="Flood control exceeded", retry_after=1)
+        return "ok"
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    result = await gateway(make_request, None, methods.SendMessage(chat_id=5, text="x"))
+    assert result == "ok"
+    assert len(calls) == 2
+    assert loop.time() - started >= 0.9
+    assert gateway.stats()["retry_after"] == 1
+
+@pytest.mark.asyncio
+async def test_per_chat_limit():
+    gateway = OutboundGateway(global_rate=1000, chat_rate=10)
+    times = []
+
+    async def make_request(bot, method):
+        times.append(asyncio.get_running_loop().time())
+        return True
+
+    await asyncio.gather(*(gateway(make_request, None, methods.SendMessage(chat_id=7, text="x")) for _ in range(3)))
+    assert times[-1] - times[0] >= 0.18
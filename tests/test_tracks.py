@@ -0,0 +1,74 @@
+import pytest
+import numpy as np
+from bot import tracks
+
+def gpx(points, name="Ала-Арча"):
+    body = "".join(f'<trkpt lat="{lat}" lon="{lon}"><ele>{ele}</ele></trkpt>' for lat, lon, ele in points)
+    return (f'<?xml version="1.0"?><gpx xmlns="http://www.topografix.com/GPX/1/1" version="1.1">'
+            f'<trk><name>{name}</name><trkseg>{body}</trkseg></trk></gpx>').encode()
+
+# 101 точка вдоль меридиана с шагом 0.001° (≈111 м): ровно 0.1° ≈ 11.12 км
+MERIDIAN = [(42.5 + i * 0.001, 74.5, 1500 + i * 5) for i in range(101)]
+
+def test_gpx_distance_elevation_and_start():
+    track = tracks.analyze(gpx(MERIDIAN))
+    assert track.name == "Ала-Арча"
+    assert track.points == 101
+    assert track.distance == pytest.approx(11.12, abs=0.01)
+    assert track.elevation == pytest.approx(500, abs=10)  # сглаживание чуть срезает края профиля
+    assert (track.latitude, track.longitude) == (42.5, 74.5)
+
+def test_smoothing_removes_gps_noise():
+    # Ровный подъём на 100 м с шумом GPS ~3 м в каждой точке
+    noise = np.random.default_rng(1).normal(0, 3, 101)
+    noisy = [(42.5 + i * 0.001, 74.5, 1000 + i + noise[i]) for i in range(101)]
+    raw = tracks.elevation_gain(np.array([e for _, _, e in noisy]), window=1)
+    smooth = tracks.analyze(gpx(noisy), window=5).elevation
+    assert raw > 180  # шум почти удваивает набор
+    assert smooth == pytest.approx(100, abs=10)
+
+def test_kml_line_string_ignores_placemark_points():
+    coords = " ".join(f"{lon},{lat},{ele}" for lat, lon, ele in MERIDIAN)
+    kml = (f'<kml xmlns="http://www.opengis.net/kml/2.2"><Document><name>Трек</name>'
+           f'<Placemark><name>Старт</name><Point><coordinates>10,10,0</coordinates></Point></Placemark>'
+           f'<Placemark><LineString><coordinates>{coords}</coordinates></LineString></Placemark>'
+           f'</Document></kml>').encode()
+    track = tracks.analyze(kml)
+    assert track.points == 101 and track.distance == pytest.approx(11.12, abs=0.01)
+    assert track.name == "Трек"
+
+def test_bad_documents():
+    with pytest.raises(tracks.TrackError):
+        tracks.analyze(b"<gpx><trk><trkseg><trkpt lat='1' lon='2'>")
+    with pytest.raises(tracks.TrackError, match="меньше двух"):
+        tracks.analyze(gpx(MERIDIAN[:1]))
+    with pytest.raises(tracks.TrackError):
+        tracks.analyze(gpx([(95, 0, 0), (96, 0, 0)]))
+
+@pytest.mark.asyncio
+async def test_analysis_runs_in_worker_process():
+    big = [(42.0 + i * 1e-5, 74.0 + i * 1e-5, 1000 + i % 50) for i in range(50_000)]
+    try:
+        track = await tracks.analyze_in_worker(gpx(big))
+    finally:
+        tracks.shutdown()
+    assert track.points == 50_000
+    assert track.distance == pytest.approx(tracks.haversine_km(
+        np.array([p[0] for p in big]), np.array([p[1] for p in big])).sum(), abs=0.01)
+
+@pytest.mark.asyncio
+async def test_group_files_with_number_caption_are_ignored(app_db, monkeypatch):
+    # Участник группы прислал файл с числом в подписи — бот молчит и не отвечает «только администраторы»
+    from datetime import datetime
+    from aiogram import types
+    from bot import main
+    from benchmarks.fake_bot import RecordingSession
+    session = RecordingSession()
+    monkeypatch.setattr(main.bot, "session", session)
+    message = types.Message(
+        message_id=1, date=datetime.now(), caption="12",
+        document=types.Document(file_id="f", file_unique_id="u", file_name="photo.pdf"),
+        chat=types.Chat(id=-100, type="supergroup"), from_user=types.User(id=555, is_bot=False, first_name="u"),
+    )
+    await main.dp.feed_update(main.bot, types.Update(update_id=1, message=message))
+    assert session.total() == 0
@@ -0,0 +1,64 @@
+import pytest
+from bot.db import User
+from bot.users_cache import RegisteredUsers
+
+@pytest.fixture(scope="function")
+async def session_factory(session_factory):
+    async with session_factory() as session:
+        session.add_all([User(telegram_id=100 + i, name="u", phone="+7", age=20) for i in range(3)])
+        await session.commit()
+    return session_factory
+
+@pytest.mark.asyncio
+async def test_warm_and_negative_cache(session_factory):
+    cache = RegisteredUsers(maxsize=2, negative_ttl=60)
+    assert await cache.warm(session_factory) == 2
+    assert await cache.is_registered(102, session_factory)
+    assert cache.stats()["misses"] == 0
+    # Вытесненный из LRU пользователь находится в БД и возвращается в кэш
+    assert await cache.is_registered(100, session_factory)
+    assert await cache.is_registered(100, session_factory)
+    assert not await cache.is_registered(999, session_factory)
+    assert not await cache.is_registered(999, session_factory)
+    assert cache.stats() == {"hits": 3, "misses": 2, "known": 2, "unknown": 1}
+    cache.add(999)  # регистрация снимает отрицательную запись
+    assert await cache.is_registered(999, session_factory)
+
+@pytest.mark.asyncio
+async def test_negative_entry_expires(session_factory):
+    cache = RegisteredUsers(negative_ttl=0)
+    assert not await cache.is_registered(555, session_factory)
+    assert not await cache.is_registered(555, session_factory)
+    assert cache.stats()["misses"] == 2
+
+@pytest.mark.asyncio
+async def test_registered_user_commands_reach_handlers(app_db, monkeypatch):
+    # Через настоящий Dispatcher: catch_unregistered пропускает зарегистрированных дальше
+    from bot import main
+    from bot.db import SessionLocal
+    from benchmarks.fake_bot import RecordingSession
+    from benchmarks.scenarios import Bench
+
+    class TextSession(RecordingSession):
+        texts = []
+
+        async def make_request(self, bot, method, timeout=None):
+            self.texts.append(getattr(method, "text", None))
+            return await super().make_request(bot, method, timeout)
+
+    async with SessionLocal() as session:
+        session.add(User(telegram_id=7_000_001, name="u", phone="+7", age=20))
+        await session.commit()
+    session = TextSession()
+    monkeypatch.setattr(main.bot, "session", session)
+    bench = Bench(session, users=0)
+    try:
+        await bench.send_text(7_000_001, "/join")
+        await bench.send_text(7_000_001, "❓ Помощь")
+        await bench.send_text(7_000_002, "привет")
+    finally:
+        bench.close()
+    unregistered = "Ты еще не зарегистрирован. Напиши /start для регистрации."
+    assert len(session.texts) == 3
+    assert session.texts[0] != unregistered and "Бот для организации походов" in session.texts[1]
+    assert session.texts[2] == unregistered
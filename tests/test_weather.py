@@ -0,0 +1,123 @@
+import pytest
+import asyncio
+from datetime import date
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from bot import weather
+
+DAY = date(2024, 8, 2)
+
+@pytest.fixture(scope="function")
+async def open_meteo(monkeypatch):
+    # Локальная замена open-meteo: считает запросы и отвечает с задержкой
+    requests = []
+
+    async def forecast(request):
+        requests.append(dict(request.query))
+        await asyncio.sleep(0.05)
+        return web.json_response({"daily": {
+            "temperature_2m_min": [3.0], "temperature_2m_max": [12.0],
+            "precipitation_sum": [0.0], "windspeed_10m_max": [5.0],
+        }})
+
+    app = web.Application()
+    app.router.add_get("/v1/forecast", forecast)
+    server = TestServer(app)
+    await server.start_server()
+    monkeypatch.setattr(weather, "OPEN_METEO_URL", str(server.make_url("/v1/forecast")))
+    monkeypatch.setattr(weather, "forecast_cache", weather.ForecastCache(ttl=60, maxsize=2))
+    yield requests
+    await weather.close_http()
+    await server.close()
+
+@pytest.mark.asyncio
+async def test_single_flight_and_hits(open_meteo):
+    results = await asyncio.gather(*(weather.get_weather_forecast(42.8761, 74.6053, DAY) for _ in range(5)))
+    assert results == [(3.0, 12.0, 0.0, 5.0)] * 5
+    assert len(open_meteo) == 1
+    assert open_meteo[0]["latitude"] == "42.88"
+    # Соседняя точка округляется в тот же ключ
+    await weather.get_weather_forecast(42.8799, 74.6071, DAY)
+    assert len(open_meteo) == 1
+    stats = weather.forecast_cache.stats()
+    assert stats["misses"] == 1 and stats["coalesced"] == 4 and stats["hits"] == 1
+
+@pytest.mark.asyncio
+async def test_lru_and_ttl(open_meteo):
+    for lat in (40.0, 41.0, 42.0):
+        await weather.get_weather_forecast(lat, 74.0, DAY)
+    assert weather.forecast_cache.stats()["size"] == 2
+    await weather.get_weather_forecast(40.0, 74.0, DAY)  # вытеснен по LRU
+    assert len(open_meteo) == 4
+    weather.forecast_cache.ttl = 0
+    weather.forecast_cache.clear()
+    await weather.get_weather_forecast(40.0, 74.0, DAY)
+    await weather.get_weather_forecast(40.0, 74.0, DAY)  # запись сразу протухла
+    assert len(open_meteo) == 6
+
+@pytest.fixture(scope="function")
+async def hikes_db(session_factory):
+    from datetime import timedelta
+    from bot.db import Route, Hike
+    async with session_factory() as session:
+        routes = [Route(name=f"r{i}", distance=10, elevation=500, description="d", difficulty="средняя",
+                        latitude=42.0 + i / 10, longitude=74.5) for i in range(5)]
+        routes.append(Route(name="без точки", distance=5, elevation=100, description="d", difficulty="лёгкая"))
+        session.add_all(routes)
+        await session.flush()
+        session.add_all([Hike(route_id=routes[i % 6].id, date=DAY + timedelta(days=i % 4)) for i in range(12)])
+        session.add(Hike(route_id=routes[0].id, date=DAY + timedelta(days=30)))  # за горизонтом
+        await session.commit()
+    return session_factory
+
+@pytest.mark.asyncio
+async def test_prefetch_uses_multi_location_requests(hikes_db, monkeypatch):
+    from datetime import timedelta
+    from sqlalchemy import select, func
+    from bot.db import Forecast
+    requests = []
+
+    async def forecast(request):
+        requests.append(dict(request.query))
+        lats = request.query["latitude"].split(",")
+        days = [str(DAY + timedelta(days=i)) for i in range(5)]
+        body = [{"daily": {"time": days, "temperature_2m_min": [float(lat)] * 5, "temperature_2m_max": [20.0] * 5,
+                           "precipitation_sum": [0.0] * 5, "windspeed_10m_max": [3.0] * 5}} for lat in lats]
+        return web.json_response(body if len(body) > 1 else body[0])
+
+    app = web.Application()
+    app.router.add_get("/v1/forecast", forecast)
+    server = TestServer(app)
+    await server.start_server()
+    monkeypatch.setattr(weather, "OPEN_METEO_URL", str(server.make_url("/v1/forecast")))
+    monkeypatch.setattr(weather, "WEATHER_BATCH_SIZE", 3)
+    try:
+        stored = await weather.prefetch(days=7, session_factory=hikes_db, today=DAY)
+    finally:
+        await weather.close_http()
+        await server.close()
+    # 5 точек с координатами — два запроса по 3 и 2 точки; поход за горизонтом не учитывается
+    assert [len(r["latitude"].split(",")) for r in requests] == [3, 2]
+    assert requests[0]["end_date"] == str(DAY + timedelta(days=3))
+    async with hikes_db() as session:
+        assert await session.scalar(select(func.count()).select_from(Forecast)) == stored == 10
+    local = await weather.stored_forecasts([(42.1, 74.5), (40.0, 74.5)], DAY + timedelta(days=1), hikes_db)
+    assert local == {(42.1, 74.5): (42.1, 20.0, 0.0, 3.0)}
+
+@pytest.mark.asyncio
+async def test_null_forecast_field_means_no_forecast(hikes_db):
+    from datetime import datetime
+    from bot.db import Forecast
+    from bot.reminders import render_reminder
+    async with hikes_db() as session:
+        session.add_all([
+            Forecast(day=DAY, latitude=42.0, longitude=74.5, t_min=1.0, t_max=None,
+                     precipitation=None, wind=2.0, fetched_at=datetime.utcnow()),
+            Forecast(day=DAY, latitude=42.1, longitude=74.5, t_min=1.0, t_max=9.0,
+                     precipitation=0.5, wind=2.0, fetched_at=datetime.utcnow()),
+        ])
+        await session.commit()
+    # Неполная строка не считается прогнозом: напоминание запросит его заново или напишет, что прогноза нет
+    local = await weather.stored_forecasts([(42.0, 74.5), (42.1, 74.5)], DAY, hikes_db)
+    assert local == {(42.1, 74.5): (1.0, 9.0, 0.5, 2.0)}
+    assert "Не удалось получить прогноз" in render_reminder("r0", local.get((42.0, 74.5)))
@@ -0,0 +1,61 @@
+import pytest
+import asyncio
+from aiogram import Bot, Dispatcher, Router, types
+from aiogram.filters import Command
+from aiohttp.test_utils import TestServer, TestClient
+from bot.webhook import create_app, SECRET_HEADER, WORKERS_KEY
+
+# Записанное обновление Telegram: /start в личке
+UPDATE = {
+    "update_id": 10001,
+    "message": {
+        "message_id": 7,
+        "date": 1722500000,
+        "chat": {"id": 42, "type": "private", "first_name": "Тест"},
+        "from": {"id": 42, "is_bot": False, "first_name": "Тест"},
+        "text": "/start",
+        "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+    },
+}
+
+@pytest.fixture(scope="function")
+async def client():
+    handled = []
+    router = Router()
+
+    @router.message(Command("start"))
+    async def on_start(message: types.Message):
+        await asyncio.sleep(0.05)  # медленный обработчик не задерживает ответ Telegram
+        handled.append(message.from_user.id)
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    bot = Bot(token="123456:ABCdef")
+    app = create_app(dp, bot, secret="s3cret", path="/webhook", workers=2)
+    client = TestClient(TestServer(app))
+    await client.start_server()
+    client.handled = handled
+    yield client
+    await client.close()
+    await bot.session.close()
+
+@pytest.mark.asyncio
+async def test_update_is_acked_and_handled(client):
+    resp = await client.post("/webhook", json=UPDATE, headers={SECRET_HEADER: "s3cret"})
+    assert resp.status == 200
+    assert client.handled == []  # ответ ушёл до окончания обработки
+    await client.app[WORKERS_KEY].drain()
+    assert client.handled == [42]
+    resp = await client.get("/healthz")
+    assert resp.status == 503  # после drain новые обновления не принимаются
+
+@pytest.mark.asyncio
+async def test_secret_and_payload_checks(client):
+    resp = await client.post("/webhook", json=UPDATE, headers={SECRET_HEADER: "wrong"})
+    assert resp.status == 401
+    resp = await client.post("/webhook", data=b"not json", headers={SECRET_HEADER: "s3cret"})
+    assert resp.status == 400
+    resp = await client.get("/healthz")
+    assert (await resp.json())["received"] == 0
+    resp = await client.get("/metrics")
+    assert resp.status == 200